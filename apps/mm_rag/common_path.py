@@ -0,0 +1,9 @@
+# apps/mm_rag/common_path.py
+# Puts <repo>/packages on sys.path, so modules shared with apps/semantic_search import
+# as common.* (packages/common). Import it before the first `from common... import`.
+import sys
+from pathlib import Path
+
+PACKAGES = str(Path(__file__).resolve().parents[2] / "packages")
+if PACKAGES not in sys.path:
+    sys.path.insert(0, PACKAGES)
@@ -0,0 +1,15 @@
+# apps/mm_rag/dedup.py
+from typing import List, Optional
+import numpy as np
+import common_path  # puts packages/ on sys.path for common.*
+from common.dedup import mmr_select
+
+def dedup_hits(hits: List[dict], cand_vecs: np.ndarray, k: int, lambda_: float = 0.7,
+               dup_threshold: float = 0.92, max_per_page: Optional[int] = 3) -> List[dict]:
+    """Drop near-duplicate / same-page-overflow hits, keeping the incoming order of the survivors."""
+    if not hits:
+        return []
+    keep = mmr_select(cand_vecs, [h["score"] for h in hits], k, lambda_=lambda_,
+                      dup_threshold=dup_threshold,
+                      groups=[h["meta"].get("page") for h in hits], max_per_group=max_per_page)
+    return [hits[i] for i in sorted(keep)]
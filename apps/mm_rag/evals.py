@@ -1,6 +1,11 @@
-import argparse, json
+import argparse, json, time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from retriever import retrieve
+from typing import Sequence, Union
+from retriever import retrieve, cache_stats
+from reranker import Reranker
+import common_path  # puts packages/ on sys.path for common.*
+from common.thread_budget import configure
 
 def load_gold(path: Path):
     with open(path, "r", encoding="utf-8") as f:
@@ -24,44 +29,71 @@ def reciprocal_rank(hits, gold_phrase, gold_page=None, k=10):
                 return 1.0 / i
     return 0.0
 
-def run_eval(gold_path: Path, data_root: Path, k: int = 5):
-    gold = load_gold(gold_path)
-    raw_metrics, rerank_metrics = [], []
-
-    for item in gold:
-        q, gold_phrase, gold_page = item["question"], item["expected_phrase"], item.get("expected_page")
+def _evaluate_question(item, data_root: Path, k_text: int, reranker):
+    """One retrieval per question; the reranked list is the same candidates passed through the
+    cross-encoder (what retrieve(use_rerank=True) would do), so the FAISS side runs once."""
+    start = time.perf_counter()
+    res = retrieve(item["question"], data_root, k_text=k_text, use_rerank=False)
+    latency_ms = (time.perf_counter() - start) * 1000
+    hits, cell = res["text_hits"], res.get("table_cell")
+    # a structured table cell stays on top; only the dense hits go through the cross-encoder
+    dense = [h for h in hits if h is not cell]
+    hits_rr = reranker.rerank(res["normalized_query"], [dict(h) for h in dense], top_k=5) if dense else []
+    if cell is not None:
+        hits_rr = [cell] + hits_rr
+    return hits, hits_rr, latency_ms
 
-        res = retrieve(q, data_root, k_text=k, use_rerank=False)
-        hits = res["text_hits"]
-        raw_metrics.append({
-            "acc1": hit_in_hits(hits, gold_phrase, gold_page, 1),
+def _scores(hits, gold_phrase, gold_page, k):
+    return {"acc1": hit_in_hits(hits, gold_phrase, gold_page, 1),
             "rec": hit_in_hits(hits, gold_phrase, gold_page, k),
-            "mrr": reciprocal_rank(hits, gold_phrase, gold_page, k)
-        })
+            "mrr": reciprocal_rank(hits, gold_phrase, gold_page, k)}
 
-        res_rr = retrieve(q, data_root, k_text=k, use_rerank=True)
-        hits_rr = res_rr["text_hits"]
-        rerank_metrics.append({
-            "acc1": hit_in_hits(hits_rr, gold_phrase, gold_page, 1),
-            "rec": hit_in_hits(hits_rr, gold_phrase, gold_page, k),
-            "mrr": reciprocal_rank(hits_rr, gold_phrase, gold_page, k)
-        })
+def run_eval(gold_path: Path, data_root: Path, k: Union[int, Sequence[int]] = 5, workers: int = 4):
+    """Metrics at every cutoff in k from a single retrieval (k_text = max(k)) per question;
+    questions run in parallel threads."""
+    ks = sorted({k} if isinstance(k, int) else set(k))
+    gold = load_gold(gold_path)
+    reranker = Reranker()
+    with ThreadPoolExecutor(max(1, workers)) as ex:
+        outs = list(ex.map(lambda item: _evaluate_question(item, data_root, max(ks), reranker), gold))
 
     def avg(m_list, key): return sum(m[key] for m in m_list) / len(m_list)
 
     print(f"\n Evaluated on {len(gold)} queries")
+    for kk in ks:
+        raw_metrics, rerank_metrics = [], []
+        for item, (hits, hits_rr, _) in zip(gold, outs):
+            gold_phrase, gold_page = item["expected_phrase"], item.get("expected_page")
+            raw_metrics.append(_scores(hits, gold_phrase, gold_page, kk))
+            rerank_metrics.append(_scores(hits_rr, gold_phrase, gold_page, kk))
+
+        print("\nBaseline Retriever:")
+        print(f"Accuracy@1: {avg(raw_metrics,'acc1'):.3f}, Recall@{kk}: {avg(raw_metrics,'rec'):.3f}, MRR: {avg(raw_metrics,'mrr'):.3f}")
+
+        print("\nRetriever + Reranker:")
+        print(f"Accuracy@1: {avg(rerank_metrics,'acc1'):.3f}, Recall@{kk}: {avg(rerank_metrics,'rec'):.3f}, MRR: {avg(rerank_metrics,'mrr'):.3f}")
 
-    print("\nBaseline Retriever:")
-    print(f"Accuracy@1: {avg(raw_metrics,'acc1'):.3f}, Recall@{k}: {avg(raw_metrics,'rec'):.3f}, MRR: {avg(raw_metrics,'mrr'):.3f}")
+    # index size / dimensionality (reduced indexes: ingest_build_index.py --reduce_dim) and latency
+    manifest_path = data_root / "index" / "manifest.json"
+    info = json.loads(manifest_path.read_text(encoding="utf-8")).get("text_index") if manifest_path.exists() else None
+    if info:
+        print(f"\nText index: {info['ntotal']} vectors, {info['dim_in']}→{info['dim']}-d"
+              f"{' (' + info['transform'] + ')' if info['transform'] else ''}, {info['vector_bytes'] / 1e6:.2f} MB of vectors")
+    lat = sorted(o[2] for o in outs)
+    if lat:
+        print(f"Retrieve latency (no rerank): mean {sum(lat) / len(lat):.1f} ms, p50 {lat[len(lat) // 2]:.1f} ms, "
+              f"max {lat[-1]:.1f} ms ({workers} workers)")
 
-    print("\nRetriever + Reranker:")
-    print(f"Accuracy@1: {avg(rerank_metrics,'acc1'):.3f}, Recall@{k}: {avg(rerank_metrics,'rec'):.3f}, MRR: {avg(rerank_metrics,'mrr'):.3f}")
+    emb = cache_stats()["embeddings"]
+    print(f"\nQuery embedding cache: {emb['hits']} hits / {emb['misses']} misses (hit rate {emb['hit_rate']:.2f})")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--gold", required=True, type=str, help="Path to gold_eval.jsonl")
     ap.add_argument("--data_root", required=True, type=str, help="Folder with FAISS indexes")
-    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--k", type=int, nargs="+", default=[5], help="one or more cutoffs, all from one retrieval")
+    ap.add_argument("--workers", type=int, default=4, help="questions evaluated in parallel")
     args = ap.parse_args()
+    configure("eval", workers=args.workers)  # torch / FAISS threads per in-flight question = cores // workers
 
-    run_eval(Path(args.gold), Path(args.data_root), k=args.k)
+    run_eval(Path(args.gold), Path(args.data_root), k=args.k, workers=args.workers)
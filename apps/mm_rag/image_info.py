@@ -1,5 +1,11 @@
 # apps/mm_rag/image_info.py
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import common_path  # puts packages/ on sys.path for common.*
+from common.thread_budget import pool_size, limit_child_threads
+import hashlib
+import json
 import cv2
 import numpy as np
 import pytesseract
@@ -7,73 +13,273 @@ import re
 from dataclasses import dataclass
 
 @dataclass
-class Token:
-    text: str
-    x: int; y: int; w: int; h: int
-    conf: float
-    line_id: Tuple[int, int]
+class TokenTable:
+    """
+    OCR words as a structure of arrays: one NumPy column per field instead of one object per word.
+    Row i of every column describes the same token.
+    """
+    text: np.ndarray   # str
+    x: np.ndarray; y: np.ndarray; w: np.ndarray; h: np.ndarray   # float64
+    conf: np.ndarray   # float64
+    block: np.ndarray; line: np.ndarray   # int64
 
-PERCENT_RE = re.compile(r"^-?\d{1,3}(?:[.,]\d+)?\s*%$")
-NUMERIC_RE = re.compile(r"^-?\d{1,3}(?:[.,]\d+)?$")
-LABEL_RE   = re.compile(r"^[A-Za-z][A-Za-z0-9/&\-\s\.]+$")
+    def __len__(self) -> int:
+        return len(self.text)
 
-def _ocr_tokens(image_path: str, min_conf: int = 60) -> List[Token]:
+    @property
+    def line_key(self) -> np.ndarray:
+        """One int64 id per (block, line)."""
+        return self.block * 100000 + self.line
+
+    @classmethod
+    def from_tesseract(cls, data: Dict[str, list], min_conf: float = 60) -> "TokenTable":
+        """Build the table from pytesseract.image_to_data(..., output_type=DICT) in one vectorized pass."""
+        n = len(data["text"])
+        text = np.char.strip(np.asarray([t or "" for t in data["text"]], dtype=str)) if n else np.zeros(0, dtype=str)
+        conf = np.asarray(data["conf"], dtype=np.float64) if "conf" in data else np.zeros(n)
+        keep = (np.char.str_len(text) > 0) & (conf >= min_conf)
+
+        def col(name, dtype):
+            return np.asarray(data[name], dtype=dtype)[keep] if name in data else np.zeros(int(keep.sum()), dtype=dtype)
+        return cls(text=text[keep], x=col("left", np.float64), y=col("top", np.float64),
+                   w=col("width", np.float64), h=col("height", np.float64), conf=conf[keep],
+                   block=col("block_num", np.int64), line=col("line_num", np.int64))
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[str, float, float, float, float, float, int, int]]) -> "TokenTable":
+        """rows: (text, x, y, w, h, conf, block, line) — handy for synthetic layouts."""
+        cols = list(zip(*rows)) if rows else [[]] * 8
+        return cls(text=np.asarray(cols[0], dtype=str),
+                   **{k: np.asarray(c, dtype=np.float64) for k, c in zip(("x", "y", "w", "h", "conf"), cols[1:6])},
+                   block=np.asarray(cols[6], dtype=np.int64), line=np.asarray(cols[7], dtype=np.int64))
+
+PERCENT_RE  = re.compile(r"^-?\d{1,3}(?:[.,]\d+)?\s*%$")
+CURRENCY_RE = re.compile(r"^[-(]?[$€£¥]\s?\d[\d,]*(?:\.\d+)?\s?[kKmMbB]?n?\)?$")
+NUMERIC_RE  = re.compile(r"^-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?$|^-?\d{1,3},\d{1,2}$")
+LABEL_RE    = re.compile(r"^[A-Za-z][A-Za-z0-9/&\-\s\.]+$")
+THOUSANDS_RE = re.compile(r"\d{1,3}(?:,\d{3})+")
+
+VALUE_PATTERNS = {"percent": PERCENT_RE, "currency": CURRENCY_RE, "numeric": NUMERIC_RE}
+DEFAULT_VALUE_KINDS = ("percent", "currency", "numeric")
+
+OCR_CACHE_VERSION = 1
+LINEWISE_SCAN_MAX = 128  # up to this many tokens the per-line scan beats the NumPy setup cost
+
+# ---------- Cheap chart gate ----------
+def looks_like_chart(gray: np.ndarray, min_side: int = 64, max_aspect: float = 8.0,
+                     edge_range: Tuple[float, float] = (0.01, 0.35), min_text_regions: int = 3) -> bool:
+    """
+    Heuristic pre-filter run before Tesseract. Rejects:
+    - tiny images / extreme strips (icons, rules, logos)
+    - images whose edge density is too low (flat fills) or too high (photos, textures)
+    - images without several small text-like regions (no labels / numbers to read)
+    """
+    h, w = gray.shape[:2]
+    if min(h, w) < min_side or max(h, w) / max(min(h, w), 1) > max_aspect:
+        return False
+    edges = cv2.Canny(gray, 100, 200)
+    density = float(np.count_nonzero(edges)) / edges.size
+    if not (edge_range[0] <= density <= edge_range[1]):
+        return False
+    # Text regions: close glyph edges horizontally into word blobs, count word-sized boxes
+    blobs = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3)))
+    n, _, stats, _ = cv2.connectedComponentsWithStats(blobs, connectivity=8)
+    bw, bh = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    text_like = (bh >= 6) & (bh <= h * 0.15) & (bw >= bh) & (bw <= w * 0.6)
+    return int(text_like.sum()) >= min_text_regions
+
+def _downscale(gray: np.ndarray, src_dpi: Optional[float] = None, target_dpi: int = 300,
+               max_side: int = 2000) -> np.ndarray:
+    """Shrink oversized images before Tesseract (to target_dpi if the source DPI is known, else max_side)."""
+    h, w = gray.shape[:2]
+    scale = 1.0
+    if src_dpi and src_dpi > target_dpi:
+        scale = target_dpi / src_dpi
+    scale = min(scale, max_side / max(h, w))
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+def _image_dpi(image_path: str) -> Optional[float]:
+    try:
+        from PIL import Image
+        with Image.open(image_path) as im:
+            dpi = im.info.get("dpi")
+        return float(dpi[0]) if dpi else None
+    except Exception:
+        return None
+
+def _ocr_tokens(image_path: str, min_conf: int = 60, gate: bool = True, target_dpi: int = 300) -> Optional[TokenTable]:
     img = cv2.imread(image_path)
     if img is None:
-        return []
+        return None
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if gate and not looks_like_chart(gray):
+        return None
+    gray = _downscale(gray, _image_dpi(image_path), target_dpi)
     gray = cv2.bilateralFilter(gray, 7, 75, 75)
     thr = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                 cv2.THRESH_BINARY, 31, 2)
     data = pytesseract.image_to_data(thr, output_type=pytesseract.Output.DICT)
-    tokens = []
-    n = len(data["text"])
-    for i in range(n):
-        txt = (data["text"][i] or "").strip()
-        if not txt:
-            continue
-        conf = float(data.get("conf", ["0"]*n)[i])
-        if conf < min_conf:
-            continue
-        x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
-        blk, ln = data.get("block_num", [0]*n)[i], data.get("line_num", [0]*n)[i]
-        tokens.append(Token(text=txt, x=x, y=y, w=w, h=h, conf=conf, line_id=(blk, ln)))
-    return tokens
-
-def _linewise_pairs(tokens: List[Token]):
-    by_line = {}
-    for t in tokens:
-        by_line.setdefault(t.line_id, []).append(t)
-    pairs = []
-    for toks in by_line.values():
-        labels = [t for t in toks if LABEL_RE.match(t.text) and not PERCENT_RE.match(t.text)]
-        percents = [t for t in toks if PERCENT_RE.match(t.text)]
-        if not labels or not percents:
-            continue
-        for p in percents:
-            cand = min(labels, key=lambda L: abs((L.x + L.w) - p.x))
-            pairs.append((cand.text.strip(), p.text.strip()))
-    return pairs
+    return TokenTable.from_tesseract(data, min_conf)
+
+# ---------- Label–value pairing (vectorized) ----------
+_VALUE_RE_CACHE: Dict[Tuple[str, ...], "re.Pattern"] = {}
+
+def _value_re(value_kinds) -> "re.Pattern":
+    """One alternation of the anchored value patterns, so each text is matched once."""
+    key = tuple(value_kinds)
+    if key not in _VALUE_RE_CACHE:
+        _VALUE_RE_CACHE[key] = re.compile("|".join(f"(?:{VALUE_PATTERNS[k].pattern})" for k in key))
+    return _VALUE_RE_CACHE[key]
 
-def _spatial_pairs(tokens: List[Token], max_dist: int = 120):
-    labels = [t for t in tokens if LABEL_RE.match(t.text) and not PERCENT_RE.match(t.text)]
-    percents = [t for t in tokens if PERCENT_RE.match(t.text)]
+def _classify(texts: np.ndarray, value_kinds=DEFAULT_VALUE_KINDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Label / value masks. The regexes run once per distinct text over a plain list (np.unique, then
+    tolist: iterating np.str_ scalars costs several times more) and are scattered back per token.
+    """
+    if not len(texts):
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    uniq, inv = np.unique(texts, return_inverse=True)
+    words = uniq.tolist()
+    is_value = np.fromiter(map(bool, map(_value_re(value_kinds).match, words)), dtype=bool, count=len(words))
+    is_label = np.fromiter(map(bool, map(LABEL_RE.match, words)), dtype=bool, count=len(words)) & ~is_value
+    return is_label[inv.ravel()], is_value[inv.ravel()]
+
+def _grid_nearest(qx: np.ndarray, qy: np.ndarray, px: np.ndarray, py: np.ndarray, max_dist: float):
+    """
+    Nearest point (px, py) for every query within max_dist, via grid buckets of size max_dist:
+    only the 3x3 neighbouring cells are compared. Returns (index or -1, distance).
+    Ties resolve to the lowest point index.
+    """
+    nq = len(qx)
+    best = np.full(nq, -1, dtype=np.int64)
+    best_d = np.full(nq, np.inf)
+    if nq == 0 or len(px) == 0:
+        return best, best_d
+    cell = float(max_dist) if max_dist > 0 else 1.0
+    span = 1 << 20
+    pcx, pcy = np.floor(px / cell).astype(np.int64), np.floor(py / cell).astype(np.int64)
+    qcx, qcy = np.floor(qx / cell).astype(np.int64), np.floor(qy / cell).astype(np.int64)
+    order = np.argsort(pcx * span + pcy, kind="stable")
+    skeys = (pcx * span + pcy)[order]
+
+    q_idx, p_idx = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            keys = (qcx + dx) * span + (qcy + dy)
+            lo = np.searchsorted(skeys, keys, "left")
+            hi = np.searchsorted(skeys, keys, "right")
+            counts = hi - lo
+            if not counts.any():
+                continue
+            qi = np.repeat(np.arange(nq), counts)
+            offs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            q_idx.append(qi)
+            p_idx.append(order[np.repeat(lo, counts) + offs])
+    if not q_idx:
+        return best, best_d
+    qi, pi = np.concatenate(q_idx), np.concatenate(p_idx)
+    d = np.hypot(px[pi] - qx[qi], py[pi] - qy[qi])
+    srt = np.lexsort((pi, d, qi))                    # per query: smallest distance, then lowest index
+    qi, pi, d = qi[srt], pi[srt], d[srt]
+    first = np.ones(len(qi), dtype=bool)
+    first[1:] = qi[1:] != qi[:-1]
+    best[qi[first]], best_d[qi[first]] = pi[first], d[first]
+    out = best_d > max_dist
+    best[out], best_d[out] = -1, np.inf
+    return best, best_d
+
+def _linewise_scan(tokens: TokenTable, value_kinds=DEFAULT_VALUE_KINDS):
+    """Per-line scan over plain lists: same pairs, in the same order, as the vectorized path."""
+    value_re = _value_re(value_kinds)
+    texts, keys = tokens.text.tolist(), tokens.line_key.tolist()
+    x, w = tokens.x.tolist(), tokens.w.tolist()
+    labels, values = {}, []
+    for i, t in enumerate(texts):
+        if value_re.match(t):
+            values.append(i)
+        elif LABEL_RE.match(t):
+            labels.setdefault(keys[i], []).append((x[i] + w[i], i))
     pairs = []
-    for p in percents:
-        pcx, pcy = p.x + p.w/2, p.y + p.h/2
-        best = None; best_d = 1e9
-        for L in labels:
-            Lcx, Lcy = L.x + L.w/2, L.y + L.h/2
-            d = np.hypot(Lcx - pcx, Lcy - pcy)
+    for v in values:
+        cand = labels.get(keys[v])
+        if not cand:
+            continue
+        xv, best, best_d = x[v], -1, float("inf")
+        for right, i in cand:   # strict < keeps the lowest index on ties
+            d = abs(right - xv)
             if d < best_d:
-                best_d, best = d, L
-        if best is not None and best_d <= max_dist:
-            pairs.append((best.text.strip(), p.text.strip()))
+                best, best_d = i, d
+        pairs.append((texts[best], texts[v]))
     return pairs
 
-def extract_chart_kv(image_path: str) -> Dict[str, Any]:
-    toks = _ocr_tokens(image_path)
-    if not toks:
+def _linewise_pairs(tokens: TokenTable, value_kinds=DEFAULT_VALUE_KINDS):
+    """On each OCR line, pair every value with the label whose right edge is closest to the value's left edge."""
+    if tokens is None or not len(tokens):
+        return []
+    if len(tokens) <= LINEWISE_SCAN_MAX:
+        return _linewise_scan(tokens, value_kinds)
+    texts, line = tokens.text, tokens.line_key
+    is_label, is_value = _classify(texts, value_kinds)
+    lab, val = np.flatnonzero(is_label), np.flatnonzero(is_value)
+    if not len(lab) or not len(val):
+        return []
+
+    # Labels sorted by (line, right edge, index) as one composite key; values binary-search it
+    _, rank = np.unique(line, return_inverse=True)
+    big = float(tokens.x.max() + tokens.w.max() + 1)
+    right = tokens.x[lab] + tokens.w[lab]
+    lab_key = rank[lab] * big + right
+    order = np.lexsort((lab, lab_key))
+    s_key, s_rank, s_right, s_lab = lab_key[order], rank[lab][order], right[order], lab[order]
+
+    v_rank, v_x = rank[val], tokens.x[val]
+    pos = np.searchsorted(s_key, v_rank * big + v_x, "left")
+    line_lo = np.searchsorted(s_rank, v_rank, "left")
+    line_hi = np.searchsorted(s_rank, v_rank, "right")
+
+    # successor (first label with right edge >= x) and predecessor (first of its equal-edge run)
+    has_r = pos < line_hi
+    has_l = pos > line_lo
+    r_pos = np.minimum(pos, len(s_key) - 1)
+    l_pos = np.searchsorted(s_key, s_key[np.maximum(pos - 1, 0)], "left")
+    d_r = np.where(has_r, np.abs(s_right[r_pos] - v_x), np.inf)
+    d_l = np.where(has_l, np.abs(s_right[l_pos] - v_x), np.inf)
+    take_l = (d_l < d_r) | ((d_l == d_r) & (s_lab[l_pos] < s_lab[r_pos]))
+    best = np.where(take_l, s_lab[l_pos], s_lab[r_pos])
+    ok = has_l | has_r
+    return [(str(texts[b]), str(texts[v])) for v, b, o in zip(val, best, ok) if o]
+
+def _spatial_pairs(tokens: TokenTable, max_dist: int = 120, value_kinds=DEFAULT_VALUE_KINDS):
+    """Pair every value with the nearest label centre (grid-bucket NN) within max_dist."""
+    if tokens is None or not len(tokens):
+        return []
+    texts = tokens.text
+    is_label, is_value = _classify(texts, value_kinds)
+    lab, val = np.flatnonzero(is_label), np.flatnonzero(is_value)
+    cx, cy = tokens.x + tokens.w / 2, tokens.y + tokens.h / 2
+    best, _ = _grid_nearest(cx[val], cy[val], cx[lab], cy[lab], max_dist)
+    return [(str(texts[lab[b]]), str(texts[v])) for v, b in zip(val, best) if b >= 0]
+
+def _raw_lines(tokens: TokenTable) -> List[str]:
+    """Tokens joined per OCR line, lines in order of first appearance (audit trail)."""
+    keys = tokens.line_key
+    order = np.argsort(keys, kind="stable")
+    _, first = np.unique(keys[order], return_index=True)
+    groups = np.split(tokens.text[order], first[1:])
+    line_order = np.argsort(order[first], kind="stable")
+    return [" ".join(groups[i].tolist()) for i in line_order]
+
+def _normalize_value(val: str) -> str:
+    v = val.replace(" ", "")
+    if THOUSANDS_RE.search(v) and not PERCENT_RE.match(val):
+        return v.replace(",", "")          # 1,234,567 / $1,234.50
+    return v.replace(",", ".")             # European decimal comma: 12,5%
+
+def extract_chart_kv(image_path: str, gate: bool = True, min_conf: int = 60, target_dpi: int = 300) -> Dict[str, Any]:
+    toks = _ocr_tokens(image_path, min_conf=min_conf, gate=gate, target_dpi=target_dpi)
+    if toks is None or not len(toks):
         return {"kv": {}, "raw": []}
     pairs = _linewise_pairs(toks)
     if not pairs:
@@ -84,10 +290,45 @@ def extract_chart_kv(image_path: str) -> Dict[str, Any]:
         if key in seen: 
             continue
         seen.add(key)
-        kv[label] = val.replace(" ", "").replace(",", ".")
+        kv[label] = _normalize_value(val)
     # raw lines for audit
-    raw_lines = {}
-    for t in toks:
-        raw_lines.setdefault(t.line_id, []).append(t.text)
-    raw = [" ".join(v) for v in raw_lines.values()]
-    return {"kv": kv, "raw": raw}
+    return {"kv": kv, "raw": _raw_lines(toks)}
+
+# ---------- Cached / parallel batch OCR ----------
+def _cache_key(image_path: str, gate: bool, min_conf: int, target_dpi: int) -> str:
+    # every option that changes the result is part of the key (a gated run often caches an empty result)
+    with open(image_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return f"{digest}_v{OCR_CACHE_VERSION}_g{int(gate)}_c{min_conf}_d{target_dpi}"
+
+def extract_chart_kv_many(image_paths: List[str], workers: Optional[int] = None,
+                          cache_dir: Optional[Path] = None, gate: bool = True, min_conf: int = 60,
+                          target_dpi: int = 300) -> List[Dict[str, Any]]:
+    """
+    extract_chart_kv for many images: results are cached on disk by image content hash and
+    OCR options (so identical images and re-ingests skip OCR), misses run in a process pool.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+    keys = [None] * len(image_paths)
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for i, p in enumerate(image_paths):
+            keys[i] = _cache_key(p, gate, min_conf, target_dpi)
+            hit = cache_dir / f"{keys[i]}.json"
+            if hit.exists():
+                with open(hit, "r", encoding="utf-8") as f:
+                    results[i] = json.load(f)
+
+    todo = [i for i, r in enumerate(results) if r is None]
+    if todo:
+        # one single-threaded OCR process per budgeted core (thread_budget), not N processes × N threads
+        with ProcessPoolExecutor(max_workers=workers or pool_size(), initializer=limit_child_threads) as pool:
+            computed = list(pool.map(extract_chart_kv, [image_paths[i] for i in todo], [gate] * len(todo),
+                                     [min_conf] * len(todo), [target_dpi] * len(todo)))
+        for i, res in zip(todo, computed):
+            results[i] = res
+            if cache_dir is not None:
+                with open(cache_dir / f"{keys[i]}.json", "w", encoding="utf-8") as f:
+                    json.dump(res, f, ensure_ascii=False)
+    return results
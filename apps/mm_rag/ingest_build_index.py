@@ -1,25 +1,44 @@
 # apps/mm_rag/ingest_build_index.py
-import argparse, json
+import argparse, json, time, shutil
 from pathlib import Path
+from typing import Optional
 
 from io_utils import ensure_dirs, write_jsonl
-from parse_pdf import extract_text_blocks, extract_tables, extract_images
 from table_utils import table_to_row_chunks, table_to_summary_chunks
-from embeddings import TextEmbedder, ImageEmbedder, Captioner
-from image_info import extract_chart_kv
-from indexer import build_faiss_index, save_faiss
+from table_store import build_table_store, save_table_store
+import common_path  # puts packages/ on sys.path for common.*
+from common.doc_store import write_doc_store
+from common.faiss_index import build_faiss_index, describe_index, save_faiss
+from common.hot_swap import publish_staged
+from common.thread_budget import configure
+
+def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True, use_image_kv: bool = True,
+                     ocr_workers: Optional[int] = None, reduce_dim: Optional[int] = None,
+                     image_reduce_dim: Optional[int] = None, reduce_method: str = "pca"):
+    # Heavy deps (PyMuPDF, pdfplumber, OpenCV, Tesseract, torch) are only needed once we actually ingest
+    from parse_pdf import extract_text_blocks, extract_tables, extract_images
+    from embeddings import TextEmbedder, ImageEmbedder, Captioner
+    from image_info import extract_chart_kv_many
 
-def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True, use_image_kv: bool = True):
     ensure_dirs(data_root)
+    # index files are staged and published together at the end, so a running retriever
+    # keeps serving the previous index until the new one is complete (hot_swap.py)
+    index_dir = data_root / "index"
+    staging = index_dir / ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
 
     # 1) Parse
     print("Extracting text blocks...")
     text_blocks = extract_text_blocks(pdf_path)
 
     print("Extracting tables...")
-    tables = extract_tables(pdf_path)
+    table_report = {}
+    tables = extract_tables(pdf_path, report=table_report)
+    print(f"  pdfplumber ran on {table_report['pages_scanned']}/{table_report['pages_total']} pages "
+          f"(skipped {table_report['pages_skipped']}, ~{table_report['est_saved_s']:.1f}s saved)")
 
-    print("Extracting images & page snapshots...")
+    print("Extracting embedded images (deduplicated)...")
     media = extract_images(pdf_path, data_root)
     embedded_images = [m for m in media if m["modality"] == "image"]
 
@@ -29,6 +48,9 @@ def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True,
     write_jsonl(parsed_dir / "tables.jsonl", tables)
     write_jsonl(parsed_dir / "media.jsonl", media)
 
+    # Structured table store for exact row/column lookups
+    save_table_store(build_table_store(tables), staging / "table_store.json")
+
     # 2) Build text items
     text_items = []
     # text blocks
@@ -55,6 +77,10 @@ def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True,
     if use_captions and img_paths:
         captioner = Captioner()
         captions = captioner.caption_paths(img_paths)
+    kv_results = []
+    if use_image_kv and img_paths:
+        print("Extracting chart values (OCR)...")
+        kv_results = extract_chart_kv_many(img_paths, workers=ocr_workers, cache_dir=parsed_dir / "ocr_cache")
 
     for k, im in enumerate(embedded_images):
         img_items.append({
@@ -62,7 +88,8 @@ def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True,
             "modality": "image",
             "page": im["page"],
             "path": im["path"],
-            "xref": im.get("xref")
+            "xref": im.get("xref"),
+            "pages": im.get("pages", [im["page"]])
         })
 
         if use_captions and captions:
@@ -76,7 +103,7 @@ def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True,
             })
 
         if use_image_kv:
-            kv_res = extract_chart_kv(im["path"])
+            kv_res = kv_results[k]
             if kv_res and kv_res.get("kv"):
                 kv_pairs = "; ".join([f"{k_}: {v_}" for k_, v_ in kv_res["kv"].items()])
                 text_items.append({
@@ -92,25 +119,32 @@ def ingest_and_index(pdf_path: Path, data_root: Path, use_captions: bool = True,
     print(f"Embedding {len(text_items)} text/table/image-info chunks...")
     t_embedder = TextEmbedder()
     text_vecs = t_embedder.encode([ti["text"] for ti in text_items])
-    text_index = build_faiss_index(text_vecs, metric="cosine")
-    save_faiss(text_index, data_root / "index" / "text.faiss")
-    with open(data_root / "index" / "text_meta.jsonl", "w", encoding="utf-8") as f:
-        for ti in text_items:
-            f.write(json.dumps(ti, ensure_ascii=False) + "\n")
+    text_index = build_faiss_index(text_vecs, metric="cosine", reduce_dim=reduce_dim, reduce_method=reduce_method)
+    save_faiss(text_index, staging / "text.faiss")
+    write_doc_store(text_items, staging / "text_meta.bin")
+    write_jsonl(staging / "text_meta.jsonl", text_items)  # human-readable copy
 
     # 5) Image index (CLIP)
     print(f"Embedding {len(img_items)} images with CLIP...")
     i_embedder = ImageEmbedder()
     img_vecs = i_embedder.encode_paths([im["path"] for im in img_items])
-    img_index = build_faiss_index(img_vecs, metric="cosine")
-    save_faiss(img_index, data_root / "index" / "image.faiss")
-    with open(data_root / "index" / "image_meta.jsonl", "w", encoding="utf-8") as f:
-        for ii in img_items:
-            f.write(json.dumps(ii, ensure_ascii=False) + "\n")
+    img_index = build_faiss_index(img_vecs, metric="cosine", reduce_dim=image_reduce_dim, reduce_method=reduce_method)
+    save_faiss(img_index, staging / "image.faiss")
+    write_doc_store(img_items, staging / "image_meta.bin")
+    write_jsonl(staging / "image_meta.jsonl", img_items)  # human-readable copy
+
+    # Source PDF for on-demand page snapshots (page_images.PageImageCache); published last, so its
+    # change also marks a new index version for query_cache and hot_swap
+    with open(staging / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({"pdf_path": str(pdf_path), "built_at": time.time(),
+                   "text_index": describe_index(text_index), "image_index": describe_index(img_index)},
+                  f, ensure_ascii=False, indent=2)
+    publish_staged(staging, index_dir)
 
     print("\n✅ Ingest complete.")
-    print(f"- Text vectors:  {len(text_items)}")
-    print(f"- Image vectors: {len(img_items)}")
+    t_info, i_info = describe_index(text_index), describe_index(img_index)
+    print(f"- Text vectors:  {len(text_items)} ({t_info['dim']}-d{', ' + t_info['transform'] if t_info['transform'] else ''})")
+    print(f"- Image vectors: {len(img_items)} ({i_info['dim']}-d{', ' + i_info['transform'] if i_info['transform'] else ''})")
     print(f"- Data root:     {data_root}")
 
 if __name__ == "__main__":
@@ -119,11 +153,20 @@ if __name__ == "__main__":
     ap.add_argument("--data_root", default="data/mm_rag", type=str)
     ap.add_argument("--no_captions", action="store_true")
     ap.add_argument("--no_image_kv", action="store_true")
+    ap.add_argument("--ocr_workers", type=int, default=None)
+    ap.add_argument("--reduce_dim", type=int, default=None, help="project text vectors to this many dims (e.g. 128)")
+    ap.add_argument("--image_reduce_dim", type=int, default=None, help="project CLIP image vectors to this many dims")
+    ap.add_argument("--reduce_method", default="pca", choices=["pca", "opq"])
     args = ap.parse_args()
+    configure("ingest")
 
     ingest_and_index(
         Path(args.pdf).resolve(),
         Path(args.data_root).resolve(),
         use_captions=not args.no_captions,
-        use_image_kv=not args.no_image_kv
+        use_image_kv=not args.no_image_kv,
+        ocr_workers=args.ocr_workers,
+        reduce_dim=args.reduce_dim,
+        image_reduce_dim=args.image_reduce_dim,
+        reduce_method=args.reduce_method
     )
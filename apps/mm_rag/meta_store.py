@@ -0,0 +1,16 @@
+# apps/mm_rag/meta_store.py
+# Index metadata (text_meta / image_meta) with O(1) random access by vector id: the
+# memory-mapped record store shared with apps/semantic_search (packages/common/doc_store.py),
+# falling back to the JSONL files written by older ingests.
+from pathlib import Path
+from typing import Any, Dict, List, Union
+import common_path  # puts packages/ on sys.path for common.*
+from common.doc_store import DocStore
+from io_utils import load_jsonl
+
+def open_meta(index_dir: Path, name: str) -> Union[DocStore, List[Dict[str, Any]]]:
+    """<name>.bin if present, else the legacy <name>.jsonl fully parsed (older indexes)."""
+    bin_path = Path(index_dir) / f"{name}.bin"
+    if bin_path.exists():
+        return DocStore(bin_path)
+    return load_jsonl(Path(index_dir) / f"{name}.jsonl")
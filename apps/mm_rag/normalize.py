@@ -1,4 +1,6 @@
 import re
+import common_path  # puts packages/ on sys.path for common.*
+from common.tracing import span
 
 # We can expand more acronyms as needed and setup a bigger dictionary or use an LLM based on context.
 
@@ -44,6 +46,8 @@ def normalize_dates(query: str) -> str:
     return query
 
 def normalize_query(query: str) -> str:
-    q = expand_acronyms(query)
-    q = normalize_dates(q)
+    with span("normalize.acronyms"):
+        q = expand_acronyms(query)
+    with span("normalize.dates"):
+        q = normalize_dates(q)
     return q
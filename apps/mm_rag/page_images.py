@@ -0,0 +1,60 @@
+# apps/mm_rag/page_images.py
+# Page snapshots are rendered on first request and kept in a byte-bounded on-disk LRU cache,
+# instead of rasterizing every page at ingest time.
+import os
+from pathlib import Path
+from typing import Optional
+
+FORMATS = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "webp": "webp"}
+
+class PageImageCache:
+    def __init__(self, pdf_path: Path, cache_dir: Path, dpi: int = 150, fmt: str = "jpeg",
+                 quality: int = 85, max_bytes: int = 256 * 1024 * 1024):
+        if fmt.lower() not in FORMATS:
+            raise ValueError(f"Unsupported page image format: {fmt} (use one of {sorted(FORMATS)})")
+        self.pdf_path = Path(pdf_path)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.dpi = dpi
+        self.ext = FORMATS[fmt.lower()]
+        self.quality = quality
+        self.max_bytes = max_bytes
+
+    def path_for(self, page: int) -> Path:
+        return self.cache_dir / f"{self.pdf_path.stem}_p{page:03d}_{self.dpi}dpi.{self.ext}"
+
+    def get(self, page: int) -> Path:
+        """Path to the rendered page, rendering (and evicting old snapshots) on a miss."""
+        path = self.path_for(page)
+        if path.exists():
+            os.utime(path)  # bump recency for LRU
+            return path
+        self._render(page, path)
+        self._evict(keep=path)
+        return path
+
+    def _render(self, page: int, path: Path):
+        import fitz  # PyMuPDF
+        with fitz.open(self.pdf_path) as doc:
+            pix = doc[page].get_pixmap(dpi=self.dpi)
+        tmp = path.with_name(path.name + ".part")
+        if self.ext == "png":
+            pix.save(str(tmp), output="png")
+        else:
+            from PIL import Image
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples) if pix.n < 4 \
+                else Image.frombytes("RGBA", (pix.width, pix.height), pix.samples).convert("RGB")
+            img.save(tmp, format="JPEG" if self.ext == "jpg" else "WEBP", quality=self.quality)
+        tmp.replace(path)
+
+    def _evict(self, keep: Optional[Path] = None):
+        files = [p for p in self.cache_dir.iterdir() if p.is_file() and not p.name.endswith(".part")]
+        stats = {p: p.stat() for p in files}
+        total = sum(st.st_size for st in stats.values())
+        for p in sorted(files, key=lambda p: stats[p].st_mtime):
+            if total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            total -= stats[p].st_size
+            p.unlink(missing_ok=True)
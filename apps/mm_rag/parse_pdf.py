@@ -1,5 +1,7 @@
+import hashlib
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import fitz  # PyMuPDF
 import pdfplumber
 
@@ -21,12 +23,69 @@ def extract_text_blocks(pdf_path: Path) -> List[Dict[str, Any]]:
     doc.close()
     return out
 
-def extract_tables(pdf_path: Path) -> List[Dict[str, Any]]:
+def _page_table_stats(page, row_tol: float = 3.0, x_tol: float = 5.0, min_rows: int = 3) -> Dict[str, int]:
+    """
+    Cheap PyMuPDF statistics for one page:
+    - horizontal / vertical ruling edges from vector drawings (lines, rectangles, curve boxes)
+    - text columns: left edges (x0) shared by words on at least min_rows distinct text rows
+    """
+    h_edges = v_edges = 0
+    for d in page.get_drawings():
+        for item in d.get("items", []):
+            kind = item[0]
+            if kind == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) <= 1:
+                    h_edges += 1
+                elif abs(p1.x - p2.x) <= 1:
+                    v_edges += 1
+            elif kind in ("re", "qu", "c"):
+                h_edges += 2; v_edges += 2
+
+    rows_by_x = {}
+    for w in page.get_text("words"):
+        rows_by_x.setdefault(round(w[0] / x_tol), set()).add(round(w[1] / row_tol))
+    aligned_columns = sum(1 for rows in rows_by_x.values() if len(rows) >= min_rows)
+    return {"h_edges": h_edges, "v_edges": v_edges, "aligned_columns": aligned_columns}
+
+def table_candidate_pages(pdf_path: Path, text_strategy: bool = False, min_columns: int = 3):
+    """
+    Pages worth running pdfplumber on. With pdfplumber's default "lines" strategy a table needs
+    ruling edges in both directions, so pages without them cannot yield a table and are skipped.
+    With a text strategy, pages with >= min_columns aligned text columns are kept as well.
+    Returns (candidate page numbers, per-page stats).
+    """
+    candidates, stats = [], []
+    with fitz.open(pdf_path) as doc:
+        for pno in range(len(doc)):
+            st = _page_table_stats(doc[pno])
+            ruled = st["h_edges"] >= 2 and st["v_edges"] >= 2
+            aligned = text_strategy and st["aligned_columns"] >= min_columns
+            st["candidate"] = ruled or aligned
+            stats.append(st)
+            if st["candidate"]:
+                candidates.append(pno)
+    return candidates, stats
+
+def extract_tables(pdf_path: Path, prefilter: bool = True, table_settings: Optional[Dict[str, Any]] = None,
+                   report: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    pdfplumber table extraction, restricted (when prefilter=True) to pages flagged by
+    table_candidate_pages. Pass a dict as report to receive pages skipped / timing.
+    """
     out = []
+    t0 = time.perf_counter()
+    text_strategy = bool(table_settings) and "text" in (table_settings.get("vertical_strategy"),
+                                                        table_settings.get("horizontal_strategy"))
+    pages = table_candidate_pages(pdf_path, text_strategy)[0] if prefilter else None
+    t1 = time.perf_counter()
     with pdfplumber.open(pdf_path) as pdf:
-        for pno, page in enumerate(pdf.pages):
+        n_pages = len(pdf.pages)
+        for pno in (pages if pages is not None else range(n_pages)):
+            page = pdf.pages[pno]
             try:
-                tables = page.extract_tables() or []
+                tables = page.extract_tables(table_settings) if table_settings else page.extract_tables()
+                tables = tables or []
             except Exception:
                 tables = []
             for t_idx, table in enumerate(tables):
@@ -42,34 +101,57 @@ def extract_tables(pdf_path: Path) -> List[Dict[str, Any]]:
                     "header": header,
                     "rows": rows
                 })
+    t2 = time.perf_counter()
+    if report is not None:
+        scanned = n_pages if pages is None else len(pages)
+        per_page = (t2 - t1) / scanned if scanned else 0.0
+        report.update({
+            "pages_total": n_pages,
+            "pages_scanned": scanned,
+            "pages_skipped": n_pages - scanned,
+            "prefilter_s": round(t1 - t0, 4),
+            "extract_s": round(t2 - t1, 4),
+            "est_saved_s": round(per_page * (n_pages - scanned) - (t1 - t0), 4),
+        })
     return out
 
 def extract_images(pdf_path: Path, out_dir: Path):
+    """
+    Write each distinct embedded image once. Images are deduplicated by xref (the same
+    object placed on several pages) and by content hash (identical bytes under different
+    xrefs); every entry lists all pages it appears on. Page snapshots are no longer
+    rendered here — see page_images.PageImageCache for on-demand rendering.
+    """
     out = []
+    by_xref, by_hash = {}, {}
     doc = fitz.open(pdf_path)
     for pno in range(len(doc)):
         page = doc[pno]
         for idx, img in enumerate(page.get_images(full=True)):
             xref = img[0]
-            base = doc.extract_image(xref)
-            img_bytes = base["image"]
-            ext = base.get("ext", "png")
-            img_path = out_dir / "parsed" / "images" / f"page_{pno:03d}_img_{idx}_{xref}.{ext}"
-            with open(img_path, "wb") as f:
-                f.write(img_bytes)
-            out.append({
-                "modality": "image",
-                "page": pno,
-                "xref": int(xref),
-                "path": str(img_path)
-            })
-        pix = page.get_pixmap(dpi=150)
-        page_img_path = out_dir / "parsed" / "page_images" / f"page_{pno:03d}.png"
-        pix.save(str(page_img_path))
-        out.append({
-            "modality": "page_image",
-            "page": pno,
-            "path": str(page_img_path)
-        })
+            entry = by_xref.get(xref)
+            if entry is None:
+                base = doc.extract_image(xref)
+                img_bytes = base["image"]
+                digest = hashlib.sha1(img_bytes).hexdigest()
+                entry = by_hash.get(digest)
+                if entry is None:
+                    ext = base.get("ext", "png")
+                    img_path = out_dir / "parsed" / "images" / f"page_{pno:03d}_img_{idx}_{xref}.{ext}"
+                    with open(img_path, "wb") as f:
+                        f.write(img_bytes)
+                    entry = {
+                        "modality": "image",
+                        "page": pno,
+                        "pages": [],
+                        "xref": int(xref),
+                        "sha1": digest,
+                        "path": str(img_path)
+                    }
+                    by_hash[digest] = entry
+                    out.append(entry)
+                by_xref[xref] = entry
+            if pno not in entry["pages"]:
+                entry["pages"].append(pno)
     doc.close()
     return out
@@ -1,6 +1,17 @@
-import argparse
+import argparse, json
 from pathlib import Path
 from retriever import retrieve
+import common_path  # puts packages/ on sys.path for common.*
+from common.tracing import start_trace, span, write_chrome_trace
+from common.thread_budget import configure
+
+def page_preview(data_root: Path, page: int, dpi: int = 150, fmt: str = "jpeg") -> str:
+    """Render (or fetch from cache) the snapshot of one page of the ingested PDF."""
+    from page_images import PageImageCache
+    with open(data_root / "index" / "manifest.json", "r", encoding="utf-8") as f:
+        pdf_path = json.load(f)["pdf_path"]
+    cache = PageImageCache(pdf_path, data_root / "parsed" / "page_images", dpi=dpi, fmt=fmt)
+    return str(cache.get(page))
 
 def format_response(query: str, res):
     best = res["text_hits"][0] if res["text_hits"] else {}
@@ -18,10 +29,18 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--q", required=True)
     ap.add_argument("--data_root", default="data/mm_rag")
+    ap.add_argument("--page_preview", action="store_true", help="render a snapshot of the cited page")
+    ap.add_argument("--preview_dpi", type=int, default=150)
+    ap.add_argument("--preview_format", default="jpeg", choices=["png", "jpeg", "webp"])
+    ap.add_argument("--timings", action="store_true", help="print per-stage latency")
+    ap.add_argument("--trace_out", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) of the query")
     args = ap.parse_args()
+    configure("query")
 
-    res = retrieve(args.q, Path(args.data_root))
-    out = format_response(args.q, res)
+    with start_trace("query") as trace:
+        res = retrieve(args.q, Path(args.data_root))
+        with span("output"):
+            out = format_response(args.q, res)
 
     print("\nQ:", out["query"])
     print("Normalized Q:", out["normalized_query"])
@@ -30,3 +49,11 @@ if __name__ == "__main__":
         print("Citation:", out["citation"])
     if out["image_previews"]:
         print("Image previews:", out["image_previews"])
+    if args.page_preview and out["citation"]:
+        print("Page preview:", page_preview(Path(args.data_root), out["citation"]["page"],
+                                            args.preview_dpi, args.preview_format))
+    if args.timings:
+        print("Timings (ms):", trace.timings())
+    if args.trace_out:
+        write_chrome_trace([trace], args.trace_out)
+        print("Trace written to", args.trace_out)
@@ -1,16 +1,54 @@
-from typing import List, Dict
-from sentence_transformers import CrossEncoder
+import time
+from typing import List, Dict, Optional
+import common_path  # puts packages/ on sys.path for common.*
+from common.onnx_backend import load_cross_encoder
+from common.tracing import span
 
 class Reranker:
-    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        self.model = CrossEncoder(model_name)
+    """
+    Cascaded cross-encoder reranker.
+    A cheap first stage (retriever cosine score, or an optional tiny cross-encoder) prunes
+    candidates; the full model scores survivors in batches until the optional time budget
+    runs out, after which the best-so-far ranking is returned.
+    """
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 first_stage_model: Optional[str] = None):
+        self.model = load_cross_encoder(model_name)
+        self.first_stage = load_cross_encoder(first_stage_model) if first_stage_model else None
 
-    def rerank(self, query: str, hits: List[Dict], top_k: int = 5) -> List[Dict]:
+    def prune(self, query: str, hits: List[Dict], prefilter_k: Optional[int] = None,
+              min_score: Optional[float] = None) -> List[Dict]:
+        if self.first_stage is not None:
+            scores = self.first_stage.predict([(query, h["meta"]["text"]) for h in hits])
+            for h, s in zip(hits, scores):
+                h["first_stage_score"] = float(s)
+        else:
+            for h in hits:
+                h["first_stage_score"] = float(h.get("score", 0.0))
+        survivors = sorted(hits, key=lambda h: h["first_stage_score"], reverse=True)
+        if min_score is not None:
+            survivors = [h for h in survivors if h["first_stage_score"] >= min_score] or survivors[:1]
+        if prefilter_k is not None:
+            survivors = survivors[:prefilter_k]
+        return survivors
+
+    def rerank(self, query: str, hits: List[Dict], top_k: int = 5, prefilter_k: Optional[int] = None,
+               min_score: Optional[float] = None, budget_ms: Optional[float] = None,
+               batch_size: int = 16) -> List[Dict]:
         if not hits:
             return []
-        pairs = [(query, h["meta"]["text"]) for h in hits]
-        scores = self.model.predict(pairs)
-        for h, s in zip(hits, scores):
-            h["rerank_score"] = float(s)
-        sorted_hits = sorted(hits, key=lambda h: h["rerank_score"], reverse=True)
+        start = time.perf_counter()
+        with span("rerank.prune"):
+            pending = self.prune(query, hits, prefilter_k, min_score)
+        scored = []
+        with span("rerank.cross_encoder", candidates=len(pending)):
+            while pending:
+                if budget_ms is not None and scored and (time.perf_counter() - start) * 1000 >= budget_ms:
+                    break
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                scores = self.model.predict([(query, h["meta"]["text"]) for h in batch])
+                for h, s in zip(batch, scores):
+                    h["rerank_score"] = float(s)
+                scored.extend(batch)
+        sorted_hits = sorted(scored, key=lambda h: h["rerank_score"], reverse=True) + pending
         return sorted_hits[:top_k]
@@ -1,11 +1,20 @@
 from pathlib import Path
-from typing import Dict, Any
-import faiss
-from io_utils import load_jsonl
-from indexer import load_faiss
+from typing import Dict, Any, Optional
+from meta_store import open_meta
 from embeddings import TextEmbedder, ImageEmbedder
 from normalize import normalize_query
 from reranker import Reranker
+from dedup import dedup_hits
+from table_store import TableStore
+import common_path  # puts packages/ on sys.path for common.*
+from common.query_cache import QUERY_CACHE
+from common.hot_swap import HotSwapIndex
+from common.faiss_index import load_faiss
+from common.onnx_backend import BACKEND
+from common.tracing import span
+
+TEXT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CLIP_MODEL, CLIP_PRETRAINED = "ViT-B-32", "openai"
 
 PREF_ORDER = {"table_row": 0, "image_kv": 1, "image_caption": 2, "image_ocr": 3, "text": 4, "table_summary": 9}
 
@@ -20,26 +29,107 @@ def _filter_and_rank_text_hits(hits):
         cleaned.append(h)
     return sorted(cleaned, key=lambda h: (PREF_ORDER.get(h["meta"].get("modality", "text"), 99), -h["score"]))
 
-def retrieve(query: str, data_root: Path, k_text: int = 20, k_img: int = 6, use_rerank=True) -> Dict[str, Any]:
+# Resident indexes per data root; a re-ingest is swapped in without restarting (hot_swap.py)
+_INDEXES: Dict[str, HotSwapIndex] = {}
+
+def _load_indexes(data_root: Path) -> Dict[str, Any]:
+    index_dir = data_root / "index"
+    return {"text_index": load_faiss(index_dir / "text.faiss", mmap=True),
+            "text_meta": open_meta(index_dir, "text_meta"),
+            "image_index": load_faiss(index_dir / "image.faiss", mmap=True),
+            "image_meta": open_meta(index_dir, "image_meta"),
+            "table_store": TableStore.load(index_dir / "table_store.json")}
+
+def _indexes(data_root: Path) -> HotSwapIndex:
+    key = str(Path(data_root).resolve())
+    if key not in _INDEXES:
+        with span("load_index"):
+            _INDEXES[key] = HotSwapIndex(Path(key) / "index", lambda: _load_indexes(Path(key)))
+    return _INDEXES[key]
+
+def index_stats(data_root: Path) -> Dict[str, Any]:
+    """Current index version and recent hot swaps (load / swap time, memory overlap)."""
+    return _indexes(data_root).stats()
+
+def retrieve(query: str, data_root: Path, k_text: int = 20, k_img: int = 6, use_rerank=True,
+             use_dedup=True, dup_threshold: float = 0.92, max_per_page: int = 3, k_dedup: int = 10,
+             rerank_prefilter_k: Optional[int] = None, rerank_budget_ms: Optional[float] = None,
+             use_structured=True, use_cache=True) -> Dict[str, Any]:
+    """
+    Text + image hits for query. Dedup is on by default: the k_text dense hits are cut to at
+    most k_dedup (10) by MMR, dropping near-duplicates (cosine >= dup_threshold) and more than
+    max_per_page hits per page, so the reranker scores at most k_dedup pairs. Pass
+    use_dedup=False to rerank all k_text hits.
+    """
+    opts = (k_text, k_img, use_rerank, use_dedup, dup_threshold, max_per_page, k_dedup,
+            rerank_prefilter_k, rerank_budget_ms, use_structured)
+    # the generation stays pinned until this query is done, even if a newer one is swapped in
+    with _indexes(data_root).acquire() as gen:
+        if not use_cache:
+            return _retrieve(query, gen.resources, *opts, use_cache=False)
+        # results are keyed on the index version, so a re-ingest invalidates them
+        index_key = str(Path(data_root).resolve())
+        QUERY_CACHE.sync_version(index_key, gen.version)
+        with span("retrieve"):
+            return QUERY_CACHE.result((index_key, gen.version, query) + opts,
+                                      lambda: _retrieve(query, gen.resources, *opts, use_cache=True))
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the in-process query cache."""
+    return QUERY_CACHE.stats()
+
+def _encode_query(kind: str, norm_q: str, use_cache: bool):
+    if kind == "text":
+        model_id, encode = f"text:{TEXT_MODEL}:{BACKEND}", lambda: TextEmbedder(TEXT_MODEL).encode([norm_q])
+    else:
+        model_id = f"clip:{CLIP_MODEL}:{CLIP_PRETRAINED}"
+        encode = lambda: ImageEmbedder(CLIP_MODEL, CLIP_PRETRAINED).encode_text_for_clip([norm_q])
+    # models are only constructed on a cache miss
+    with span(f"embed.{kind}"):
+        return QUERY_CACHE.embedding(model_id, norm_q, encode) if use_cache else encode()
+
+def _retrieve(query, idx, k_text, k_img, use_rerank, use_dedup, dup_threshold, max_per_page,
+              k_dedup, rerank_prefilter_k, rerank_budget_ms, use_structured, use_cache):
     norm_q = normalize_query(query)
 
-    text_index = load_faiss(data_root / "index" / "text.faiss")
-    text_meta = load_jsonl(data_root / "index" / "text_meta.jsonl")
-    t_emb = TextEmbedder()
-    qv = t_emb.encode([norm_q]); faiss.normalize_L2(qv)
-    D_t, I_t = text_index.search(qv, k_text)
-    text_hits = [{"score": float(s), "meta": text_meta[i]} for s, i in zip(D_t[0], I_t[0])]
-    text_hits = _filter_and_rank_text_hits(text_hits)
+    # Exact table cell lookup first: a full row + column match answers the query without any
+    # encoding, rerank or image search; a partial match goes on top of the dense hits
+    cell = None
+    if use_structured:
+        with span("table_lookup"):
+            store = idx["table_store"]
+            cell = store.lookup(norm_q) if store else None
+        if cell is not None and cell["exact"]:
+            return {"text_hits": [cell], "image_hits": [], "normalized_query": norm_q,
+                    "table_cell": cell, "structured": True}
+
+    text_index, text_meta = idx["text_index"], idx["text_meta"]
+    qv = _encode_query("text", norm_q, use_cache)  # already L2-normalized by TextEmbedder
+    with span("faiss.text", k=k_text):
+        D_t, I_t = text_index.search(qv, k_text)
+    with span("rank_hits"):
+        text_hits = [{"score": float(s), "vid": int(i), "meta": text_meta[i]} for s, i in zip(D_t[0], I_t[0]) if i != -1]
+        text_hits = _filter_and_rank_text_hits(text_hits)
+
+    # Near-duplicate / per-page suppression before the cross-encoder sees the candidates
+    if use_dedup and text_hits:
+        with span("dedup"):
+            cand_vecs = text_index.reconstruct_batch([h["vid"] for h in text_hits])
+            text_hits = dedup_hits(text_hits, cand_vecs, k=k_dedup,
+                                   dup_threshold=dup_threshold, max_per_page=max_per_page)
 
     if use_rerank and text_hits:
-        rr = Reranker()
-        text_hits = rr.rerank(norm_q, text_hits, top_k=5)
+        with span("rerank.load_model"):
+            rr = Reranker()
+        text_hits = rr.rerank(norm_q, text_hits, top_k=5,
+                              prefilter_k=rerank_prefilter_k, budget_ms=rerank_budget_ms)
 
-    img_index = load_faiss(data_root / "index" / "image.faiss")
-    img_meta = load_jsonl(data_root / "index" / "image_meta.jsonl")
-    i_emb = ImageEmbedder()
-    qimg = i_emb.encode_text_for_clip([norm_q])
-    D_i, I_i = img_index.search(qimg, k_img)
-    img_hits = [{"score": float(s), "meta": img_meta[i]} for s, i in zip(D_i[0], I_i[0])]
+    img_index, img_meta = idx["image_index"], idx["image_meta"]
+    qimg = _encode_query("clip", norm_q, use_cache)
+    with span("faiss.image", k=k_img):
+        D_i, I_i = img_index.search(qimg, k_img)
+    img_hits = [{"score": float(s), "meta": img_meta[i]} for s, i in zip(D_i[0], I_i[0]) if i != -1]
 
-    return {"text_hits": text_hits, "image_hits": img_hits, "normalized_query": norm_q}
+    if cell is not None:
+        text_hits = [cell] + text_hits
+    return {"text_hits": text_hits, "image_hits": img_hits, "normalized_query": norm_q, "table_cell": cell}
@@ -0,0 +1,183 @@
+# apps/mm_rag/table_store.py
+# Columnar store for extracted tables + inverted index on header / row labels.
+# Lets "NAV for Q2 2024"-style questions be answered by exact row/column lookup; dense
+# retrieval runs only when the match is partial (the cell then goes on top) or missing.
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from normalize import normalize_dates
+
+STOPWORDS = {"a", "an", "the", "of", "for", "in", "on", "at", "to", "is", "are", "was", "what", "which",
+             "how", "much", "many", "does", "do", "and", "or", "with", "by", "as", "from", "value", "s"}
+TERM_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+NUM_TERM_RE = re.compile(r"^[0-9.]+$")
+NUM_RE = re.compile(r"^\(?-?[$€£¥]?\s*-?[\d,]*\.?\d+\s*(%|[kmb]n?)?\)?$", re.IGNORECASE)
+
+def analyze(text: str) -> List[str]:
+    """Lowercased terms with quarters/months resolved the same way queries are (normalize_dates)."""
+    text = normalize_dates(re.sub(r"\s+", " ", text or ""))
+    return [t for t in TERM_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def parse_number(cell: str) -> Optional[float]:
+    """'1,234.5' / '$12' / '6.96%' / '(3.2)' → float; anything else → None."""
+    c = (cell or "").strip()
+    if not c or not NUM_RE.match(c):
+        return None
+    neg = c.startswith("(") and c.endswith(")")
+    c = re.sub(r"[()$€£¥%,\s]", "", c)
+    mult = 1.0
+    m = re.search(r"([kmb])n?$", c, re.IGNORECASE)
+    if m:
+        mult = {"k": 1e3, "m": 1e6, "b": 1e9}[m.group(1).lower()]
+        c = c[:m.start()]
+    try:
+        v = float(c) * mult
+    except ValueError:
+        return None
+    return -v if neg else v
+
+# ---------- Build ----------
+def build_table_store(tables: List[Dict[str, Any]], numeric_ratio: float = 0.6) -> Dict[str, Any]:
+    """
+    Columnar layout per table: header-typed columns (numeric / text) with raw strings and parsed
+    numbers, first column as row labels, plus an inverted index term → [[table, "col"|"row", pos]].
+    """
+    out_tables, inverted = [], {}
+
+    def add(term, ref):
+        refs = inverted.setdefault(term, [])
+        if not refs or refs[-1] != ref:
+            refs.append(ref)
+
+    for t in tables:
+        rows = [r for r in t.get("rows", []) if any((c or "").strip() for c in r)]
+        header = [re.sub(r"\s+", " ", h or "").strip() for h in t.get("header", [])]
+        if not rows or not header:
+            continue
+        width = max(len(header), max(len(r) for r in rows))
+        header = header + [""] * (width - len(header))
+        grid = [[(r[j] if j < len(r) else "") or "" for j in range(width)] for r in rows]
+
+        columns = []
+        for j in range(width):
+            values = [re.sub(r"\s+", " ", row[j]).strip() for row in grid]
+            numbers = [parse_number(v) for v in values]
+            filled = [v for v in values if v]
+            is_num = bool(filled) and sum(n is not None for n in numbers) >= numeric_ratio * len(filled)
+            columns.append({"name": header[j], "type": "numeric" if is_num else "text",
+                            "values": values, "numbers": numbers if is_num else None})
+
+        tid = len(out_tables)
+        row_labels = columns[0]["values"]
+        out_tables.append({"page": t["page"], "table_idx": t["table_idx"], "header": header,
+                           "row_labels": row_labels, "columns": columns})
+        for j, h in enumerate(header):
+            for term in analyze(h):
+                add(term, [tid, "col", j])
+        for i, label in enumerate(row_labels):
+            for term in analyze(label):
+                add(term, [tid, "row", i])
+    return {"tables": out_tables, "inverted": inverted}
+
+def save_table_store(store: Dict[str, Any], path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False)
+
+# ---------- Lookup ----------
+class TableStore:
+    def __init__(self, store: Dict[str, Any]):
+        self.tables = store["tables"]
+        self.inverted = store["inverted"]
+        # number of distinct terms per header / row label (coverage denominators)
+        self._col_len = [[max(len(set(analyze(h))), 1) for h in t["header"]] for t in self.tables]
+        self._row_len = [[max(len(set(analyze(r))), 1) for r in t["row_labels"]] for t in self.tables]
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["TableStore"]:
+        if not Path(path).exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _informative(self, matched: Set[str], cov: float, min_coverage: float) -> bool:
+        """A header / label match counts when it covers min_coverage of its terms, is not numbers
+        only ("1" alone must not select the "1 yr" column), and a partial match spans >= 2 terms."""
+        if cov < min_coverage or all(NUM_TERM_RE.match(t) for t in matched):
+            return False
+        return cov >= 1.0 or len(matched) >= 2
+
+    def lookup(self, query: str, min_coverage: float = 0.75) -> Optional[Dict[str, Any]]:
+        """
+        Exact cell lookup: pick the (row label, column header) pair that covers the most query
+        terms. Row and column must be matched by disjoint query terms (a term repeated in the
+        query may serve both), each match must pass _informative, and multi-row tables need a
+        row match. Returns a hit shaped like retriever text hits, or None when nothing matches;
+        hit["exact"] is True when the row label and the column header are both fully covered.
+        """
+        q_counts = Counter(analyze(query))
+        if not q_counts:
+            return None
+        # term postings → matched query terms per header / row label
+        matched = {}
+        for term in q_counts:
+            for tid, kind, pos in self.inverted.get(term, []):
+                matched.setdefault((tid, kind, pos), set()).add(term)
+        cols, rows = {}, {}
+        for (tid, kind, pos), terms in matched.items():
+            if kind == "col":
+                if pos == 0:  # first column holds row labels, not values
+                    continue
+                cov = len(terms) / self._col_len[tid][pos]
+                if self._informative(terms, cov, min_coverage):
+                    cols.setdefault(tid, []).append((cov, pos, terms))
+            else:
+                cov = len(terms) / self._row_len[tid][pos]
+                if self._informative(terms, cov, min_coverage):
+                    rows.setdefault(tid, []).append((cov, pos, terms))
+
+        best, best_score, exact = None, 0.0, False
+        for tid, col_matches in cols.items():
+            if tid in rows:
+                row_matches = rows[tid]
+            elif len(self._row_len[tid]) == 1:
+                row_matches = [(min_coverage, 0, set())]
+            else:
+                continue
+            for c_cov, j, c_terms in col_matches:
+                for r_cov, i, r_terms in row_matches:
+                    if any(q_counts[t] < 2 for t in c_terms & r_terms):
+                        continue
+                    if c_cov + r_cov > best_score:
+                        best, best_score = (tid, i, j), c_cov + r_cov
+                        exact = c_cov >= 1.0 and r_cov >= 1.0 and bool(r_terms)
+        if best is None:
+            return None
+
+        tid, i, j = best
+        t = self.tables[tid]
+        col = t["columns"][j]
+        value = col["values"][i]
+        if not value:
+            return None
+        text = f"Table cell → {t['row_labels'][i]} | {t['header'][j]}: {value}"
+        return {
+            "score": best_score,
+            "exact": exact,
+            "meta": {
+                "id": f"tblcell_{t['page']}_{t['table_idx']}_{i}_{j}",
+                "modality": "table_cell",
+                "page": t["page"],
+                "table_idx": t["table_idx"],
+                "row_idx": i,
+                "col_idx": j,
+                "row_label": t["row_labels"][i],
+                "column": t["header"][j],
+                "value": value,
+                "number": col["numbers"][i] if col["numbers"] else None,
+                "is_header": False,
+                "text": text,
+            },
+        }
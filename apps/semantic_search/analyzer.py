@@ -0,0 +1,210 @@
+"""
+Text analyzer shared by BM25 indexing (build_index.py, shards.py, search.py, eval.py)
+and BM25 querying (retriever.py): Unicode normalization, lowercasing, stopword
+removal, optional stemming and per-field weights (a field of weight w counts w times).
+
+The analyzer config is stored with the postings (bm25/vocab.json), so queries are
+always analyzed the way the index was. Indexes built before the analyzer existed
+load as Analyzer.legacy() (title.split() + abstract.split()).
+
+Analyzed token streams can be cached on disk (cached_doc_tokens); a rebuild only
+re-analyzes documents whose analyzed fields changed.
+"""
+import re
+import json
+import shutil
+import hashlib
+import unicodedata
+from pathlib import Path
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her here
+hers herself him himself his how i if in into is it its itself just me more most my myself no nor not now of
+off on once only or other our ours ourselves out over own same she should so some such than that the their
+theirs them themselves then there these they this those through to too under until up very was we were what
+when where which while who whom why will with would you your yours yourself yourselves s t
+""".split())
+DEFAULT_FIELDS = {"title": 2, "abstract": 1, "keywords": 1}
+
+def _s_stem(word):
+    """Harman's S-stemmer: conservative plural stripping."""
+    if len(word) > 3 and word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+class Analyzer:
+    def __init__(self, lowercase=True, fold_unicode=True, stopwords=True, stem=None, fields=None,
+                 min_len=1, split="regex"):
+        if stem not in (None, "s", "porter"):
+            raise ValueError(f"Unknown stemmer: {stem} (use s or porter)")
+        if split not in ("regex", "whitespace"):
+            raise ValueError(f"Unknown split: {split} (use regex or whitespace)")
+        self.lowercase = lowercase
+        self.fold_unicode = fold_unicode
+        self.stopwords = stopwords
+        self.stem = stem
+        self.fields = dict(fields or DEFAULT_FIELDS)
+        self.min_len = min_len
+        self.split = split
+        self._stem_fn = None
+        if stem == "porter":
+            from nltk.stem import PorterStemmer  # optional dependency
+            self._stem_fn = PorterStemmer().stem
+        elif stem == "s":
+            self._stem_fn = _s_stem
+        self._stems = {}
+
+    @classmethod
+    def legacy(cls):
+        """Whitespace split of title + abstract, as BM25 was built before this module."""
+        return cls(lowercase=False, fold_unicode=False, stopwords=False, fields={"title": 1, "abstract": 1},
+                   split="whitespace")
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls.legacy() if cfg is None else cls(**cfg)
+
+    def config(self):
+        return {"lowercase": self.lowercase, "fold_unicode": self.fold_unicode, "stopwords": self.stopwords,
+                "stem": self.stem, "fields": self.fields, "min_len": self.min_len, "split": self.split}
+
+    def fingerprint(self):
+        return hashlib.sha1(json.dumps(self.config(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def analyze(self, text):
+        if not text:
+            return []
+        if self.fold_unicode:
+            # NFKD splits accents / ligatures off their base letters; drop the combining marks
+            text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+        if self.lowercase:
+            text = text.casefold()
+        tokens = TOKEN_RE.findall(text) if self.split == "regex" else text.split()
+        if self.stopwords:
+            tokens = [t for t in tokens if t not in STOPWORDS]
+        if self.min_len > 1:
+            tokens = [t for t in tokens if len(t) >= self.min_len]
+        if self._stem_fn is not None:
+            stems = self._stems
+            out = []
+            for t in tokens:
+                s = stems.get(t)
+                if s is None:
+                    s = stems[t] = self._stem_fn(t)
+                out.append(s)
+            tokens = out
+        return tokens
+
+    def field_text(self, doc, field):
+        value = doc.get(field) or ""
+        return " ".join(value) if isinstance(value, list) else value
+
+    def doc_tokens(self, doc):
+        tokens = []
+        for field, weight in self.fields.items():
+            tokens.extend(self.analyze(self.field_text(doc, field)) * weight)
+        return tokens
+
+    def query_tokens(self, query):
+        return self.analyze(query)
+
+DEFAULT_ANALYZER = Analyzer()
+
+def analyze_query(bm25, query):
+    """Query tokens for a BM25 model, analyzed the way its postings were built."""
+    return getattr(bm25, "analyzer", DEFAULT_ANALYZER).query_tokens(query)
+
+# -----------------------------
+# On-disk token cache
+# -----------------------------
+# <cache_dir>/<analyzer fingerprint>/
+#   keys.npy     uint8 [n_docs, 16]   blake2b of the analyzed fields of each doc
+#   indptr.npy   int64 [n_docs + 1]   tokens of doc i = terms[ids[indptr[i]:indptr[i+1]]]
+#   ids.npy      int32 [n_tokens]
+#   terms.json   term list
+def _doc_key(doc, analyzer):
+    payload = "\x1f".join(analyzer.field_text(doc, f) for f in analyzer.fields)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+def _load_token_cache(path):
+    try:
+        keys = np.load(path / "keys.npy")
+        indptr, ids = np.load(path / "indptr.npy"), np.load(path / "ids.npy")
+        with open(path / "terms.json", "r", encoding="utf-8") as f:
+            terms = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {k.tobytes(): (int(indptr[r]), int(indptr[r + 1])) for r, k in enumerate(keys)}, ids, terms
+
+def _save_token_cache(path, keys, token_lists):
+    vocab = {}
+    indptr = np.zeros(len(token_lists) + 1, dtype=np.int64)
+    ids = []
+    for r, toks in enumerate(token_lists):
+        ids.extend(vocab.setdefault(t, len(vocab)) for t in toks)
+        indptr[r + 1] = len(ids)
+    tmp = path.with_name(path.name + ".part")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "keys.npy", np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), 16))
+    np.save(tmp / "indptr.npy", indptr)
+    np.save(tmp / "ids.npy", np.asarray(ids, dtype=np.int32))
+    with open(tmp / "terms.json", "w", encoding="utf-8") as f:
+        json.dump(list(vocab), f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+
+def cached_doc_tokens(docs, analyzer=DEFAULT_ANALYZER, cache_dir=None):
+    """
+    analyzer.doc_tokens(d) for every doc. With cache_dir, token streams of docs whose
+    analyzed fields are unchanged since the last build are read back instead of re-analyzed,
+    and the cache is rewritten to match the current corpus.
+    """
+    if cache_dir is None:
+        return [analyzer.doc_tokens(d) for d in docs]
+    path = Path(cache_dir) / analyzer.fingerprint()
+    cached = _load_token_cache(path)
+    keys = [_doc_key(d, analyzer) for d in docs]
+    out, misses = [], 0
+    for d, k in zip(docs, keys):
+        hit = cached[0].get(k) if cached else None
+        if hit is None:
+            out.append(analyzer.doc_tokens(d))
+            misses += 1
+        else:
+            ids, terms = cached[1], cached[2]
+            out.append([terms[i] for i in ids[hit[0]:hit[1]]])
+    stale = cached is None or misses or len(cached[0]) != len(set(keys))
+    if stale:
+        _save_token_cache(path, keys, out)
+    print(f"Token cache: {len(docs) - misses} reused, {misses} analyzed ({path})")
+    return out
+
+# -----------------------------
+# CLI helpers
+# -----------------------------
+def add_analyzer_args(parser):
+    parser.add_argument("--bm25_fields", nargs="+", default=None, metavar="FIELD[:WEIGHT]",
+                        help="fields indexed for BM25 (default: title:2 abstract:1 keywords:1)")
+    parser.add_argument("--stem", choices=["none", "s", "porter"], default="none",
+                        help="stemming (porter needs nltk)")
+    parser.add_argument("--keep_stopwords", action="store_true")
+    parser.add_argument("--token_cache", type=str, default=None,
+                        help="analyzed-token cache dir (default: <index dir>/token_cache)")
+    parser.add_argument("--no_token_cache", action="store_true")
+
+def analyzer_from_args(args):
+    fields = None
+    if args.bm25_fields:
+        fields = {}
+        for spec in args.bm25_fields:
+            name, _, weight = spec.partition(":")
+            fields[name] = int(weight or 1)
+    return Analyzer(stopwords=not args.keep_stopwords, stem=None if args.stem == "none" else args.stem, fields=fields)
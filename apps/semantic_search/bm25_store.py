@@ -0,0 +1,117 @@
+"""
+BM25 postings persisted as flat NumPy arrays so they can be memory-mapped
+read-only and shared (via the page cache) by every worker process.
+
+Files in <index_dir>/bm25/:
+  vocab.json        term → term id, plus k1, b, avgdl (corpus-wide for shards) and the analyzer config
+  indptr.npy        int64 [n_terms + 1]   postings of term t = [indptr[t], indptr[t+1])
+  doc_ids.npy       int32 [nnz]
+  tf.npy            float32 [nnz]
+  doc_len.npy       float32 [n_docs]
+  idf.npy           float32 [n_terms]     same idf (with epsilon floor) as rank_bm25.BM25Okapi
+"""
+import json
+from pathlib import Path
+import numpy as np
+from analyzer import Analyzer, DEFAULT_ANALYZER
+
+def bm25_tokens(doc, analyzer=DEFAULT_ANALYZER):
+    """Tokens indexed for a document (same as the in-memory BM25Okapi in search.py)."""
+    return analyzer.doc_tokens(doc)
+
+# -----------------------------
+# Build
+# -----------------------------
+def corpus_stats(tokenized_docs, epsilon=0.25):
+    """
+    Collection statistics BM25 depends on (N, avgdl, document frequencies, mean idf).
+    Computed once over the whole corpus and passed to build_bm25_arrays for every shard so
+    shard-local scores equal the scores of one monolithic index.
+    """
+    df = {}
+    total_len = 0
+    for toks in tokenized_docs:
+        total_len += len(toks)
+        for t in set(toks):
+            df[t] = df.get(t, 0) + 1
+    n_docs = len(tokenized_docs)
+    dfs = np.fromiter(df.values(), dtype=np.float64, count=len(df))
+    idf = np.log((n_docs - dfs + 0.5) / (dfs + 0.5))
+    return {"n_docs": n_docs, "avgdl": total_len / n_docs if n_docs else 0.0, "df": df,
+            "avg_idf": float(idf.mean()) if len(idf) else 0.0, "epsilon": epsilon}
+
+def build_bm25_arrays(tokenized_docs, out_dir, k1=1.5, b=0.75, epsilon=0.25, global_stats=None,
+                      analyzer=DEFAULT_ANALYZER):
+    """Postings for tokenized_docs; analyzer is the one that produced the tokens (used again at query time)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    vocab, postings = {}, []
+    doc_len = np.zeros(len(tokenized_docs), dtype=np.float32)
+    for d, toks in enumerate(tokenized_docs):
+        doc_len[d] = len(toks)
+        counts = {}
+        for t in toks:
+            counts[t] = counts.get(t, 0) + 1
+        for t, c in counts.items():
+            tid = vocab.setdefault(t, len(vocab))
+            if tid == len(postings):
+                postings.append([])
+            postings[tid].append((d, c))
+
+    n_docs = len(tokenized_docs)
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(p) for p in postings])
+    doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(indptr[-1]))
+    tf = np.fromiter((c for p in postings for _, c in p), dtype=np.float32, count=int(indptr[-1]))
+
+    # rank_bm25.BM25Okapi idf: log((N - n + 0.5) / (n + 0.5)), negatives floored to epsilon * mean idf
+    if global_stats is None:
+        df = np.diff(indptr).astype(np.float64)
+        idf = np.log((n_docs - df + 0.5) / (df + 0.5))
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+    else:
+        g = global_stats
+        df = np.array([g["df"][t] for t in vocab], dtype=np.float64)
+        idf = np.log((g["n_docs"] - df + 0.5) / (df + 0.5))
+        idf[idf < 0] = g["epsilon"] * g["avg_idf"]
+        avgdl = g["avgdl"]
+
+    with open(out_dir / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump({"vocab": vocab, "k1": k1, "b": b, "avgdl": avgdl, "analyzer": analyzer.config()}, f,
+                  ensure_ascii=False)
+    np.save(out_dir / "indptr.npy", indptr)
+    np.save(out_dir / "doc_ids.npy", doc_ids)
+    np.save(out_dir / "tf.npy", tf)
+    np.save(out_dir / "doc_len.npy", doc_len)
+    np.save(out_dir / "idf.npy", idf.astype(np.float32))
+
+# -----------------------------
+# Memory-mapped scorer (drop-in for BM25Okapi.get_scores)
+# -----------------------------
+class MmapBM25:
+    def __init__(self, bm25_dir):
+        bm25_dir = Path(bm25_dir)
+        with open(bm25_dir / "vocab.json", "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        self.vocab, self.k1, self.b = cfg["vocab"], cfg["k1"], cfg["b"]
+        load = lambda name: np.load(bm25_dir / name, mmap_mode="r")
+        self.indptr, self.doc_ids, self.tf = load("indptr.npy"), load("doc_ids.npy"), load("tf.npy")
+        self.doc_len, self.idf = load("doc_len.npy"), load("idf.npy")
+        # shards carry the corpus-wide avgdl; older single indexes fall back to their own
+        self.avgdl = cfg.get("avgdl", float(self.doc_len.mean()) if len(self.doc_len) else 0.0)
+        self.corpus_size = len(self.doc_len)
+        self.analyzer = Analyzer.from_config(cfg.get("analyzer"))
+
+    def get_scores(self, query_tokens):
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_len) / max(self.avgdl, 1e-9))
+        for t in query_tokens:
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            s, e = self.indptr[tid], self.indptr[tid + 1]
+            ids, tf = self.doc_ids[s:e], self.tf[s:e]
+            scores[ids] += self.idf[tid] * (tf * (self.k1 + 1) / (tf + norm[ids]))
+        return scores
@@ -1,11 +1,28 @@
 import json
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
+import time
+import shutil
+import common_path  # puts packages/ on sys.path for common.*
+from common.onnx_backend import load_embedder
+from common.doc_store import write_doc_store
+from common.faiss_index import build_faiss_index, describe_index
+from bm25_store import build_bm25_arrays
+from analyzer import DEFAULT_ANALYZER, cached_doc_tokens, add_analyzer_args, analyzer_from_args
+from common.hot_swap import publish_staged
+from common.thread_budget import configure
 from pathlib import Path
 import argparse
 
-def build_index(corpus_file, index_dir="data/semantic_search/index", model_name="all-MiniLM-L6-v2"):
+def _previous_manifest(index_dir):
+    try:
+        with open(Path(index_dir) / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def build_index(corpus_file, index_dir="data/semantic_search/index", model_name="all-MiniLM-L6-v2",
+                reduce_dim=None, reduce_method="pca", analyzer=DEFAULT_ANALYZER, token_cache="default",
+                neighbors_k=0):
+    import faiss
     # Load dataset
     docs = []
     with open(corpus_file, "r", encoding="utf-8") as f:
@@ -16,28 +33,72 @@ def build_index(corpus_file, index_dir="data/semantic_search/index", model_name=
     ids = [doc["paper_id"] for doc in docs]
 
     # Load embedding model
-    model = SentenceTransformer(model_name)
+    model = load_embedder(model_name)
 
     # Generate embeddings
     embeddings = model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
 
-    # Build FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)  # simple L2 index
-    index.add(embeddings)
+    # Build FAISS index (simple L2 index, optionally PCA/OPQ-reduced)
+    index = build_faiss_index(embeddings, "l2", reduce_dim, reduce_method)
+
+    # Everything is written to a staging dir first and published in one go at the end,
+    # so running servers (hot_swap) never map a half-written index
+    staging = Path(index_dir) / ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
 
     # Save index + metadata
-    Path(index_dir).mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, f"{index_dir}/faiss.index")
-    with open(f"{index_dir}/metadata.jsonl", "w", encoding="utf-8") as f:
+    faiss.write_index(index, f"{staging}/faiss.index")
+    with open(f"{staging}/metadata.jsonl", "w", encoding="utf-8") as f:
         for doc in docs:
             f.write(json.dumps(doc, ensure_ascii=False) + "\n")
 
-    print(f"Built FAISS index with {len(docs)} documents. Saved to {index_dir}")
+    # Serving artifacts (memory-mapped by search.py --index_dir and serve.py):
+    # cosine index over title + abstract, mmap-able doc store and BM25 postings
+    search_emb = model.encode([d["title"] + " " + d["abstract"] for d in docs],
+                              convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=True)
+    search_index = build_faiss_index(search_emb, "ip", reduce_dim, reduce_method)
+    faiss.write_index(search_index, f"{staging}/search.index")
+    write_doc_store(docs, staging / "docs.bin")
+    # analyzed token streams of unchanged docs come from the token cache (kept outside the staging dir)
+    if token_cache == "default":
+        token_cache = Path(index_dir) / "token_cache"
+    build_bm25_arrays(cached_doc_tokens(docs, analyzer, token_cache), staging / "bm25", analyzer=analyzer)
+
+    # Optional "related papers" graph: k nearest docs of every doc over the search index.
+    # If the previous build only lacked the newly appended papers (same model, no refitted
+    # projection), its graph is updated instead of re-searching every document.
+    if neighbors_k:
+        from neighbors import build_or_update
+        previous = _previous_manifest(index_dir)
+        reusable = (previous.get("neighbors") == neighbors_k and previous.get("model") == model_name
+                    and not previous.get("search_index", {}).get("transform")
+                    and not describe_index(search_index)["transform"])
+        build_or_update(staging / "neighbors", search_index, search_emb, ids, k=neighbors_k,
+                        previous_dir=Path(index_dir) / "neighbors" if reusable else None)
+
+    # Published last: a new manifest marks a new index version (query_cache invalidation, hot swap)
+    with open(f"{staging}/manifest.json", "w", encoding="utf-8") as f:
+        json.dump({"corpus": str(corpus_file), "model": model_name, "n_docs": len(docs),
+                   "built_at": time.time(), "faiss_index": describe_index(index),
+                   "search_index": describe_index(search_index), "neighbors": neighbors_k or None}, f, indent=2)
+    publish_staged(staging, index_dir)
+
+    info = describe_index(index)
+    print(f"Built FAISS index with {len(docs)} documents ({info['dim']}-d"
+          f"{', ' + info['transform'] if info['transform'] else ''}). Saved to {index_dir}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--corpus", type=str, default="data/semantic_search/corpus.jsonl")
     parser.add_argument("--index_dir", type=str, default="data/semantic_search/index")
+    parser.add_argument("--reduce_dim", type=int, default=None, help="project embeddings to this many dims (e.g. 128)")
+    parser.add_argument("--reduce_method", type=str, choices=["pca", "opq"], default="pca")
+    parser.add_argument("--neighbors", type=int, default=0, help="also precompute each paper's N most similar papers (search.py --related)")
+    add_analyzer_args(parser)
     args = parser.parse_args()
-    build_index(args.corpus, args.index_dir)
\ No newline at end of file
+    configure("build")
+    build_index(args.corpus, args.index_dir, reduce_dim=args.reduce_dim, reduce_method=args.reduce_method,
+                analyzer=analyzer_from_args(args),
+                token_cache=None if args.no_token_cache else (args.token_cache or "default"),
+                neighbors_k=args.neighbors)
\ No newline at end of file
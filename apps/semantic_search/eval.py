@@ -1,38 +1,58 @@
 import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from tqdm import tqdm
 
 from retriever import dense_retrieve, sparse_retrieve, hybrid_retrieve
 from reranker import rerank
 from normalize import normalize_query
+from analyzer import DEFAULT_ANALYZER, analyze_query
+import common_path  # puts packages/ on sys.path for common.*
+from common.thread_budget import configure
 
 # -----------------------------
-# Load corpus + indexes
+# Load corpus + indexes (lazily, on first evaluate())
 # -----------------------------
-import faiss
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
+_resources = {}
 
-with open("data/semantic_search/corpus.jsonl", "r", encoding="utf-8") as f:
-    docs = [json.loads(line) for line in f]
+def load_resources(corpus_file="data/semantic_search/corpus.jsonl",
+                   index_file="data/semantic_search/index/faiss.index"):
+    if _resources:
+        return _resources
+    import faiss
+    from rank_bm25 import BM25Okapi
+    from common.onnx_backend import load_embedder, BACKEND
+    from common.query_cache import CachedEmbedder
 
-# Dense
-embed_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-index = faiss.read_index("data/semantic_search/index/faiss.index")
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        docs = [json.loads(line) for line in f]
 
-# Sparse
-bm25 = BM25Okapi([
-    (d["title"] + " " + d["abstract"] + " " + " ".join(d.get("keywords", []))).split()
-    for d in docs
-])
+    # Dense
+    # query vectors are cached, so repeated evaluate() runs over the same questions skip encoding
+    embed_model = CachedEmbedder(load_embedder("sentence-transformers/all-MiniLM-L6-v2"),
+                                 f"sentence-transformers/all-MiniLM-L6-v2:{BACKEND}")
+    index = faiss.read_index(index_file)
 
-# Map corpus to ID → doc
-doc_map = {d["paper_id"]: d for d in docs}
+    # Sparse (title, abstract and keywords through the shared analyzer)
+    bm25 = BM25Okapi([DEFAULT_ANALYZER.doc_tokens(d) for d in docs])
+    bm25.analyzer = DEFAULT_ANALYZER
+
+    # Map corpus to ID → doc
+    doc_map = {d["paper_id"]: d for d in docs}
+    _resources.update(docs=docs, embed_model=embed_model, index=index, bm25=bm25, doc_map=doc_map)
+    return _resources
 
 
 # -----------------------------
 # Evaluation
 # -----------------------------
-def evaluate(eval_file="rag_eval_dataset.jsonl", retriever="hybrid", top_k=5, use_rerank=True):
+def evaluate(eval_file="rag_eval_dataset.jsonl", retriever="hybrid", top_k=5, use_rerank=True, dedup=False,
+             prefilter_k=None, rerank_budget_ms=None):
+    res = load_resources()
+    docs, index, embed_model, bm25 = res["docs"], res["index"], res["embed_model"], res["bm25"]
+
     with open(eval_file, "r", encoding="utf-8") as f:
         eval_data = [json.loads(line) for line in f if line.strip()]
 
@@ -58,11 +78,13 @@ def evaluate(eval_file="rag_eval_dataset.jsonl", retriever="hybrid", top_k=5, us
         elif retriever == "sparse":
             results = sparse_retrieve(q_norm, bm25, docs, top_k=candidate_k)
         else:
-            results = hybrid_retrieve(q_norm, index, embed_model, bm25, docs, top_k=candidate_k)
+            results = hybrid_retrieve(q_norm, index, embed_model, bm25, docs, top_k=candidate_k,
+                                      diversify=dedup, pool_k=candidate_k * 2)
 
         # Rerank if enabled
         if use_rerank:
-            results = rerank(q_norm, results, top_k=candidate_k)
+            results = rerank(q_norm, results, top_k=candidate_k,
+                             prefilter_k=prefilter_k, budget_ms=rerank_budget_ms)
 
         # Top-k subset
         retrieved_ids_topk = [r["paper_id"] for r in results[:top_k]]
@@ -88,15 +110,169 @@ def evaluate(eval_file="rag_eval_dataset.jsonl", retriever="hybrid", top_k=5, us
     mrr = sum(reciprocal_ranks) / total if total > 0 else 0.0
     recall_at_k = recall_hits / total if total > 0 else 0.0
 
-    print(f"Retriever: {retriever}, Rerank: {use_rerank}, Top-k: {top_k}")
+    print(f"Retriever: {retriever}, Rerank: {use_rerank}, Dedup: {dedup}, Top-k: {top_k}")
+    print(index_summary(index))
     print(f"Accuracy@1: {accuracy_at1:.2%} ({correct_at1}/{total})")
     print(f"Hit Rate@{top_k}: {recall_at_k:.2%} ({recall_hits}/{total})")
     print(f"MRR: {mrr:.3f}")
 
 
+# -----------------------------
+# Sweep engine
+# -----------------------------
+# Everything that does not depend on the configuration is computed once per question:
+# normalized query, dense scores for every doc (one batched FAISS search), BM25 scores,
+# and cross-encoder scores for any (question, doc) pair some configuration reranks.
+# Configurations are then ranked and scored as whole-matrix NumPy operations.
+RRF_K = 60
+
+def prepare(eval_file, workers=8):
+    res = load_resources()
+    docs, index, embed_model, bm25 = res["docs"], res["index"], res["embed_model"], res["bm25"]
+    with open(eval_file, "r", encoding="utf-8") as f:
+        eval_data = [json.loads(line) for line in f if line.strip()]
+    row_of = {d["paper_id"]: i for i, d in enumerate(docs)}
+
+    def norm(q):
+        q_norm, _, _ = normalize_query(q)
+        return q_norm or q
+
+    with ThreadPoolExecutor(workers) as ex:
+        queries = list(ex.map(norm, [e["question"] for e in eval_data]))
+    q_vecs = np.asarray(embed_model.encode(queries, normalize_embeddings=True), dtype="float32")
+    t = time.perf_counter()
+    d_scores, d_order = index.search(q_vecs, len(docs))
+    search_ms = (time.perf_counter() - t) * 1000 / max(len(queries), 1)
+    dense = np.zeros((len(queries), len(docs)), dtype="float32")
+    np.put_along_axis(dense, d_order, d_scores, axis=1)
+    with ThreadPoolExecutor(workers) as ex:
+        sparse = np.stack(list(ex.map(lambda q: np.asarray(bm25.get_scores(analyze_query(bm25, q))), queries)))
+    gold = np.array([row_of.get(e["source"].replace(".pdf", ""), -1) for e in eval_data])
+    return {"queries": queries, "docs": docs, "dense": dense, "dense_order": d_order,
+            "sparse": sparse, "gold": gold, "ce": {}, "search_ms": search_ms}
+
+def index_summary(index):
+    """Dimensionality / projection / vector memory of the dense index (build_index.py --reduce_dim)."""
+    from common.faiss_index import describe_index
+    info = describe_index(index)
+    return (f"Dense index: {info['ntotal']} vectors, {info['dim_in']}→{info['dim']}-d"
+            f"{' (' + info['transform'] + ')' if info['transform'] else ''}, {info['vector_bytes'] / 1e6:.2f} MB of vectors")
+
+def _ranks(order):
+    """order (n_q × N doc rows, best first) → rank of every doc per question (0 = best)."""
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(order.shape[1])[None, :].repeat(order.shape[0], 0), axis=1)
+    return ranks
+
+def candidates(prep, retriever, candidate_k, alpha=0.8, fusion="linear"):
+    """Same first-stage ranking as dense_retrieve / sparse_retrieve / hybrid_retrieve (fusion="linear")."""
+    if retriever == "dense":
+        return prep["dense_order"][:, :candidate_k]
+    sparse_order = np.argsort(prep["sparse"], axis=1)[:, ::-1]
+    if retriever == "sparse":
+        return sparse_order[:, :candidate_k]
+    if fusion == "linear":
+        fused = alpha * prep["dense"] + (1 - alpha) * prep["sparse"]
+    elif fusion == "minmax":
+        def mm(x):
+            lo, hi = x.min(1, keepdims=True), x.max(1, keepdims=True)
+            return (x - lo) / np.maximum(hi - lo, 1e-12)
+        fused = alpha * mm(prep["dense"]) + (1 - alpha) * mm(prep["sparse"])
+    elif fusion == "rrf":
+        fused = alpha / (RRF_K + _ranks(prep["dense_order"])) + (1 - alpha) / (RRF_K + _ranks(sparse_order))
+    else:
+        raise ValueError(f"unknown fusion {fusion}")
+    return np.argsort(-fused, axis=1, kind="stable")[:, :candidate_k]
+
+def _score_pairs(prep, pairs, model_name, batch_size=64):
+    """Cross-encoder scores for (question, doc row) pairs not scored yet, in large batches."""
+    from reranker import _load_model, _pair_text
+    todo = [p for p in dict.fromkeys(pairs) if p not in prep["ce"]]
+    if not todo:
+        return
+    model = _load_model(model_name)
+    for s in range(0, len(todo), batch_size * 8):
+        chunk = todo[s:s + batch_size * 8]
+        scores = model.predict([(prep["queries"][qi], _pair_text(prep["docs"][di])) for qi, di in chunk],
+                               batch_size=batch_size)
+        prep["ce"].update(zip(chunk, map(float, scores)))
+
+def rerank_cached(prep, cand, prefilter_k=None, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    """rerank() over cached cross-encoder scores: keep prefilter_k best first-stage candidates, sort by score."""
+    if prefilter_k is not None:
+        cand = cand[:, :prefilter_k]
+    _score_pairs(prep, [(qi, int(di)) for qi in range(cand.shape[0]) for di in cand[qi]], model_name)
+    ce = np.array([[prep["ce"][(qi, int(di))] for di in row] for qi, row in enumerate(cand)])
+    return np.take_along_axis(cand, np.argsort(-ce, axis=1, kind="stable"), axis=1)
+
+def metrics(ranked, gold, top_k):
+    hits = ranked == gold[:, None]
+    first = np.where(hits.any(1), hits.argmax(1) + 1, 0)
+    return {"acc@1": float(hits[:, 0].mean()), "hit@k": float(hits[:, :top_k].any(1).mean()),
+            "mrr": float(np.where(first > 0, 1.0 / np.maximum(first, 1), 0.0).mean())}
+
+def sweep(eval_file="data/semantic_search/rag_eval_dataset.jsonl", retrievers=("dense", "sparse", "hybrid"),
+          alphas=(0.8,), fusions=("linear",), top_ks=(5,), rerank_opts=(False, True), prefilter_k=None, workers=8):
+    t0 = time.perf_counter()
+    prep = prepare(eval_file, workers)
+    prep_s = time.perf_counter() - t0
+
+    configs = []
+    for retriever in retrievers:
+        grid = [(a, f) for a in alphas for f in fusions] if retriever == "hybrid" else [(None, None)]
+        for alpha, fusion in grid:
+            for top_k in top_ks:
+                for use_rerank in rerank_opts:
+                    configs.append((retriever, alpha, fusion, top_k, use_rerank))
+
+    # every pair any reranked configuration needs, scored in one pass
+    pools = {}
+    for retriever, alpha, fusion, top_k, use_rerank in configs:
+        pools[(retriever, alpha, fusion, top_k)] = candidates(prep, retriever, max(50, top_k), alpha or 0.8,
+                                                               fusion or "linear")
+    rerank_pairs = [(qi, int(di)) for (r, a, f, k), cand in pools.items()
+                    if any(c[:4] == (r, a, f, k) and c[4] for c in configs)
+                    for qi in range(cand.shape[0]) for di in cand[qi, :prefilter_k]]
+    _score_pairs(prep, rerank_pairs, "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+    results = []
+    for retriever, alpha, fusion, top_k, use_rerank in configs:
+        ranked = pools[(retriever, alpha, fusion, top_k)]
+        if use_rerank:
+            ranked = rerank_cached(prep, ranked, prefilter_k)
+        results.append({"retriever": retriever, "alpha": alpha, "fusion": fusion, "top_k": top_k,
+                        "rerank": use_rerank, **metrics(ranked, prep["gold"], top_k)})
+
+    print(f"{len(prep['queries'])} questions, {len(configs)} configurations "
+          f"(prepare {prep_s:.1f}s, total {time.perf_counter() - t0:.1f}s)")
+    print(index_summary(load_resources()["index"]) + f", FAISS search {prep['search_ms']:.2f} ms/query")
+    print(f"{'retriever':9s} {'alpha':>5s} {'fusion':7s} {'k':>3s} {'rerank':6s} {'acc@1':>6s} {'hit@k':>6s} {'mrr':>6s}")
+    for r in sorted(results, key=lambda r: -r["mrr"]):
+        print(f"{r['retriever']:9s} {'' if r['alpha'] is None else r['alpha']:>5} {r['fusion'] or '':7s} "
+              f"{r['top_k']:>3d} {str(r['rerank']):6s} {r['acc@1']:6.2%} {r['hit@k']:6.2%} {r['mrr']:6.3f}")
+    return results
+
+
 # -----------------------------
 # Run eval
 # -----------------------------
 if __name__ == "__main__":
-    evaluate(eval_file="data/semantic_search/rag_eval_dataset.jsonl",
-             retriever="hybrid", top_k=5, use_rerank=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval_file", type=str, default="data/semantic_search/rag_eval_dataset.jsonl")
+    parser.add_argument("--sweep", action="store_true", help="evaluate a configuration grid over cached scores")
+    parser.add_argument("--retrievers", nargs="+", default=["dense", "sparse", "hybrid"])
+    parser.add_argument("--alphas", type=float, nargs="+", default=[0.2, 0.4, 0.6, 0.8, 1.0])
+    parser.add_argument("--fusions", nargs="+", default=["linear", "minmax", "rrf"])
+    parser.add_argument("--top_ks", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--prefilter_k", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="threads for query normalization / BM25 scoring (default: one per core)")
+    args = parser.parse_args()
+    # embedding, FAISS search and cross-encoder batches run one at a time in this thread, so they
+    # get every core; --workers only sizes the pool that normalizes queries and scores BM25
+    budget = configure("query")
+
+    if args.sweep:
+        sweep(args.eval_file, args.retrievers, args.alphas, args.fusions, args.top_ks,
+              prefilter_k=args.prefilter_k, workers=args.workers or budget["pool"])
+    else:
+        evaluate(eval_file=args.eval_file, retriever="hybrid", top_k=5, use_rerank=True)
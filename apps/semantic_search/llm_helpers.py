@@ -3,7 +3,6 @@ LLM helpers using a local LLaMA model via Ollama.
 """
 
 import json
-import ollama
 from datetime import datetime
 
 MODEL = "llama3.2:3b" 
@@ -20,6 +19,7 @@ def llm_expand_acronyms(query: str) -> str:
     Just return the modified query, NOTHING ELSE.
     Query: {query}
     """
+    import ollama  # only needed when the LLM fallback actually fires
     response = ollama.chat(model=MODEL, messages=[{"role": "user", "content": prompt}])
     return response["message"]["content"].strip()
 
@@ -39,6 +39,7 @@ def llm_resolve_dates(query: str, today: str = None):
 
     Query: {query}
     """
+    import ollama  # only needed when the LLM fallback actually fires
     response = ollama.chat(model=MODEL, messages=[{"role": "user", "content": prompt}])
     text = response["message"]["content"].strip()
 
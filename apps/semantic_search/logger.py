@@ -1,23 +1,58 @@
+"""
+Query / feedback log for the data flywheel (warm_cache.py, offline evaluation).
+
+Events are appended to LOG_FILE by a background thread. Past MAX_BYTES the active
+file is rotated into a gzipped segment (query_logs.<utc stamp>.jsonl.gz). Retention
+is applied to the segments right after each rotation, oldest dropped first:
+  MAX_SEGMENTS      at most this many segments
+  MAX_AGE_DAYS      segments older than this (by modification time)
+  MAX_TOTAL_BYTES   total size of all segments
+Each limit is off when None, so by default all history is kept. Segments are
+not compacted or merged. Because pruning only runs on rotation, a quiet server
+can hold segments past MAX_AGE_DAYS until the active file next fills up.
+"""
+import atexit
+import gzip
 import json
 import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import fcntl  # POSIX: serialize appends / rotation across pre-forked workers
+except ImportError:
+    fcntl = None
+
 LOG_FILE = "data/semantic_search/query_logs.jsonl"
 
-def log_interaction(query, normalized_query, retrieved, chosen_doc=None, feedback=None):
+# Background writer settings
+FLUSH_EVERY = 64                  # events per batch
+FLUSH_INTERVAL_S = 1.0            # max time an event waits in memory
+MAX_BYTES = 64 * 1024 * 1024      # rotate the active file past this size
+MAX_SEGMENTS = None               # keep at most this many gzipped segments (None = all)
+MAX_AGE_DAYS = None               # drop segments older than this many days (None = no age limit)
+MAX_TOTAL_BYTES = None            # cap the total size of the gzipped segments (None = no size limit)
+
+def log_interaction(query, normalized_query, retrieved, chosen_doc=None, feedback=None, timings=None, params=None):
     """
     Log query interactions for future training.
-    
+
+    The event is queued and written by a background thread in batches, so the
+    caller never waits on disk I/O. Call flush() to force pending events out.
+
     Args:
         query (str): raw user query
         normalized_query (str): query after normalization (spellcheck, acronym expansion, etc.)
         retrieved (list): list of retrieved paper_ids with scores
         chosen_doc (str): optional, paper_id of doc user clicked/selected
         feedback (str): optional, e.g. 'good', 'bad', 'needs expansion'
+        timings (dict): optional, per-stage latency in ms (tracing.Trace.timings())
+        params (dict): optional, request options (mode, top_k, rerank) so warm_cache.py can replay the query
     """
-    Path(os.path.dirname(LOG_FILE)).mkdir(parents=True, exist_ok=True)
-
     event = {
         "timestamp": datetime.utcnow().isoformat(),
         "query": query,
@@ -26,6 +61,148 @@ def log_interaction(query, normalized_query, retrieved, chosen_doc=None, feedbac
         "chosen_doc": chosen_doc,
         "feedback": feedback,
     }
+    if timings is not None:
+        event["timings_ms"] = timings
+    if params is not None:
+        event["params"] = params
+    _writer().put(event)
+
+def flush(timeout=5.0):
+    """Block until every event queued so far is on disk."""
+    w = _state.get("writer")
+    if w is not None and w.pid == os.getpid():
+        w.flush(timeout)
+
+# -----------------------------
+# Background writer
+# -----------------------------
+class _Writer:
+    def __init__(self, log_file):
+        self.log_file = Path(log_file)
+        self.pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self._flushed = threading.Condition()
+        self._seq_in = self._seq_out = 0
+        threading.Thread(target=self._run, name="query-logger", daemon=True).start()
+
+    def put(self, event):
+        with self._flushed:
+            self._seq_in += 1
+        self.queue.put(event)
+
+    def flush(self, timeout):
+        with self._flushed:
+            target = self._seq_in
+            self.queue.put(None)  # wake the writer now instead of at the next interval
+            self._flushed.wait_for(lambda: self._seq_out >= target, timeout)
+
+    def _run(self):
+        while True:
+            batch, deadline = [], time.monotonic() + FLUSH_INTERVAL_S
+            while len(batch) < FLUSH_EVERY:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    print(f"query logger: dropped {len(batch)} events ({e})")
+            with self._flushed:
+                self._seq_out += len(batch)
+                self._flushed.notify_all()
+
+    def _write(self, batch):
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch)
+        with open(self.log_file.with_name(self.log_file.name + ".lock"), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(data)
+                    size = f.tell()
+                if size >= MAX_BYTES:
+                    _rotate(self.log_file)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+_state = {}
+_state_lock = threading.Lock()
+
+def _writer():
+    # one writer per process; a forked child must not reuse the parent's (dead) thread
+    w = _state.get("writer")
+    if w is None or w.pid != os.getpid() or w.log_file != Path(LOG_FILE):
+        with _state_lock:
+            w = _state.get("writer")
+            if w is None or w.pid != os.getpid() or w.log_file != Path(LOG_FILE):
+                if w is not None and w.pid == os.getpid():
+                    w.flush(FLUSH_INTERVAL_S)
+                w = _state["writer"] = _Writer(LOG_FILE)
+    return w
+
+atexit.register(flush)
+
+# -----------------------------
+# Rotation
+# -----------------------------
+def _segments(log_file):
+    """Rotated segments of log_file, oldest first."""
+    log_file = Path(log_file)
+    return sorted(log_file.parent.glob(f"{log_file.stem}.*{log_file.suffix}.gz"))
+
+def _rotate(log_file):
+    """query_logs.jsonl → query_logs.<utc stamp>.jsonl.gz; caller holds the lock."""
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    seg = log_file.with_name(f"{log_file.stem}.{stamp}{log_file.suffix}")
+    os.replace(log_file, seg)
+    with open(seg, "rb") as src, gzip.open(str(seg) + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    seg.unlink()
+    _prune(log_file)
+
+def _prune(log_file):
+    """Apply MAX_SEGMENTS / MAX_AGE_DAYS / MAX_TOTAL_BYTES to the rotated segments, oldest first."""
+    segs = [(p, p.stat()) for p in _segments(log_file)]
+    drop = set()
+    if MAX_SEGMENTS is not None:
+        drop.update(p for p, _ in segs[:max(len(segs) - MAX_SEGMENTS, 0)])
+    if MAX_AGE_DAYS is not None:
+        cutoff = time.time() - MAX_AGE_DAYS * 86400
+        drop.update(p for p, st in segs if st.st_mtime < cutoff)
+    if MAX_TOTAL_BYTES is not None:
+        total = sum(st.st_size for p, st in segs if p not in drop)
+        for p, st in segs:
+            if total <= MAX_TOTAL_BYTES:
+                break
+            if p not in drop:
+                drop.add(p)
+                total -= st.st_size
+    for p in drop:
+        p.unlink(missing_ok=True)
 
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event, ensure_ascii=False) + "\n")
\ No newline at end of file
+# -----------------------------
+# Reader
+# -----------------------------
+def read_logs(log_file=None):
+    """Stream logged events oldest → newest across gzipped segments and the active file."""
+    log_file = Path(log_file or LOG_FILE)
+    for path in _segments(log_file) + [log_file]:
+        if not path.exists():
+            continue
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written tail line
@@ -0,0 +1,146 @@
+"""
+k-nearest-neighbour graph over the document vectors, for "related papers" lookups.
+
+build_index.py --neighbors K runs a batched FAISS self-search over search.index and
+stores the graph as CSR arrays in <index_dir>/neighbors/:
+  indptr.npy      int64 [n_docs + 1]   neighbours of doc i = ids[indptr[i]:indptr[i+1]]
+  ids.npy         int32 [nnz]          neighbour rows, most similar first
+  scores.npy      float32 [nnz]        cosine similarity
+  paper_ids.json  row → paper_id
+  meta.json       k, n_docs, nnz, built_at
+
+related(paper_id, k) reads a single CSR row, so it costs O(k), with no embedding and no index scan.
+When the corpus has only grown (the old paper_ids are a prefix of the new ones), the
+previous graph is updated instead of rebuilt. Only the new documents are searched,
+and the rows of existing documents are compared with the new documents only, so a
+new paper replaces a row's k-th neighbour when it is closer.
+"""
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+# -----------------------------
+# Build / update
+# -----------------------------
+def knn_rows(index, vectors, rows, k, batch_size=1024):
+    """k nearest neighbours (excluding the doc itself) of vectors[rows] in index → (ids, scores), each [len(rows), k]."""
+    rows = np.asarray(rows, dtype=np.int64)
+    out_ids = np.full((len(rows), k), -1, dtype=np.int64)   # -1 pads rows when the corpus has <= k docs
+    out_scores = np.zeros((len(rows), k), dtype=np.float32)
+    k = min(k, index.ntotal - 1)
+    if k <= 0:
+        return out_ids, out_scores
+    for s in range(0, len(rows), batch_size):
+        batch = rows[s:s + batch_size]
+        D, I = index.search(np.ascontiguousarray(vectors[batch], dtype="float32"), k + 1)
+        # drop the doc itself (normally column 0, but exact duplicates can come first)
+        keep = (I != batch[:, None]) & (I != -1)
+        for r in range(len(batch)):
+            ids, sc = I[r][keep[r]][:k], D[r][keep[r]][:k]
+            out_ids[s + r, :len(ids)], out_scores[s + r, :len(ids)] = ids, sc
+    return out_ids, out_scores
+
+def _to_csr(ids, scores):
+    valid = ids != -1
+    indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(valid.sum(axis=1))
+    return indptr, ids[valid].astype(np.int32), scores[valid].astype(np.float32)
+
+def build_graph(index, vectors, k=10, batch_size=1024):
+    ids, scores = knn_rows(index, vectors, np.arange(len(vectors)), k, batch_size)
+    return _to_csr(ids, scores)
+
+def _to_dense(graph, n, k):
+    indptr, nbr, sim = (np.asarray(a) for a in graph)
+    ids = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    for i in range(n):
+        row = slice(indptr[i], min(indptr[i + 1], indptr[i] + k))
+        m = row.stop - row.start
+        ids[i, :m], scores[i, :m] = nbr[row], sim[row]
+    return ids, scores
+
+def update_graph(graph, index, vectors, n_old, k=10, batch_size=1024):
+    """
+    Extend graph (indptr, ids, scores over the first n_old docs) to all docs in index.
+    New docs get their k nearest from an index search. Old rows are only compared
+    with the new docs (exact inner products, O(n_old * n_new)) and keep the best k
+    of old + new neighbours, so the result equals a full rebuild without
+    re-searching every document.
+    """
+    n = len(vectors)
+    new_ids, new_scores = knn_rows(index, vectors, np.arange(n_old, n), k, batch_size)
+    ids, scores = _to_dense(graph, n_old, k)
+    new_vecs = np.ascontiguousarray(vectors[n_old:], dtype="float32")
+    kk = min(k, len(new_vecs))
+    for s in range(0, n_old if kk else 0, batch_size):
+        e = min(s + batch_size, n_old)
+        sims = np.asarray(vectors[s:e], dtype="float32") @ new_vecs.T
+        top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        cand_ids = np.concatenate([ids[s:e], top + n_old], axis=1)
+        cand_scores = np.concatenate([scores[s:e], np.take_along_axis(sims, top, 1)], axis=1)
+        order = np.argsort(-cand_scores, axis=1, kind="stable")[:, :k]
+        ids[s:e] = np.take_along_axis(cand_ids, order, 1)
+        scores[s:e] = np.take_along_axis(cand_scores, order, 1)
+    ids, scores = np.concatenate([ids, new_ids]), np.concatenate([scores, new_scores])
+    scores[ids == -1] = 0.0
+    return _to_csr(ids, scores)
+
+def save_graph(out_dir, graph, paper_ids, k):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    indptr, nbr, sim = graph
+    np.save(out_dir / "indptr.npy", indptr)
+    np.save(out_dir / "ids.npy", nbr)
+    np.save(out_dir / "scores.npy", sim)
+    with open(out_dir / "paper_ids.json", "w", encoding="utf-8") as f:
+        json.dump(list(paper_ids), f)
+    with open(out_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"k": k, "n_docs": len(paper_ids), "nnz": int(indptr[-1]), "built_at": time.time()}, f)
+
+def build_or_update(out_dir, index, vectors, paper_ids, k=10, previous_dir=None, batch_size=1024):
+    """
+    Write the graph for (index, vectors, paper_ids) to out_dir, updating the graph in
+    previous_dir incrementally when it covers a prefix of paper_ids with the same k.
+    previous_dir must differ from out_dir (its arrays are read memory-mapped).
+    """
+    t = time.perf_counter()
+    prev = NeighborGraph(previous_dir) if previous_dir and (Path(previous_dir) / "meta.json").exists() else None
+    n_old = len(prev.paper_ids) if prev is not None else 0
+    if prev is not None and prev.k == k and 0 < n_old <= len(paper_ids) and prev.paper_ids == list(paper_ids[:n_old]):
+        graph = update_graph((prev.indptr, prev.ids, prev.scores), index, vectors, n_old, k, batch_size)
+        how = f"updated ({len(paper_ids) - n_old} new docs)"
+    else:
+        graph = build_graph(index, vectors, k, batch_size)
+        how = "built"
+    save_graph(out_dir, graph, paper_ids, k)
+    print(f"Neighbour graph {how}: {len(paper_ids)} docs × {k} in {time.perf_counter() - t:.1f}s")
+    return graph
+
+# -----------------------------
+# Lookup
+# -----------------------------
+class NeighborGraph:
+    def __init__(self, graph_dir):
+        graph_dir = Path(graph_dir)
+        load = lambda name: np.load(graph_dir / name, mmap_mode="r")
+        self.indptr, self.ids, self.scores = load("indptr.npy"), load("ids.npy"), load("scores.npy")
+        with open(graph_dir / "paper_ids.json", "r", encoding="utf-8") as f:
+            self.paper_ids = json.load(f)
+        with open(graph_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.k = json.load(f)["k"]
+        self.row_of = {pid: i for i, pid in enumerate(self.paper_ids)}
+
+    def __len__(self):
+        return len(self.paper_ids)
+
+    def neighbors(self, row, k=10):
+        s, e = int(self.indptr[row]), int(self.indptr[row + 1])
+        e = min(e, s + k)
+        return np.asarray(self.ids[s:e]), np.asarray(self.scores[s:e])
+
+    def related(self, paper_id, k=10):
+        """[(paper_id, similarity)] of the k most similar papers; KeyError for unknown ids."""
+        ids, scores = self.neighbors(self.row_of[paper_id], k)
+        return [(self.paper_ids[i], float(s)) for i, s in zip(ids, scores)]
@@ -7,8 +7,10 @@ Query normalization pipeline:
 
 import re
 from datetime import datetime
-from spellchecker import SpellChecker
+from functools import lru_cache
 from llm_helpers import llm_expand_acronyms, llm_resolve_dates
+import common_path  # puts packages/ on sys.path for common.*
+from common.tracing import span
 
 # -----------------------------
 # Config
@@ -28,7 +30,11 @@ TIME_CUES = [
     "quarter", "decade", "since"
 ]
 
-spell = SpellChecker(distance=1)
+@lru_cache(maxsize=1)
+def get_spellchecker():
+    # Loading the word-frequency dictionary is slow; only do it on the first query
+    from spellchecker import SpellChecker
+    return SpellChecker(distance=1)
 
 # -----------------------------
 # Acronym expansion
@@ -52,7 +58,8 @@ def expand_acronyms(query: str):
         else:
             print("Explanding acronym via LLM:", ac)
             # Fallback → let LLM rewrite query with all expansions
-            return llm_expand_acronyms(query)
+            with span("normalize.acronyms.llm"):
+                return llm_expand_acronyms(query)
     
     return query
 
@@ -75,7 +82,8 @@ def resolve_dates(query: str):
     print("Resolving dates for query:", query)
 
     today = datetime.now().date().isoformat()
-    result = llm_resolve_dates(query, today)
+    with span("normalize.dates.llm"):
+        result = llm_resolve_dates(query, today)
 
     if result and "start_date" in result and "end_date" in result:
         start, end = result["start_date"], result["end_date"]
@@ -93,6 +101,7 @@ def resolve_dates(query: str):
 def correct_spelling(query: str) -> str:
     # find acronyms like ML, RNA, AI
     acronyms = re.findall(r"\b[A-Z]{2,}(?:[0-9]+)?\b", query)
+    spell = get_spellchecker()
     corrected_words = []
     for word in query.split():
         if word in acronyms:  
@@ -112,12 +121,15 @@ def normalize_query(query: str):
       - start_date, end_date (if resolved, else None)
     """
     # 1. Correct spelling
-    query = correct_spelling(query)
+    with span("normalize.spell"):
+        query = correct_spelling(query)
 
     # 2. Acronym expansion (dict first, fallback to LLM)
-    query = expand_acronyms(query)
+    with span("normalize.acronyms"):
+        query = expand_acronyms(query)
 
     # 3. Date resolution (only if cues are present)
-    query, start, end = resolve_dates(query)
+    with span("normalize.dates"):
+        query, start, end = resolve_dates(query)
 
     return query, start, end
@@ -1,14 +1,75 @@
 """
 Cross-encoder reranking for candidate documents.
+
+Cascade:
+1. Cheap first stage prunes hopeless candidates (fused score threshold / top-N, or a tiny cross-encoder).
+2. Full cross-encoder scores the survivors in batches, best first-stage candidates first.
+3. If the per-query time budget runs out, the best-so-far ranking is returned
+   (scored candidates by rerank score, then the unscored ones in first-stage order).
 """
-from sentence_transformers import CrossEncoder
+import time
+from functools import lru_cache
+import common_path  # puts packages/ on sys.path for common.*
+from common.onnx_backend import load_cross_encoder
+from common.tracing import span
+
+@lru_cache(maxsize=4)
+def _load_model(model_name):
+    return load_cross_encoder(model_name)
 
-def rerank(query, candidates, top_k=5, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
-    reranker = CrossEncoder(model_name)
+def _pair_text(c):
     # Adding title and abstract as pair with query for re-ranking for now to demonstrate re-ranking
     # In actual use case, I will take full text, chunk it and then use the chunks for re-ranking
-    pairs = [(query, c["title"] + " " + c["abstract"]) for c in candidates]
-    scores = reranker.predict(pairs)
-    for c, s in zip(candidates, scores):
-        c["rerank_score"] = float(s)
-    return sorted(candidates, key=lambda x: x["rerank_score"], reverse=True)[:top_k]
+    return c["title"] + " " + c["abstract"]
+
+# -----------------------------
+# Stage 1: cheap pruning
+# -----------------------------
+def prune_candidates(query, candidates, prefilter_k=None, min_score=None, first_stage_model=None):
+    """
+    Order candidates by a cheap first-stage score and drop the hopeless ones.
+    - first_stage_model: small cross-encoder (e.g. cross-encoder/ms-marco-TinyBERT-L-2-v2); else the retriever "score" is used
+    - min_score: drop candidates below this first-stage score
+    - prefilter_k: keep at most this many
+    """
+    if first_stage_model:
+        scores = _load_model(first_stage_model).predict([(query, _pair_text(c)) for c in candidates])
+        for c, s in zip(candidates, scores):
+            c["first_stage_score"] = float(s)
+    else:
+        for c in candidates:
+            c["first_stage_score"] = float(c.get("score", 0.0))
+
+    survivors = sorted(candidates, key=lambda x: x["first_stage_score"], reverse=True)
+    if min_score is not None:
+        survivors = [c for c in survivors if c["first_stage_score"] >= min_score] or survivors[:1]
+    if prefilter_k is not None:
+        survivors = survivors[:prefilter_k]
+    return survivors
+
+# -----------------------------
+# Stage 2: cross-encoder with budget
+# -----------------------------
+def rerank(query, candidates, top_k=5, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2",
+           prefilter_k=None, min_score=None, first_stage_model=None, budget_ms=None, batch_size=16):
+    if not candidates:
+        return []
+    start = time.perf_counter()
+    with span("rerank.prune"):
+        survivors = prune_candidates(query, candidates, prefilter_k, min_score, first_stage_model)
+
+    with span("rerank.load_model"):
+        reranker = _load_model(model_name)
+    scored, pending = [], list(survivors)
+    with span("rerank.cross_encoder", candidates=len(survivors)):
+        while pending:
+            if budget_ms is not None and scored and (time.perf_counter() - start) * 1000 >= budget_ms:
+                break
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            scores = reranker.predict([(query, _pair_text(c)) for c in batch])
+            for c, s in zip(batch, scores):
+                c["rerank_score"] = float(s)
+            scored.extend(batch)
+
+    ranked = sorted(scored, key=lambda x: x["rerank_score"], reverse=True) + pending
+    return ranked[:top_k]
@@ -1,17 +1,20 @@
 """
 Retriever functions: dense, sparse, hybrid.
 """
-import faiss
 import numpy as np
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
+import common_path  # puts packages/ on sys.path for common.*
+from common.dedup import mmr_select
+from common.tracing import span
+from analyzer import analyze_query
 
 # -----------------------------
 # Dense Retriever
 # -----------------------------
-def dense_retrieve(query, index, embed_model: SentenceTransformer, docs, top_k=5):
-    query_vec = embed_model.encode([query], normalize_embeddings=True)
-    scores, idxs = index.search(query_vec, top_k)
+def dense_retrieve(query, index, embed_model, docs, top_k=5):
+    with span("embed"):
+        query_vec = embed_model.encode([query], normalize_embeddings=True)
+    with span("faiss", k=top_k):
+        scores, idxs = index.search(query_vec, top_k)
     results = []
     for score, i in zip(scores[0], idxs[0]):
         if i == -1:
@@ -24,9 +27,10 @@ def dense_retrieve(query, index, embed_model: SentenceTransformer, docs, top_k=5
 # -----------------------------
 # Sparse Retriever
 # -----------------------------
-def sparse_retrieve(query, bm25: BM25Okapi, docs, top_k=5):
-    scores = bm25.get_scores(query.split())
-    idxs = np.argsort(scores)[::-1][:top_k]
+def sparse_retrieve(query, bm25, docs, top_k=5):
+    with span("bm25"):
+        scores = bm25.get_scores(analyze_query(bm25, query))
+        idxs = np.argsort(scores)[::-1][:top_k]
     results = []
     for i in idxs:
         d = docs[i].copy()
@@ -37,25 +41,39 @@ def sparse_retrieve(query, bm25: BM25Okapi, docs, top_k=5):
 # -----------------------------
 # Hybrid Retriever
 # -----------------------------
-def hybrid_retrieve(query, index, embed_model, bm25, docs, alpha=0.8, top_k=5):
+def hybrid_retrieve(query, index, embed_model, bm25, docs, alpha=0.8, top_k=5,
+                    diversify=False, pool_k=None, mmr_lambda=0.7, dup_threshold=0.95):
     # Dense scores
-    q_vec = embed_model.encode([query], normalize_embeddings=True)
-    d_scores, d_idxs = index.search(q_vec, len(docs))
+    with span("embed"):
+        q_vec = embed_model.encode([query], normalize_embeddings=True)
+    with span("faiss", k=len(docs)):
+        d_scores, d_idxs = index.search(q_vec, len(docs))
     dense_scores = {i: float(s) for i, s in zip(d_idxs[0], d_scores[0])}
 
     # Sparse scores
-    s_scores = bm25.get_scores(query.split())
+    with span("bm25"):
+        s_scores = bm25.get_scores(analyze_query(bm25, query))
     sparse_scores = {i: float(s) for i, s in enumerate(s_scores)}
 
     # Normalize & fuse
-    fused = {}
-    for i in range(len(docs)):
-        ds = dense_scores.get(i, 0.0)
-        ss = sparse_scores.get(i, 0.0)
-        fused[i] = alpha * ds + (1 - alpha) * ss
+    with span("fusion"):
+        fused = {}
+        for i in range(len(docs)):
+            ds = dense_scores.get(i, 0.0)
+            ss = sparse_scores.get(i, 0.0)
+            fused[i] = alpha * ds + (1 - alpha) * ss
 
-    # Rank
-    sorted_idxs = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        # Rank
+        sorted_idxs = sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+    # Optional MMR / dedup: pick top_k diverse docs out of a wider fused pool
+    if diversify:
+        with span("mmr"):
+            pool = sorted_idxs[:pool_k or top_k * 2]
+            vecs = index.reconstruct_batch([i for i, _ in pool])
+            keep = mmr_select(vecs, [s for _, s in pool], top_k, lambda_=mmr_lambda, dup_threshold=dup_threshold)
+            sorted_idxs = [pool[j] for j in keep]
+    sorted_idxs = sorted_idxs[:top_k]
     results = []
     for i, score in sorted_idxs:
         d = docs[i].copy()
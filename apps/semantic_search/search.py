@@ -5,14 +5,15 @@ import sys
 import os
 import argparse
 import json
-import faiss
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
 from retriever import dense_retrieve, sparse_retrieve, hybrid_retrieve
 from reranker import rerank
 from normalize import normalize_query
 from datetime import datetime
+import common_path  # puts packages/ on sys.path for common.*
+from common.tracing import start_trace, span, write_chrome_trace
+from common.thread_budget import configure
+from common.faiss_index import load_faiss
 
 # -----------------------------
 # Helper: date filtering
@@ -52,63 +53,140 @@ def load_corpus(corpus_file):
             docs.append(json.loads(line))
     return docs
 
+def load_search_resources(corpus_file, index_dir=None, embed_model=None):
+    """
+    (docs, bm25, index) for retrieval. With a prebuilt index_dir (build_index.py) the
+    doc store, BM25 postings and vectors are memory-mapped read-only, so processes
+    forked after loading share one copy through the page cache. Otherwise everything
+    is built in memory from corpus_file, embedding the corpus with embed_model.
+    """
+    index_dir = Path(index_dir) if index_dir else None
+    if index_dir and (index_dir / "search.index").exists() and (index_dir / "docs.bin").exists():
+        from common.doc_store import DocStore
+        from bm25_store import MmapBM25
+        return DocStore(index_dir / "docs.bin"), MmapBM25(index_dir / "bm25"), load_faiss(index_dir / "search.index", mmap=True)
+
+    import faiss
+    from rank_bm25 import BM25Okapi
+    from analyzer import DEFAULT_ANALYZER
+    docs = load_corpus(corpus_file)
+    bm25 = BM25Okapi([DEFAULT_ANALYZER.doc_tokens(d) for d in docs])
+    bm25.analyzer = DEFAULT_ANALYZER  # retriever analyzes queries with it
+    embeddings = embed_model.encode([d["title"] + " " + d["abstract"] for d in docs], normalize_embeddings=True)
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    return docs, bm25, index
+
+# -----------------------------
+# Related papers (precomputed neighbour graph)
+# -----------------------------
+_graphs = {}
+
+def related(paper_id, k=10, index_dir="data/semantic_search/index"):
+    """
+    The k papers most similar to paper_id, read from the neighbour graph that
+    build_index.py --neighbors stored with the index: O(k), no embedding or index search.
+    Returns [{"paper_id", "title", "score"}]; KeyError for papers not in the index.
+    """
+    from neighbors import NeighborGraph
+    from common.doc_store import DocStore
+    index_dir = Path(index_dir)
+    if index_dir not in _graphs:
+        with open(index_dir / "manifest.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not manifest.get("neighbors"):
+            raise FileNotFoundError(f"{index_dir} has no neighbour graph; rebuild with build_index.py --neighbors K")
+        _graphs[index_dir] = (NeighborGraph(index_dir / "neighbors"), DocStore(index_dir / "docs.bin"))
+    graph, docs = _graphs[index_dir]
+    with span("related"):
+        ids, scores = graph.neighbors(graph.row_of[paper_id], k)
+        return [{"paper_id": docs[int(i)]["paper_id"], "title": docs[int(i)].get("title"), "score": float(s)}
+                for i, s in zip(ids, scores)]
+
 # -----------------------------
 # Main
 # -----------------------------
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--query", type=str, required=True)
+    parser.add_argument("--query", type=str, default=None)
+    parser.add_argument("--related", type=str, default=None, metavar="PAPER_ID", help="list the papers most similar to PAPER_ID (needs --index_dir built with --neighbors)")
     parser.add_argument("--mode", type=str, choices=["dense", "sparse", "hybrid"], default="hybrid")
     parser.add_argument("--corpus", type=str, default="data/semantic_search/corpus.jsonl")
+    parser.add_argument("--index_dir", type=str, default=None, help="prebuilt index (build_index.py) to memory-map instead of re-embedding the corpus")
     parser.add_argument("--top_k", type=int, default=5)
     parser.add_argument("--rerank", action="store_true")
     parser.add_argument("--filter_dates", action="store_true")
+    parser.add_argument("--dedup", action="store_true", help="MMR / near-duplicate suppression before reranking")
+    parser.add_argument("--prefilter_k", type=int, default=None, help="keep only the N best first-stage candidates for the cross-encoder")
+    parser.add_argument("--rerank_budget_ms", type=float, default=None, help="per-query reranking time budget")
+    parser.add_argument("--timings", action="store_true", help="print per-stage latency")
+    parser.add_argument("--trace_out", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) of the query")
     args = parser.parse_args()
-    
-
-    # Normalize query
-    norm_query, start_date, end_date = normalize_query(args.query)
-    print("Normalized Query:", norm_query)
-
-    # Load docs
-    docs = load_corpus(args.corpus)
-
-    # Sparse model
-    bm25 = BM25Okapi([d["title"].split() + d["abstract"].split() for d in docs])
-
-    # Dense model
-    embed_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    embeddings = embed_model.encode([d["title"] + " " + d["abstract"] for d in docs], normalize_embeddings=True)
-    dim = embeddings.shape[1]
-
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
-
-    # Retrieve
-    if args.mode == "dense":
-        results = dense_retrieve(norm_query, index, embed_model, docs, top_k=args.top_k)
-    elif args.mode == "sparse":
-        results = sparse_retrieve(norm_query, bm25, docs, top_k=args.top_k)
-    else:
-        results = hybrid_retrieve(norm_query, index, embed_model, bm25, docs, top_k=args.top_k)
-
-    # Optional date filtering
-    if args.filter_dates and start_date and end_date:
-        results = filter_by_date(results, start_date, end_date)
-
-    # Optional reranking
-    if args.rerank:
-        results = rerank(norm_query, results, top_k=args.top_k)
-
-    # Show
-    for r in results:
-        print("=" * 60)
-        print("ID:", r.get("paper_id"))
-        print("Title:", r.get("title"))
-        print("Authors:", ", ".join(r.get("authors", [])))
-        #print("Date:", r.get("published_date"))
-        print("Abstract:", r.get("abstract")[:300], "...")
-        print("Score:", r.get("score", r.get("rerank_score")))
+    if not args.query and not args.related:
+        parser.error("one of --query or --related is required")
+
+    if args.related:
+        if not args.index_dir:
+            parser.error("--related needs --index_dir")
+        try:
+            hits = related(args.related, args.top_k, args.index_dir)
+        except KeyError:
+            sys.exit(f"Unknown paper_id: {args.related}")
+        except FileNotFoundError as e:
+            sys.exit(str(e))
+        for r in hits:
+            print("=" * 60)
+            print("ID:", r["paper_id"])
+            print("Title:", r["title"])
+            print("Similarity:", round(r["score"], 4))
+        return
+
+    # Heavy deps are imported after argument parsing so --help stays instant
+    configure("query")
+    from common.onnx_backend import load_embedder
+
+    # Docs, sparse model, dense index (start-up cost, kept out of the query trace)
+    embed_model = load_embedder("sentence-transformers/all-MiniLM-L6-v2")
+    docs, bm25, index = load_search_resources(args.corpus, args.index_dir, embed_model)
+
+    with start_trace("query") as trace:
+        # Normalize query
+        norm_query, start_date, end_date = normalize_query(args.query)
+        print("Normalized Query:", norm_query)
+
+        # Retrieve
+        if args.mode == "dense":
+            results = dense_retrieve(norm_query, index, embed_model, docs, top_k=args.top_k)
+        elif args.mode == "sparse":
+            results = sparse_retrieve(norm_query, bm25, docs, top_k=args.top_k)
+        else:
+            results = hybrid_retrieve(norm_query, index, embed_model, bm25, docs, top_k=args.top_k, diversify=args.dedup)
+
+        # Optional date filtering
+        if args.filter_dates and start_date and end_date:
+            results = filter_by_date(results, start_date, end_date)
+
+        # Optional reranking
+        if args.rerank:
+            results = rerank(norm_query, results, top_k=args.top_k,
+                             prefilter_k=args.prefilter_k, budget_ms=args.rerank_budget_ms)
+
+        # Show
+        with span("output"):
+            for r in results:
+                print("=" * 60)
+                print("ID:", r.get("paper_id"))
+                print("Title:", r.get("title"))
+                print("Authors:", ", ".join(r.get("authors", [])))
+                #print("Date:", r.get("published_date"))
+                print("Abstract:", r.get("abstract")[:300], "...")
+                print("Score:", r.get("score", r.get("rerank_score")))
+
+    if args.timings:
+        print("Timings (ms):", trace.timings())
+    if args.trace_out:
+        write_chrome_trace([trace], args.trace_out)
+        print("Trace written to", args.trace_out)
 
     # Log to file
     from logger import log_interaction
@@ -120,7 +198,9 @@ def main():
         normalized_query=norm_query,
         retrieved=retrieved,
         chosen_doc=None,        # can update later with user click info
-        feedback=None           # e.g., user says "this was relevant"
+        feedback=None,          # e.g., user says "this was relevant"
+        timings=trace.timings(),
+        params={"mode": args.mode, "top_k": args.top_k, "rerank": args.rerank}
     )
     print("Logged")
 
@@ -0,0 +1,236 @@
+"""
+Pre-fork HTTP query server.
+
+The parent memory-maps the prebuilt index (search.index, docs.bin, bm25/) and
+binds the listening socket, then forks N workers that accept on that socket.
+Index pages live once in the OS page cache no matter how many workers run;
+each worker only holds its own embedding / cross-encoder models, which are
+loaded after the fork (torch / onnxruntime thread pools are not fork-safe),
+and its own query cache (GET /stats reports that worker's hit rates).
+
+Rebuilding the index under a running server needs no restart: each worker notices
+the new manifest (polled every --poll_s seconds), loads the new generation in the
+background and swaps it in while in-flight queries finish on the old one (hot_swap.py;
+swap timings are under "index" in GET /stats).
+
+Workers that die are respawned with exponential backoff (0.5 s, doubling up to 30 s).
+More than --max_restarts respawns within --restart_window_s means workers crash on
+start-up; the server then stops the remaining workers and exits with status 1.
+
+Head queries precomputed by warm_cache.py are preloaded into the query cache at
+start-up (and again after each swap), so they are answered from cache straight away.
+
+    python apps/semantic_search/build_index.py
+    python apps/semantic_search/serve.py --workers 4 --port 8080
+    curl 'localhost:8080/search?q=graph+neural+networks&mode=hybrid&top_k=5&rerank=1'
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+from retriever import dense_retrieve, sparse_retrieve, hybrid_retrieve
+from normalize import normalize_query
+from search import load_search_resources
+import common_path  # puts packages/ on sys.path for common.*
+from common.query_cache import QUERY_CACHE, CachedEmbedder
+from common.tracing import start_trace, span
+from common.hot_swap import HotSwapIndex
+from common.thread_budget import configure
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+RESTART_BACKOFF_S, RESTART_BACKOFF_MAX_S = 0.5, 30.0
+
+# -----------------------------
+# Per-process state
+# -----------------------------
+_shared = {}   # index: HotSwapIndex mapped in the parent, inherited (then swapped) by workers
+_models = {}   # embed_model: loaded lazily inside each worker
+_warm = {}     # warm_cache.py output for the current index version: normalized forms of head queries
+
+def _embed_model_id():
+    from common.onnx_backend import BACKEND
+    return f"{EMBED_MODEL}:{BACKEND}"
+
+def _embed_model():
+    if "embed" not in _models:
+        from common.onnx_backend import load_embedder
+        _models["embed"] = CachedEmbedder(load_embedder(EMBED_MODEL), _embed_model_id())
+    return _models["embed"]
+
+def _ensure_warm(version):
+    # preload precomputed head queries once per index version (at start-up and after a hot swap)
+    if _warm.get("version") != version:
+        from warm_cache import preload
+        _warm.update(version=version, normalized=preload(_shared["index_dir"], version, _embed_model_id()))
+
+def handle_query(query, mode="hybrid", top_k=5, use_rerank=False, log=True):
+    # whole responses are cached per index version; a rebuild (new manifest) invalidates them
+    with start_trace("query") as trace, _shared["index"].acquire() as gen:
+        QUERY_CACHE.sync_version(_shared["index_dir"], gen.version)
+        _ensure_warm(gen.version)
+        response = QUERY_CACHE.result((gen.version, query, mode, top_k, use_rerank),
+                                      lambda: _run_query(gen.resources, query, mode, top_k, use_rerank,
+                                                         _warm["normalized"].get(query)))
+    if log:
+        from logger import log_interaction
+        log_interaction(query=query, normalized_query=response["normalized_query"],
+                        retrieved=[{"paper_id": r["paper_id"], "score": r["score"]} for r in response["results"]],
+                        timings=trace.timings(), params={"mode": mode, "top_k": top_k, "rerank": use_rerank})
+    return response
+
+def _run_query(resources, query, mode, top_k, use_rerank, norm_query=None):
+    if norm_query is None:
+        norm_query, _, _ = normalize_query(query)
+    docs, bm25, index = resources
+    if mode == "dense":
+        results = dense_retrieve(norm_query, index, _embed_model(), docs, top_k=top_k)
+    elif mode == "sparse":
+        results = sparse_retrieve(norm_query, bm25, docs, top_k=top_k)
+    else:
+        results = hybrid_retrieve(norm_query, index, _embed_model(), bm25, docs, top_k=top_k)
+    if use_rerank:
+        from reranker import rerank
+        results = rerank(norm_query, results, top_k=top_k)
+
+    with span("output"):
+        out = [{"paper_id": r["paper_id"], "title": r.get("title"),
+                "score": float(r.get("rerank_score", r["score"]))} for r in results]
+    return {"query": query, "normalized_query": norm_query, "results": out}
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class SearchHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            with _shared["index"].acquire() as gen:
+                return self._send(200, {"status": "ok", "pid": os.getpid(), "docs": len(gen.resources[0])})
+        if url.path == "/stats":
+            return self._send(200, {"pid": os.getpid(), "cache": QUERY_CACHE.stats(),
+                                    "index": _shared["index"].stats()})
+        if url.path != "/search":
+            return self._send(404, {"error": "not found"})
+        qs = parse_qs(url.query)
+        query = (qs.get("q") or [""])[0].strip()
+        if not query:
+            return self._send(400, {"error": "missing q"})
+        mode = (qs.get("mode") or ["hybrid"])[0]
+        if mode not in ("dense", "sparse", "hybrid"):
+            return self._send(400, {"error": f"unknown mode {mode}"})
+        try:
+            top_k = int((qs.get("top_k") or [5])[0])
+        except ValueError:
+            return self._send(400, {"error": "top_k must be an integer"})
+        use_rerank = (qs.get("rerank") or ["0"])[0] in ("1", "true", "yes")
+        try:
+            self._send(200, handle_query(query, mode, top_k, use_rerank))
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        pass  # queries go to the query log instead
+
+# -----------------------------
+# Pre-fork supervisor
+# -----------------------------
+def _run_worker(server):
+    # exit through the finally block so buffered query-log events are flushed
+    signal.signal(signal.SIGINT, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        import logger
+        logger.flush()
+        os._exit(0)
+
+def serve(index_dir, corpus_file, host="127.0.0.1", port=8080, workers=2, poll_s=2.0,
+          max_restarts=5, restart_window_s=60.0):
+    # workers share the host's cores: torch / FAISS / ONNX threads per worker = cores // workers
+    budget = configure("serve", workers=workers)
+    index = HotSwapIndex(index_dir, lambda: load_search_resources(corpus_file, index_dir), poll_s=poll_s)
+    _shared.update(index=index, index_dir=str(index_dir))
+    server = HTTPServer((host, port), SearchHandler)
+    with index.acquire() as gen:
+        n_docs = len(gen.resources[0])
+        QUERY_CACHE.sync_version(str(index_dir), gen.version)
+        _ensure_warm(gen.version)  # before forking, so every worker starts with the head queries cached
+    print(f"Serving {n_docs} docs on http://{host}:{port} with {workers} workers, "
+          f"{budget['intra_op']} threads each (pid {os.getpid()})")
+
+    children = set()
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server)
+        children.add(pid)
+
+    def stop(code):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        server.server_close()
+        sys.exit(code)
+
+    def shutdown(signum, frame):
+        stop(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for _ in range(workers):
+        spawn()
+    # respawn workers that die (they re-inherit the same mappings), backing off while they keep dying
+    restarts = deque()  # monotonic times of the respawns within restart_window_s
+    while True:
+        pid, status = os.wait()
+        children.discard(pid)
+        now = time.monotonic()
+        while restarts and now - restarts[0] > restart_window_s:
+            restarts.popleft()
+        if len(restarts) >= max_restarts:
+            print(f"worker {pid} exited (status {status}); {len(restarts)} restarts in the last "
+                  f"{restart_window_s:g}s, giving up", file=sys.stderr)
+            stop(1)
+        delay = min(RESTART_BACKOFF_MAX_S, RESTART_BACKOFF_S * 2 ** len(restarts))
+        print(f"worker {pid} exited (status {status}), respawning in {delay:g}s")
+        time.sleep(delay)
+        restarts.append(time.monotonic())
+        spawn()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index_dir", type=str, default="data/semantic_search/index")
+    parser.add_argument("--corpus", type=str, default="data/semantic_search/corpus.jsonl")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--poll_s", type=float, default=2.0, help="how often workers check for a rebuilt index")
+    parser.add_argument("--max_restarts", type=int, default=5, help="worker respawns allowed within --restart_window_s")
+    parser.add_argument("--restart_window_s", type=float, default=60.0)
+    args = parser.parse_args()
+    if not (os.path.exists(os.path.join(args.index_dir, "search.index"))
+            and os.path.exists(os.path.join(args.index_dir, "docs.bin"))):
+        sys.exit(f"{args.index_dir} has no serving artifacts; run build_index.py first")
+    serve(args.index_dir, args.corpus, args.host, args.port, args.workers, args.poll_s,
+          args.max_restarts, args.restart_window_s)
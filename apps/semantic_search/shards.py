@@ -0,0 +1,391 @@
+"""
+Sharded index + scatter-gather search.
+
+Layout (build):
+  <shards_dir>/shards.json            n_shards, model, corpus-wide BM25 stats summary
+  <shards_dir>/shard_00/              search.index, docs.bin, bm25/ (idf/avgdl are corpus-wide),
+                                      manifest.json (incl. the embedding model)
+  <shards_dir>/shard_01/ ...
+Documents go to shard crc32(paper_id) % n_shards. BM25 idf and avgdl are computed
+over the whole corpus at build time, so shard-local BM25 / fused scores equal the
+scores of a single monolithic index and a global top-k merge is exact.
+
+Serving: every shard runs in its own process behind a small RPC server
+(multiprocessing.connection over TCP, so shards can live on other hosts). The
+coordinator embeds the query once, fans it out to all shards in parallel, waits
+up to a deadline, and merges whatever came back (late shards are reported).
+
+    python apps/semantic_search/shards.py build --n_shards 4
+    python apps/semantic_search/shards.py query --query "graph neural networks" --deadline_ms 200
+    # remote: on each host
+    python apps/semantic_search/shards.py serve --shard_dir data/semantic_search/shards/shard_00 --port 9100
+    python apps/semantic_search/shards.py query --query "..." --remote host1:9100 host2:9100
+
+The RPC pickles its messages, so anyone who passes the authkey handshake can run code
+on a shard: SHARD_AUTHKEY (a shared secret) is required whenever a shard listens on or
+is reached through a non-loopback address. Local shards started by
+ShardedSearcher.local() get a random key per run.
+"""
+import os
+import json
+import zlib
+import time
+import socket
+import struct
+import argparse
+import ipaddress
+import threading
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Listener, Connection, answer_challenge, deliver_challenge
+from pathlib import Path
+import numpy as np
+from analyzer import add_analyzer_args, analyzer_from_args
+import common_path  # puts packages/ on sys.path for common.*
+from common.thread_budget import configure
+
+LOOPBACK_AUTHKEY = b"semantic-shards-loopback"  # only ever accepted on loopback addresses
+
+def _is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+def shard_authkey(host):
+    """SHARD_AUTHKEY from the environment; it may only be omitted when host is a loopback address."""
+    key = os.environ.get("SHARD_AUTHKEY")
+    if key:
+        return key.encode("utf-8")
+    if _is_loopback(host):
+        return LOOPBACK_AUTHKEY
+    raise ValueError(f"SHARD_AUTHKEY must be set to serve or reach shards on {host} "
+                     "(the shard RPC unpickles requests)")
+
+def shard_of(paper_id, n_shards):
+    return zlib.crc32(paper_id.encode("utf-8")) % n_shards
+
+# -----------------------------
+# Build
+# -----------------------------
+def build_shards(corpus_file, shards_dir="data/semantic_search/shards", n_shards=4,
+                 model_name="all-MiniLM-L6-v2", reduce_dim=None, reduce_method="pca", embed_model=None,
+                 analyzer=None, token_cache="default"):
+    from search import load_corpus
+    from common.faiss_index import build_faiss_index
+    from common.doc_store import write_doc_store
+    from bm25_store import build_bm25_arrays, corpus_stats
+    from analyzer import DEFAULT_ANALYZER, cached_doc_tokens
+    import faiss
+
+    docs = load_corpus(corpus_file)
+    if embed_model is None:
+        from common.onnx_backend import load_embedder
+        embed_model = load_embedder(model_name)
+    emb = np.asarray(embed_model.encode([d["title"] + " " + d["abstract"] for d in docs],
+                                        normalize_embeddings=True, show_progress_bar=True), dtype="float32")
+    shards_dir = Path(shards_dir)
+    analyzer = analyzer or DEFAULT_ANALYZER
+    tokens = cached_doc_tokens(docs, analyzer, shards_dir / "token_cache" if token_cache == "default" else token_cache)
+    stats = corpus_stats(tokens)
+
+    assignment = np.array([shard_of(d["paper_id"], n_shards) for d in docs])
+    for sid in range(n_shards):
+        rows = np.flatnonzero(assignment == sid)
+        out = shards_dir / f"shard_{sid:02d}"
+        out.mkdir(parents=True, exist_ok=True)
+        if len(rows):
+            faiss.write_index(build_faiss_index(emb[rows], "ip", reduce_dim, reduce_method), str(out / "search.index"))
+        write_doc_store([docs[i] for i in rows], out / "docs.bin")
+        build_bm25_arrays([tokens[i] for i in rows], out / "bm25", global_stats=stats, analyzer=analyzer)
+        with open(out / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump({"shard": sid, "n_shards": n_shards, "n_docs": int(len(rows)), "model": model_name,
+                       "built_at": time.time()}, f)
+        print(f"shard {sid:02d}: {len(rows)} docs")
+
+    with open(shards_dir / "shards.json", "w", encoding="utf-8") as f:
+        json.dump({"n_shards": n_shards, "model": model_name, "n_docs": len(docs),
+                   "avgdl": stats["avgdl"], "built_at": time.time(),
+                   "shards": [f"shard_{sid:02d}" for sid in range(n_shards)]}, f, indent=2)
+    print(f"Built {n_shards} shards over {len(docs)} documents in {shards_dir}")
+
+# -----------------------------
+# Shard worker
+# -----------------------------
+class Shard:
+    """One shard's memory-mapped doc store, BM25 postings and (lazily) dense index."""
+    def __init__(self, shard_dir):
+        from common.doc_store import DocStore
+        from bm25_store import MmapBM25
+        self.dir = Path(shard_dir)
+        self.docs = DocStore(self.dir / "docs.bin")
+        self.bm25 = MmapBM25(self.dir / "bm25")
+        with open(self.dir / "manifest.json", "r", encoding="utf-8") as f:
+            self.model = json.load(f).get("model")  # embedding model of search.index; queries must match
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            from common.faiss_index import load_faiss
+            self._index = load_faiss(self.dir / "search.index", mmap=True)
+        return self._index
+
+    def search(self, query, q_vec, mode, k, alpha=0.8):
+        n = len(self.docs)
+        if n == 0:
+            return []
+        tokens = self.bm25.analyzer.query_tokens(query)
+        if mode == "sparse":
+            scores = self.bm25.get_scores(tokens)
+            order = np.argsort(scores)[::-1][:k]
+            hits = [(float(scores[i]), int(i)) for i in order]
+        elif mode == "dense":
+            D, I = self.index.search(np.asarray(q_vec, dtype="float32").reshape(1, -1), min(k, n))
+            hits = [(float(s), int(i)) for s, i in zip(D[0], I[0]) if i != -1]
+        else:
+            D, I = self.index.search(np.asarray(q_vec, dtype="float32").reshape(1, -1), n)
+            dense = np.zeros(n, dtype=np.float64)
+            dense[I[0][I[0] >= 0]] = D[0][I[0] >= 0]
+            fused = alpha * dense + (1 - alpha) * self.bm25.get_scores(tokens)
+            order = np.argsort(-fused, kind="stable")[:k]
+            hits = [(float(fused[i]), int(i)) for i in order]
+        out = []
+        for score, i in hits:
+            d = self.docs[i]
+            d.pop("full_text", None)  # keep replies small; rerank uses title + abstract
+            d["score"] = score
+            out.append(d)
+        return out
+
+def _handle(conn, shard):
+    with conn:
+        while True:
+            try:
+                method, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method == "search":
+                    conn.send(("ok", shard.search(**kwargs)))
+                elif method == "info":
+                    conn.send(("ok", {"dir": str(shard.dir), "n_docs": len(shard.docs), "model": shard.model,
+                                     "pid": os.getpid()}))
+                else:
+                    conn.send(("error", f"unknown method {method}"))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+
+def serve_shard(shard_dir, host="127.0.0.1", port=0, authkey=None, ready=None, colocated=1):
+    """Serve one shard; each client connection gets a thread. Reports its address through ready.
+    colocated = shard processes on this host, which split its cores (thread_budget)."""
+    authkey = authkey or shard_authkey(host)
+    configure("serve", workers=colocated)
+    shard = Shard(shard_dir)
+    with Listener((host, port), authkey=authkey) as listener:
+        if ready is not None:
+            ready.put((str(shard_dir), listener.address))
+        else:
+            print(f"shard {shard_dir} listening on {listener.address[0]}:{listener.address[1]}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue  # failed handshake (wrong authkey, port scan, ...)
+            threading.Thread(target=_handle, args=(conn, shard), daemon=True).start()
+
+# -----------------------------
+# Coordinator
+# -----------------------------
+def _set_recv_timeout(conn, timeout):
+    # SO_RCVTIMEO bounds every blocking read on the socket (0 = wait forever); set through a
+    # dup of the fd, since socket options belong to the socket, not the descriptor
+    sec = 0.0 if timeout is None else max(timeout, 0.001)
+    with socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", int(sec), int(sec % 1 * 1e6)))
+
+def _connect(address, authkey, timeout=None):
+    """multiprocessing.connection.Client with the TCP connect and auth handshake bounded by timeout."""
+    sock = socket.create_connection(address, timeout=timeout)
+    sock.setblocking(True)
+    conn = Connection(sock.detach())
+    try:
+        _set_recv_timeout(conn, timeout)
+        answer_challenge(conn, authkey)
+        deliver_challenge(conn, authkey)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+class ShardClient:
+    """Connection pool to one shard; a connection is only reused once its reply has been read,
+    so an abandoned (timed-out) call can never hand its late reply to the next query."""
+    def __init__(self, address, authkey=None):
+        self.address = tuple(address)
+        self.authkey = authkey or shard_authkey(self.address[0])
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def call(self, method, timeout=None, **kwargs):
+        """One request; with timeout (s) connecting, sending and waiting for the reply all share
+        that budget, and a connection that misses it is closed so no pool thread stays blocked."""
+        end = None if timeout is None else time.monotonic() + timeout
+        remaining = lambda: None if end is None else max(end - time.monotonic(), 0.0)
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        try:
+            if conn is None:
+                conn = _connect(self.address, self.authkey, remaining())
+            _set_recv_timeout(conn, remaining())
+            conn.send((method, kwargs))
+            if end is not None and not conn.poll(remaining()):
+                raise TimeoutError(f"shard {self.address} did not answer within {timeout * 1000:.0f} ms")
+            status, payload = conn.recv()
+        except Exception:
+            if conn is not None:
+                conn.close()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        if status != "ok":
+            raise RuntimeError(f"shard {self.address}: {payload}")
+        return payload
+
+    def close(self):
+        with self._lock:
+            for c in self._idle:
+                c.close()
+            self._idle.clear()
+
+class ShardedSearcher:
+    def __init__(self, addresses, authkey=None, deadline_ms=None, processes=(), model=None):
+        self.clients = [ShardClient(a, authkey) for a in addresses]
+        self.deadline_ms = deadline_ms
+        self.model = model
+        self._pool = ThreadPoolExecutor(max_workers=4 * max(len(self.clients), 1))
+        self._processes = list(processes)
+
+    @classmethod
+    def local(cls, shards_dir, deadline_ms=None, authkey=None):
+        """Start one local process per shard (ephemeral localhost ports, random authkey) and connect to them."""
+        authkey = authkey or os.urandom(32)
+        with open(Path(shards_dir) / "shards.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        names = meta["shards"]
+        ctx = mp.get_context("spawn")
+        ready = ctx.Queue()
+        dirs = [str(Path(shards_dir) / name) for name in names]
+        procs = []
+        for d in dirs:
+            p = ctx.Process(target=serve_shard, args=(d, "127.0.0.1", 0, authkey, ready, len(dirs)), daemon=True)
+            p.start()
+            procs.append(p)
+        started = dict(ready.get(timeout=120) for _ in dirs)  # shards come up in any order
+        return cls([started[d] for d in dirs], authkey, deadline_ms, procs, model=meta["model"])
+
+    def model_name(self, timeout=30.0):
+        """Embedding model the shards were built with: shards.json for local shards, else each
+        shard's manifest through the info RPC. ValueError if unknown or the shards disagree."""
+        if self.model is None:
+            models = {c.call("info", timeout=timeout).get("model") for c in self.clients}
+            if len(models) != 1 or None in models:
+                raise ValueError(f"shards report embedding models {sorted(map(str, models))}; rebuild them "
+                                 f"with one model (shards.py build records it in each manifest)")
+            self.model = models.pop()
+        return self.model
+
+    def search(self, query, q_vec=None, mode="hybrid", top_k=5, alpha=0.8, deadline_ms=None):
+        """
+        Scatter to every shard, gather until the deadline, merge the global top_k.
+        Returns (results, info) where info lists shards that answered / timed out / failed.
+        """
+        kwargs = {"query": query, "q_vec": None if q_vec is None else np.asarray(q_vec).ravel(),
+                  "mode": mode, "k": top_k, "alpha": alpha}
+        deadline = deadline_ms if deadline_ms is not None else self.deadline_ms
+        timeout = None if deadline is None else deadline / 1000
+        futures = {self._pool.submit(c.call, "search", timeout=timeout, **kwargs): sid
+                   for sid, c in enumerate(self.clients)}
+        done, pending = wait(futures, timeout=timeout)
+
+        merged, info = [], {"ok": [], "timed_out": sorted(futures[f] for f in pending), "failed": {}}
+        for f in done:
+            sid = futures[f]
+            try:
+                hits = f.result()
+            except Exception as e:
+                info["failed"][sid] = repr(e)
+                continue
+            info["ok"].append(sid)
+            for h in hits:
+                h["shard"] = sid
+            merged.extend(hits)
+        info["ok"].sort()
+        merged.sort(key=lambda h: h["score"], reverse=True)
+        return merged[:top_k], info
+
+    def close(self):
+        for c in self.clients:
+            c.close()
+        self._pool.shutdown(wait=False)
+        for p in self._processes:
+            p.terminate()
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--corpus", type=str, default="data/semantic_search/corpus.jsonl")
+    b.add_argument("--shards_dir", type=str, default="data/semantic_search/shards")
+    b.add_argument("--n_shards", type=int, default=4)
+    b.add_argument("--reduce_dim", type=int, default=None)
+    add_analyzer_args(b)
+    s = sub.add_parser("serve")
+    s.add_argument("--shard_dir", type=str, required=True)
+    s.add_argument("--host", type=str, default="127.0.0.1")
+    s.add_argument("--port", type=int, default=9100)
+    s.add_argument("--colocated", type=int, default=1, help="shard servers running on this host")
+    q = sub.add_parser("query")
+    q.add_argument("--query", type=str, required=True)
+    q.add_argument("--shards_dir", type=str, default="data/semantic_search/shards")
+    q.add_argument("--remote", nargs="+", default=None, help="host:port of running shard servers")
+    q.add_argument("--mode", type=str, choices=["dense", "sparse", "hybrid"], default="hybrid")
+    q.add_argument("--top_k", type=int, default=5)
+    q.add_argument("--deadline_ms", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build_shards(args.corpus, args.shards_dir, args.n_shards, reduce_dim=args.reduce_dim,
+                     analyzer=analyzer_from_args(args),
+                     token_cache=None if args.no_token_cache else (args.token_cache or "default"))
+    elif args.cmd == "serve":
+        serve_shard(args.shard_dir, args.host, args.port, colocated=args.colocated)
+    else:
+        from normalize import normalize_query
+        norm_query, _, _ = normalize_query(args.query)
+        if args.remote:
+            searcher = ShardedSearcher([(h, int(p)) for h, p in (a.rsplit(":", 1) for a in args.remote)],
+                                       deadline_ms=args.deadline_ms)
+        else:
+            searcher = ShardedSearcher.local(args.shards_dir, deadline_ms=args.deadline_ms)
+        try:
+            q_vec = None
+            if args.mode != "sparse":
+                from common.onnx_backend import load_embedder
+                # the query encoder has to be the one the shard vectors were built with
+                q_vec = load_embedder(searcher.model_name()).encode([norm_query], normalize_embeddings=True)
+            results, info = searcher.search(norm_query, q_vec, args.mode, args.top_k)
+        finally:
+            searcher.close()
+        for r in results:
+            print("=" * 60)
+            print("ID:", r.get("paper_id"), f"(shard {r['shard']})")
+            print("Title:", r.get("title"))
+            print("Score:", r.get("score"))
+        print("Shards answered:", info["ok"], "timed out:", info["timed_out"], "failed:", info["failed"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Cache warming from the query log.
+
+Offline job: mine query_logs (read_logs) for the most frequent normalized queries,
+then run their logged raw variants through the serving path against the current
+index. It stores the normalized forms, the query embeddings and the (reranked)
+responses in <index_dir>/warm_cache/, tagged with the index manifest's built_at.
+
+serve.py calls preload() at start-up and after every index swap. When the warm cache
+matches the live index, the responses and embeddings are put into QUERY_CACHE, so
+head queries are served from cache right after a deploy. A stale warm cache (built
+against an older index) is ignored.
+
+    python apps/semantic_search/build_index.py
+    python apps/semantic_search/warm_cache.py --top_n 500
+    python apps/semantic_search/serve.py
+
+Queries whose normalization resolves relative dates ("last week") are skipped:
+their normalized form depends on the day they are asked.
+"""
+import json
+import time
+import shutil
+import argparse
+from collections import Counter, defaultdict
+from pathlib import Path
+import numpy as np
+import common_path  # puts packages/ on sys.path for common.*
+from common.query_cache import QUERY_CACHE, CachedEmbedder
+
+WARM_DIR = "warm_cache"
+DEFAULT_REQUEST = ("hybrid", 5, False)  # (mode, top_k, rerank) for events logged without params
+
+def _built_at(index_dir):
+    try:
+        with open(Path(index_dir) / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("built_at")
+    except (OSError, ValueError):
+        return None
+
+# -----------------------------
+# Mining
+# -----------------------------
+def mine_head_queries(log_file=None, top_n=200, max_variants=5, since=None, default_request=DEFAULT_REQUEST):
+    """
+    The top_n most frequent normalized queries, each with up to max_variants of its most
+    frequent logged requests (raw query, mode, top_k, rerank), the keys serve.py caches on.
+    """
+    from logger import read_logs
+    counts, requests = Counter(), defaultdict(Counter)
+    for ev in read_logs(log_file):
+        if since and ev.get("timestamp", "") < since:
+            continue
+        raw = (ev.get("query") or "").strip()
+        if not raw:
+            continue
+        norm = (ev.get("normalized_query") or raw).strip()
+        p = ev.get("params") or {}
+        req = (raw, p.get("mode", default_request[0]), int(p.get("top_k", default_request[1])),
+               bool(p.get("rerank", default_request[2])))
+        counts[norm] += 1
+        requests[norm][req] += 1
+    return [{"normalized_query": norm, "count": c, "requests": requests[norm].most_common(max_variants)}
+            for norm, c in counts.most_common(top_n)]
+
+# -----------------------------
+# Precompute + persist
+# -----------------------------
+def build_warm_cache(index_dir="data/semantic_search/index", corpus_file="data/semantic_search/corpus.jsonl",
+                     log_file=None, top_n=200, max_variants=5, since=None):
+    import serve
+    from normalize import normalize_query
+    from search import load_search_resources
+
+    index_dir = Path(index_dir)
+    head = mine_head_queries(log_file, top_n, max_variants, since)
+    resources = load_search_resources(corpus_file, index_dir)
+    normalized, entries, emb_texts, skipped = {}, [], [], 0
+    t = time.perf_counter()
+    for h in head:
+        for (raw, mode, top_k, rerank), count in h["requests"]:
+            if raw not in normalized:
+                norm, start, end = normalize_query(raw)
+                normalized[raw] = None if (start or end) else norm
+            norm = normalized[raw]
+            if norm is None:
+                skipped += 1
+                continue
+            response = serve._run_query(resources, raw, mode, top_k, rerank, norm_query=norm)
+            entries.append({"query": raw, "mode": mode, "top_k": top_k, "rerank": rerank, "count": count,
+                            "response": response})
+            if mode != "sparse" and norm not in emb_texts:
+                emb_texts.append(norm)
+    # retrieval already encoded these through the CachedEmbedder, so this reads them back
+    vecs = [np.asarray(serve._embed_model().encode([q], normalize_embeddings=True), dtype="float32")
+            for q in emb_texts]
+
+    out = index_dir / WARM_DIR
+    tmp = index_dir / (WARM_DIR + ".part")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "embeddings.npy", np.concatenate(vecs) if vecs else np.zeros((0, 0), dtype="float32"))
+    with open(tmp / "warm.json", "w", encoding="utf-8") as f:
+        json.dump({"built_at": _built_at(index_dir), "created_at": time.time(), "model_id": serve._embed_model_id(),
+                   "normalized": {k: v for k, v in normalized.items() if v is not None},
+                   "embedding_texts": emb_texts, "entries": entries}, f, ensure_ascii=False)
+    shutil.rmtree(out, ignore_errors=True)
+    tmp.rename(out)
+    print(f"Warmed {len(entries)} requests over {len(head)} head queries ({skipped} date-relative skipped) "
+          f"in {time.perf_counter() - t:.1f}s → {out}")
+    return out
+
+# -----------------------------
+# Preload (server side)
+# -----------------------------
+def preload(index_dir, version, model_id=None, cache=QUERY_CACHE):
+    """
+    Put a matching warm cache into cache under the given index version. Returns the
+    raw → normalized query map ({} when there is no warm cache or it is stale).
+    """
+    path = Path(index_dir) / WARM_DIR / "warm.json"
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        warm = json.load(f)
+    if warm.get("built_at") != _built_at(index_dir):
+        print(f"Warm cache {path} was built for another index version; ignoring it")
+        return {}
+
+    cache.sync_version(str(index_dir), version)
+    # room for every warm entry on top of the normal working set
+    cache.results.max_items = max(cache.results.max_items, len(warm["entries"]) + 1024)
+    for e in warm["entries"]:
+        cache.results.put((version, e["query"], e["mode"], e["top_k"], e["rerank"]), e["response"])
+    n_vecs = 0
+    if model_id is not None and model_id == warm.get("model_id") and warm["embedding_texts"]:
+        vecs = np.load(path.parent / "embeddings.npy")
+        key_id = CachedEmbedder.key_id(model_id, normalize_embeddings=True)
+        cache.embeddings.max_items = max(cache.embeddings.max_items, len(vecs) + 4096)
+        for text, v in zip(warm["embedding_texts"], vecs):
+            cache.embeddings.put((key_id, text), v[None, :])
+        n_vecs = len(vecs)
+    print(f"Preloaded {len(warm['entries'])} warm responses and {n_vecs} query embeddings")
+    return warm["normalized"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index_dir", type=str, default="data/semantic_search/index")
+    parser.add_argument("--corpus", type=str, default="data/semantic_search/corpus.jsonl")
+    parser.add_argument("--log_file", type=str, default=None, help="query log (default: logger.LOG_FILE)")
+    parser.add_argument("--top_n", type=int, default=200, help="head queries to precompute")
+    parser.add_argument("--max_variants", type=int, default=5, help="logged requests kept per normalized query")
+    parser.add_argument("--since", type=str, default=None, help="only mine events at or after this ISO timestamp")
+    args = parser.parse_args()
+    build_warm_cache(args.index_dir, args.corpus, args.log_file, args.top_n, args.max_variants, args.since)
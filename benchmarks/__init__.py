@@ -0,0 +1,11 @@
+"""
+Offline performance benchmarks for apps/semantic_search and apps/mm_rag.
+
+Synthetic corpora / PDFs (synthetic.py) and deterministic stand-in models
+(stubs.py) make runs reproducible without network access or model downloads;
+run.py executes every case in its own process (clean peak RSS, no clash between
+the two apps' flat module names) and stores JSON results for comparison.
+
+    python -m benchmarks.run --n_docs 10000 --queries 200
+    python -m benchmarks.run --compare benchmarks/results/<older>.json
+"""
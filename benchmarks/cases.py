@@ -0,0 +1,187 @@
+"""
+Benchmark cases. Each runs inside its own process (see run.py) and returns a
+flat dict of metrics; missing heavy dependencies surface as ImportError and are
+reported as skipped by the runner.
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.stubs import StubEmbedder, StubCrossEncoder, StubImageEmbedder, StubCaptioner
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def latency_stats(fn, inputs, warmup=5):
+    for x in inputs[:warmup]:
+        fn(x)
+    lat = []
+    start = time.perf_counter()
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        lat.append((time.perf_counter() - t0) * 1000)
+    wall = time.perf_counter() - start
+    lat = np.asarray(lat)
+    return {"n": len(lat), "mean_ms": float(lat.mean()), "p50_ms": float(np.percentile(lat, 50)),
+            "p90_ms": float(np.percentile(lat, 90)), "p99_ms": float(np.percentile(lat, 99)),
+            "max_ms": float(lat.max()), "qps": len(lat) / wall if wall > 0 else 0.0}
+
+# -----------------------------
+# semantic_search
+# -----------------------------
+def _semantic(params, need_dense):
+    sys.path.insert(0, str(ROOT / "apps" / "semantic_search"))
+    from bm25_store import build_bm25_arrays, MmapBM25, bm25_tokens
+    build = {}
+
+    t = time.perf_counter()
+    docs = synthetic.make_corpus(params["n_docs"], seed=params["seed"])
+    queries = synthetic.make_queries(docs, params["queries"], seed=params["seed"] + 1)
+    build["corpus_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    bm25_dir = Path(tempfile.mkdtemp(prefix="bench_bm25_"))
+    build_bm25_arrays([bm25_tokens(d) for d in docs], bm25_dir)
+    bm25 = MmapBM25(bm25_dir)
+    build["bm25_build_s"] = time.perf_counter() - t
+
+    embed_model, index = StubEmbedder(), None
+    if need_dense:
+        import faiss
+        t = time.perf_counter()
+        emb = embed_model.encode([d["title"] + " " + d["abstract"] for d in docs], normalize_embeddings=True)
+        build["embed_s"] = time.perf_counter() - t
+        t = time.perf_counter()
+        index = faiss.IndexFlatIP(emb.shape[1])
+        index.add(emb)
+        build["faiss_build_s"] = time.perf_counter() - t
+    return docs, queries, bm25, embed_model, index, build
+
+def case_semantic_dense(params):
+    docs, queries, _, embed_model, index, build = _semantic(params, need_dense=True)
+    from retriever import dense_retrieve
+    stats = latency_stats(lambda q: dense_retrieve(q[0], index, embed_model, docs, top_k=params["top_k"]), queries)
+    return {**stats, **build}
+
+def case_semantic_sparse(params):
+    docs, queries, bm25, _, _, build = _semantic(params, need_dense=False)
+    from retriever import sparse_retrieve
+    stats = latency_stats(lambda q: sparse_retrieve(q[0], bm25, docs, top_k=params["top_k"]), queries)
+    return {**stats, **build}
+
+def case_semantic_hybrid(params):
+    docs, queries, bm25, embed_model, index, build = _semantic(params, need_dense=True)
+    from retriever import hybrid_retrieve
+    stats = latency_stats(lambda q: hybrid_retrieve(q[0], index, embed_model, bm25, docs, top_k=params["top_k"]),
+                          queries)
+    return {**stats, **build}
+
+def case_semantic_rerank(params):
+    docs, queries, bm25, _, _, build = _semantic(params, need_dense=False)
+    from retriever import sparse_retrieve
+    import reranker
+    stub = StubCrossEncoder()
+    reranker._load_model = lambda model_name: stub
+    pools = [(q, sparse_retrieve(q, bm25, docs, top_k=params["rerank_candidates"])) for q, _ in queries]
+    stats = latency_stats(lambda qp: reranker.rerank(qp[0], [dict(c) for c in qp[1]], top_k=params["top_k"]), pools)
+    return {**stats, **build, "candidates": params["rerank_candidates"]}
+
+# -----------------------------
+# Concurrency (thread budget)
+# -----------------------------
+def _concurrent_queries(params):
+    """
+    params["workers"] threads serving queries at once, each doing a batched embedding
+    (BLAS matmul) and a flat inner-product scan over the corpus vectors (FAISS if installed,
+    else NumPy). Run as concurrency.default (every library sizes its own pool to all cores)
+    and concurrency.budget (run.py applies thread_budget "serve" before numpy loads).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    docs = synthetic.make_corpus(params["n_docs"], seed=params["seed"], body_len=0)
+    queries = [q for q, _ in synthetic.make_queries(docs, params["queries"], seed=params["seed"] + 1)]
+    embed_model = StubEmbedder()
+    vecs = embed_model.encode([d["title"] + " " + d["abstract"] for d in docs], normalize_embeddings=True)
+    try:
+        import faiss
+        index = faiss.IndexFlatIP(vecs.shape[1])
+        index.add(vecs)
+        scan = lambda q: index.search(q, params["top_k"])
+    except ImportError:
+        scan = lambda q: np.argpartition(-(q @ vecs.T), params["top_k"], axis=1)[:, :params["top_k"]]
+
+    def one(q):
+        qv = embed_model.encode([q] + [f"{q} {w}" for w in synthetic.TOPICS[:15]], normalize_embeddings=True)
+        scan(qv)
+
+    one(queries[0])
+    lat = []
+    def timed(q):
+        t0 = time.perf_counter()
+        one(q)
+        lat.append((time.perf_counter() - t0) * 1000)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(params["workers"]) as ex:
+        list(ex.map(timed, queries))
+    wall = time.perf_counter() - start
+    lat = np.asarray(lat)
+    return {"n": len(lat), "workers": params["workers"], "p50_ms": float(np.percentile(lat, 50)),
+            "p99_ms": float(np.percentile(lat, 99)), "qps": len(lat) / wall}
+
+def case_concurrency_default(params):
+    return {**_concurrent_queries(params), "thread_budget": None}
+
+def case_concurrency_budget(params):
+    from common.thread_budget import BUDGET
+    return {**_concurrent_queries(params), "thread_budget": dict(BUDGET)}
+
+# -----------------------------
+# mm_rag
+# -----------------------------
+def _mm_rag_stubs():
+    sys.path.insert(0, str(ROOT / "apps" / "mm_rag"))
+    import embeddings
+    embeddings.load_embedder = lambda *args, **kwargs: StubEmbedder()
+    embeddings.ImageEmbedder = StubImageEmbedder
+    embeddings.Captioner = StubCaptioner
+
+def _ingest(params):
+    _mm_rag_stubs()
+    from ingest_build_index import ingest_and_index
+    work = Path(tempfile.mkdtemp(prefix="bench_mm_rag_"))
+    pdf = work / "synthetic.pdf"
+    gold = synthetic.make_pdf(pdf, n_pages=params["pages"], seed=params["seed"])
+    t = time.perf_counter()
+    ingest_and_index(pdf, work / "data", use_captions=True, use_image_kv=params["image_kv"])
+    return work / "data", gold, time.perf_counter() - t
+
+def case_mm_rag_ingest(params):
+    _, gold, ingest_s = _ingest(params)
+    return {"ingest_s": ingest_s, "pages": params["pages"], "pages_per_s": params["pages"] / ingest_s,
+            "gold_questions": len(gold)}
+
+def case_mm_rag_retrieve(params):
+    data_root, gold, ingest_s = _ingest(params)
+    import retriever
+    import reranker
+    retriever.ImageEmbedder = StubImageEmbedder
+    reranker.load_cross_encoder = lambda *args, **kwargs: StubCrossEncoder()
+    questions = [g[0] for g in gold] or ["portfolio yield"]
+    questions += [f"{synthetic.TOPICS[i % len(synthetic.TOPICS)]} review section" for i in range(len(questions))]
+    questions = (questions * (params["queries"] // len(questions) + 1))[:params["queries"]]
+    stats = latency_stats(lambda q: retriever.retrieve(q, data_root, use_rerank=True, use_cache=False), questions)
+    return {**stats, "ingest_s": ingest_s}
+
+CASES = {
+    "semantic.dense": case_semantic_dense,
+    "semantic.sparse": case_semantic_sparse,
+    "semantic.hybrid": case_semantic_hybrid,
+    "semantic.rerank": case_semantic_rerank,
+    "concurrency.default": case_concurrency_default,
+    "concurrency.budget": case_concurrency_budget,
+    "mm_rag.ingest": case_mm_rag_ingest,
+    "mm_rag.retrieve": case_mm_rag_retrieve,
+}
@@ -0,0 +1,135 @@
+"""
+Run the benchmark cases and store the results as JSON.
+
+Every case runs in a fresh subprocess so peak RSS is per case and the two apps'
+same-named modules (retriever, reranker, ...) never meet in one interpreter.
+
+Usage:
+    python -m benchmarks.run                                   # all cases, 10k docs
+    python -m benchmarks.run --cases semantic.sparse semantic.hybrid --n_docs 1000000
+    python -m benchmarks.run --compare benchmarks/results/20261019T120000_abc1234.json
+    python -m benchmarks.run --cases concurrency.default concurrency.budget --workers 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+COMPARE_KEYS = ["p50_ms", "p99_ms", "qps", "peak_rss_mb", "bm25_build_s", "faiss_build_s", "ingest_s"]
+
+def _git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _run_case_inline(name, params):
+    """Child-process side: run one case, print its metrics as the last stdout line."""
+    if name == "concurrency.budget" or params.get("thread_budget"):
+        # has to happen before numpy / faiss / torch create their thread pools
+        sys.path.insert(0, str(ROOT / "packages"))
+        from common.thread_budget import configure
+        configure("serve", workers=params["workers"])
+    from benchmarks.cases import CASES
+    try:
+        out = CASES[name](params)
+    except ImportError as e:
+        out = {"skipped": f"missing dependency: {e.name or e}"}
+    out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(json.dumps(out))
+
+def run_case(name, params, timeout):
+    cmd = [sys.executable, "-m", "benchmarks.run", "--_case", name, "--_params", json.dumps(params)]
+    t = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+    wall = time.perf_counter() - t
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    try:
+        res = json.loads(lines[-1])
+    except json.JSONDecodeError:
+        return {"error": f"unparseable output: {lines[-1][:200]}"}
+    res["wall_s"] = wall
+    return res
+
+def compare(old, new):
+    print(f"\nvs {old.get('commit')} ({old.get('timestamp')})")
+    for name, res in new["results"].items():
+        prev = old.get("results", {}).get(name)
+        if not prev or "skipped" in res or "error" in res:
+            continue
+        parts = []
+        for k in COMPARE_KEYS:
+            if k in res and k in prev and prev[k]:
+                delta = (res[k] - prev[k]) / prev[k] * 100
+                parts.append(f"{k} {prev[k]:.2f}→{res[k]:.2f} ({delta:+.1f}%)")
+        print(f"  {name:18s} " + ", ".join(parts))
+
+def main():
+    from benchmarks.cases import CASES
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    ap.add_argument("--n_docs", type=int, default=10000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top_k", type=int, default=5)
+    ap.add_argument("--rerank_candidates", type=int, default=50)
+    ap.add_argument("--pages", type=int, default=20, help="synthetic PDF pages for mm_rag cases")
+    ap.add_argument("--image_kv", action="store_true", help="include chart OCR (needs Tesseract) in mm_rag ingest")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="concurrent queries in concurrency.* cases")
+    ap.add_argument("--thread_budget", action="store_true", help="apply thread_budget (serve role) to every case")
+    ap.add_argument("--timeout", type=int, default=3600, help="per case, seconds")
+    ap.add_argument("--out", type=str, default=None, help="results file (default: benchmarks/results/<time>_<commit>.json)")
+    ap.add_argument("--compare", type=str, default=None, help="earlier results file to diff against")
+    ap.add_argument("--_case", help=argparse.SUPPRESS)
+    ap.add_argument("--_params", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args._case:
+        return _run_case_inline(args._case, json.loads(args._params))
+
+    params = {k: getattr(args, k) for k in ("n_docs", "queries", "top_k", "rerank_candidates", "pages",
+                                            "image_kv", "seed", "workers", "thread_budget")}
+    report = {"commit": _git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "platform": platform.platform(),
+              "params": params, "results": {}}
+    for name in args.cases:
+        res = run_case(name, params, args.timeout)
+        report["results"][name] = res
+        if "skipped" in res or "error" in res:
+            print(f"{name:18s} {res.get('skipped') or 'ERROR: ' + res['error']}")
+        elif "p50_ms" in res:
+            print(f"{name:18s} p50 {res['p50_ms']:8.2f} ms  p99 {res['p99_ms']:8.2f} ms  "
+                  f"{res['qps']:8.1f} qps  peak RSS {res['peak_rss_mb']:7.1f} MB")
+        else:
+            print(f"{name:18s} ingest {res['ingest_s']:.2f} s ({res['pages_per_s']:.1f} pages/s)  "
+                  f"peak RSS {res['peak_rss_mb']:.1f} MB")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{datetime.now():%Y%m%dT%H%M%S}_{report['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Deterministic stand-ins for the neural models, with the same call signatures
+as SentenceTransformer / CrossEncoder / the mm_rag CLIP and caption wrappers.
+They do real (hashing + matrix) work so latency still scales with input size,
+but need no weights, GPU or network.
+"""
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+def _tokens(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+def _bucket(token, dim):
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+class StubEmbedder:
+    """Hashed bag of words → fixed random projection (SentenceTransformer.encode signature)."""
+    def __init__(self, dim=384, hash_dim=4096, seed=0):
+        self.dim = dim
+        self.hash_dim = hash_dim
+        self.proj = np.random.default_rng(seed).standard_normal((hash_dim, dim)).astype("float32") / np.sqrt(dim)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=False, convert_to_numpy=True,
+               show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            bow = np.zeros((len(chunk), self.hash_dim), dtype="float32")
+            for r, t in enumerate(chunk):
+                for tok in _tokens(t):
+                    bow[r, _bucket(tok, self.hash_dim)] += 1.0
+            out[start:start + len(chunk)] = bow @ self.proj
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+class StubCrossEncoder:
+    """Token-overlap relevance (CrossEncoder.predict signature)."""
+    def predict(self, pairs, batch_size=32, show_progress_bar=False, **kwargs):
+        scores = np.zeros(len(pairs), dtype="float32")
+        for i, (q, p) in enumerate(pairs):
+            q_toks, p_toks = set(_tokens(q)), _tokens(p)
+            if p_toks:
+                scores[i] = sum(t in q_toks for t in p_toks) / np.sqrt(len(p_toks))
+        return scores
+
+class StubImageEmbedder:
+    """mm_rag.embeddings.ImageEmbedder stand-in: 512-d vectors from image bytes / query text."""
+    def __init__(self, *args, **kwargs):
+        self.text = StubEmbedder(dim=512, seed=1)
+
+    def encode_paths(self, image_paths):
+        if not image_paths:
+            return np.zeros((0, 512), dtype="float32")
+        seeds = []
+        for p in image_paths:
+            with open(p, "rb") as f:
+                seeds.append(zlib.crc32(f.read()))
+        vecs = np.stack([np.random.default_rng(s).standard_normal(512) for s in seeds]).astype("float32")
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    def encode_text_for_clip(self, queries):
+        return self.text.encode(queries, normalize_embeddings=True)
+
+class StubCaptioner:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def caption_paths(self, image_paths):
+        return [f"a chart image {i}" for i in range(len(image_paths))]
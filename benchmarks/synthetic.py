@@ -0,0 +1,121 @@
+"""
+Synthetic, seeded workloads: arXiv-shaped corpora for semantic_search and
+report-style PDFs (text, ruled tables, embedded bar-chart images) for mm_rag.
+"""
+import io
+import random
+
+import numpy as np
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "sa", "di", "go", "fu", "ba", "xe", "yo"]
+TOPICS = ["learning", "network", "graph", "model", "market", "risk", "portfolio", "yield", "estimation",
+          "inference", "policy", "equilibrium", "transformer", "retrieval", "causal", "bayesian"]
+
+# -----------------------------
+# Text corpus (semantic_search)
+# -----------------------------
+def make_vocab(size=20000, seed=0):
+    rnd = random.Random(seed)
+    words = set(TOPICS)
+    while len(words) < size:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+def make_corpus(n_docs, seed=0, vocab_size=20000, title_len=8, abstract_len=120, body_len=400):
+    """Docs with the fields the apps read (paper_id, title, abstract, authors, keywords, full_text);
+    word frequencies are Zipfian so BM25 postings have a realistic long tail."""
+    vocab = np.array(make_vocab(vocab_size, seed))
+    rng = np.random.default_rng(seed)
+
+    def words(n):
+        ids = np.minimum(rng.zipf(1.2, n), vocab_size) - 1
+        return " ".join(vocab[ids])
+
+    docs = []
+    for i in range(n_docs):
+        title, abstract = words(title_len).capitalize(), words(abstract_len)
+        docs.append({
+            "paper_id": f"syn{i:07d}",
+            "title": title,
+            "abstract": abstract,
+            "authors": [f"Author {i % 997}", f"Author {(i * 7) % 991}"],
+            "keywords": words(4).split(),
+            "full_text": title + "\n" + abstract + "\n" + words(body_len),
+        })
+    return docs
+
+def make_queries(docs, n, seed=0, min_len=2, max_len=5):
+    """(query, paper_id) pairs: word spans lifted from a random doc's title + abstract."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        d = docs[rnd.randrange(len(docs))]
+        toks = (d["title"] + " " + d["abstract"]).split()
+        L = rnd.randint(min_len, max_len)
+        s = rnd.randrange(max(len(toks) - L, 1))
+        out.append((" ".join(toks[s:s + L]), d["paper_id"]))
+    return out
+
+# -----------------------------
+# PDFs (mm_rag)
+# -----------------------------
+SECTORS = ["Technology", "Health Care", "Financials", "Energy", "Utilities", "Materials", "Industrials"]
+
+def _chart_png(seed, width=480, height=320):
+    from PIL import Image, ImageDraw
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    labels = rnd.sample(SECTORS, 4)
+    values = [rnd.uniform(5, 40) for _ in labels]
+    bar_w = width // (2 * len(labels))
+    for k, (label, v) in enumerate(zip(labels, values)):
+        x0 = bar_w // 2 + 2 * k * bar_w
+        top = height - 60 - int(v / 40 * (height - 100))
+        draw.rectangle([x0, top, x0 + bar_w, height - 60], fill=(40 + 50 * k, 90, 160))
+        draw.text((x0, height - 50), label, fill="black")
+        draw.text((x0, top - 15), f"{v:.1f}%", fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def _draw_table(page, top, rows, col_w=120, row_h=20, left=50):
+    import fitz
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            rect = fitz.Rect(left + c * col_w, top + r * row_h, left + (c + 1) * col_w, top + (r + 1) * row_h)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_textbox(rect + (3, 3, -3, -3), cell, fontsize=8)
+    return top + len(rows) * row_h
+
+def make_pdf(path, n_pages=20, seed=0, table_every=3, image_every=4):
+    """
+    Report-style PDF. Every page has paragraphs; every table_every-th page a ruled
+    portfolio table ("Portfolio N" rows × yield/NAV columns); every image_every-th
+    page an embedded bar chart. Returns (question, expected_phrase, page) triples.
+    """
+    import fitz
+    rnd = random.Random(seed)
+    vocab = make_vocab(2000, seed)
+    doc = fitz.open()
+    gold = []
+    for p in range(n_pages):
+        page = doc.new_page(width=612, height=792)
+        page.insert_text((50, 60), f"Section {p + 1}: {rnd.choice(TOPICS).title()} review", fontsize=14)
+        body = " ".join(rnd.choice(vocab) for _ in range(160))
+        page.insert_textbox(fitz.Rect(50, 80, 562, 300), body, fontsize=9)
+        y = 320
+        if p % table_every == 0:
+            header = ["Portfolio", "SEC Yield", "NAV", "Q2 2024 Return"]
+            rows = [header]
+            for r in range(6):
+                name = f"Portfolio {p * 10 + r + 1}"
+                vals = [f"{rnd.uniform(0.5, 6):.2f}%", f"{rnd.uniform(9, 120):.2f}", f"{rnd.uniform(-4, 9):.2f}%"]
+                rows.append([name] + vals)
+                gold.append((f"What is the SEC yield for {name}?", vals[0], p))
+            y = _draw_table(page, y, rows) + 20
+        if p % image_every == 1:
+            page.insert_image(fitz.Rect(50, y, 410, y + 240), stream=_chart_png(seed * 1000 + p))
+    doc.save(str(path))
+    doc.close()
+    return gold
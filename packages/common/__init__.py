@@ -0,0 +1,15 @@
+"""
+Modules shared by apps/semantic_search and apps/mm_rag.
+
+  onnx_backend   torch / ONNX Runtime int8 embedder + cross-encoder (INFERENCE_BACKEND)
+  query_cache    query-embedding + result LRU caches keyed on the index manifest
+  tracing        per-query stage spans, Chrome-trace export
+  hot_swap       staged index publish + refcounted zero-downtime swaps
+  thread_budget  per-role torch / FAISS / ONNX / BLAS thread and pool sizes
+  doc_store      memory-mapped JSON record store (offset table), O(1) access by row id
+  dedup          MMR / near-duplicate suppression before reranking
+  faiss_index    flat FAISS indexes with an optional PCA / OPQ projection; save / mmap load
+
+The apps are run as scripts, so each one puts packages/ on sys.path through its
+common_path module before importing from here.
+"""
@@ -0,0 +1,59 @@
+"""
+Maximal-marginal-relevance / near-duplicate suppression between retrieval and reranking.
+semantic_search diversifies fused hybrid pools with it; mm_rag wraps it in dedup_hits.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# -----------------------------
+# MMR selection
+# -----------------------------
+def _unit_rows(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vecs, dtype="float32")
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+def mmr_select(cand_vecs: np.ndarray, relevance: Sequence[float], k: int,
+               lambda_: float = 0.7, dup_threshold: float = 0.95,
+               groups: Optional[Sequence] = None, max_per_group: Optional[int] = None) -> List[int]:
+    """
+    Greedy MMR over candidate vectors (cosine similarity).
+    - Drops candidates with cosine >= dup_threshold to anything already selected.
+    - Optional per-group cap (e.g. page numbers, or one paper split into several chunks).
+    Returns candidate positions in selection order (at most k).
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    V = _unit_rows(cand_vecs)
+    sim = V @ V.T
+
+    rel = np.asarray(relevance, dtype="float32")
+    span = float(rel.max() - rel.min())
+    rel = (rel - rel.min()) / span if span > 0 else np.ones(n, dtype="float32")
+
+    alive = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype="float32")
+    group_ids = None
+    if groups is not None and max_per_group:
+        _, group_ids = np.unique([str(g) for g in groups], return_inverse=True)
+        group_counts = np.zeros(group_ids.max() + 1, dtype=int)
+
+    selected = []
+    while len(selected) < k and alive.any():
+        mmr = lambda_ * rel - (1.0 - lambda_) * max_sim
+        mmr[~alive] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        alive[best] = False
+
+        max_sim = np.maximum(max_sim, sim[:, best])
+        alive &= max_sim < dup_threshold
+        if group_ids is not None:
+            g = group_ids[best]
+            group_counts[g] += 1
+            if group_counts[g] >= max_per_group:
+                alive &= group_ids != g
+    return selected
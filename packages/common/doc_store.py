@@ -0,0 +1,69 @@
+"""
+Read-only JSON record store with O(1) random access by row id (semantic_search
+docs.bin, mm_rag text_meta.bin / image_meta.bin).
+
+The file is memory-mapped, so it is shared through the page cache by every
+serving process and only the records actually requested are decoded.
+Layout (little endian):
+  8 bytes   magic  b"MMMETA01"
+  8 bytes   uint64 n (number of records)
+  8*(n+1)   uint64 offsets into the payload section
+  ...       payload: UTF-8 JSON records back to back
+"""
+import json
+import mmap
+from pathlib import Path
+import numpy as np
+
+MAGIC = b"MMMETA01"
+HEADER = 16
+
+def write_doc_store(docs, path):
+    path = Path(path)
+    payloads = [json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for d in docs]
+    offsets = np.zeros(len(payloads) + 1, dtype="<u8")
+    if payloads:
+        offsets[1:] = np.cumsum([len(p) for p in payloads])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(payloads)).astype("<u8").tobytes())
+        f.write(offsets.tobytes())
+        for p in payloads:
+            f.write(p)
+    tmp.replace(path)
+
+class DocStore:
+    """List-like view over docs.bin; docs[i] decodes only document i."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"{self.path} is not a document store")
+        self.n = int(np.frombuffer(self._mm, dtype="<u8", count=1, offset=8)[0])
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=self.n + 1, offset=HEADER)
+        self._base = HEADER + 8 * (self.n + 1)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        start, end = self._base + int(self._offsets[i]), self._base + int(self._offsets[i + 1])
+        return json.loads(self._mm[start:end])
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def close(self):
+        # release numpy views on the mapping before closing it
+        self._offsets = None
+        self._mm.close()
+        self._f.close()
@@ -0,0 +1,71 @@
+"""
+FAISS index construction shared by semantic_search (build_index.py, shards.py) and
+mm_rag (ingest_build_index.py): flat indexes, optionally behind a PCA / OPQ projection
+that is trained on the vectors and stored inside the index file, plus save / (memory-mapped) load.
+faiss is imported lazily so CLI entry points (--help, simple queries) start fast.
+"""
+OPQ_MIN_TRAIN = 256  # OPQ trains 8-bit (256-centroid) sub-quantizers: k-means needs >= 256 vectors
+
+def build_faiss_index(vectors, metric="cosine", reduce_dim=None, reduce_method="pca"):
+    """
+    Flat index over vectors; metric "cosine" / "ip" (inner product) or "l2". With reduce_dim a
+    PCA (or OPQ rotation + reduction) is fitted on the vectors and stored inside the index
+    (IndexPreTransform), so search() projects queries the same way and the projection is
+    saved / loaded together with the index file. Falls back to the full dimensionality when
+    there are fewer vectors than reduce_dim, and from OPQ to PCA below OPQ_MIN_TRAIN vectors.
+    """
+    import faiss
+    if vectors.size == 0:
+        return faiss.IndexFlatIP(1)
+    dim = vectors.shape[1]
+    make = faiss.IndexFlatIP if metric in ("cosine", "ip") else faiss.IndexFlatL2
+    if not reduce_dim or reduce_dim >= dim or len(vectors) < reduce_dim:
+        if reduce_dim and reduce_dim < dim:
+            print(f"Only {len(vectors)} vectors, too few to fit a {reduce_dim}-d projection; keeping {dim}-d")
+        index = make(dim)
+        index.add(vectors)
+        return index
+    if reduce_method == "opq" and len(vectors) < OPQ_MIN_TRAIN:
+        print(f"Only {len(vectors)} vectors, too few to train OPQ (needs {OPQ_MIN_TRAIN}); using PCA instead")
+        reduce_method = "pca"
+    if reduce_method == "pca":
+        transform = faiss.PCAMatrix(dim, reduce_dim)
+    elif reduce_method == "opq":
+        transform = faiss.OPQMatrix(dim, 8 if reduce_dim % 8 == 0 else 1, reduce_dim)
+    else:
+        raise ValueError(f"Unknown reduce_method: {reduce_method} (use pca or opq)")
+    index = faiss.IndexPreTransform(make(reduce_dim))
+    if metric in ("cosine", "ip"):
+        index.prepend_transform(faiss.NormalizationTransform(reduce_dim))  # keep cosine after projection
+    index.prepend_transform(transform)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+def describe_index(index):
+    """Input / stored dimensionality, projection and approximate vector memory of an index."""
+    import faiss
+    info = {"ntotal": int(index.ntotal), "dim_in": int(index.d), "dim": int(index.d), "transform": None}
+    if isinstance(index, faiss.IndexPreTransform):
+        info["dim"] = int(faiss.downcast_index(index.index).d)
+        info["transform"] = type(faiss.downcast_VectorTransform(index.chain.at(0))).__name__
+    info["vector_bytes"] = info["ntotal"] * info["dim"] * 4
+    return info
+
+def save_faiss(index, path):
+    import faiss
+    path.parent.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(index, str(path))
+
+def load_faiss(path, mmap=False):
+    """With mmap=True the vectors are mapped read-only instead of copied into the process,
+    so every process opening the same index shares one copy through the page cache."""
+    import faiss
+    if not mmap:
+        return faiss.read_index(str(path))
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(str(path), flag)
+    except RuntimeError:
+        # older faiss builds can only mmap inverted lists
+        return faiss.read_index(str(path))
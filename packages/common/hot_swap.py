@@ -0,0 +1,231 @@
+"""
+Zero-downtime index swaps for long-running processes.
+
+Publishing: builders write a complete index into <index_dir>/.staging and call
+publish_staged(), which moves every file into place with os.replace (manifest.json
+last). A replaced file keeps its old inode alive for anyone who still has it
+mapped, so in-flight queries never see a truncated index.
+
+Serving: HotSwapIndex holds the current generation of loaded resources. Queries
+take a reference with acquire(); when the manifest version changes a background
+thread loads the new generation, the pointer is swapped under a lock, and the
+old generation is closed once its last in-flight query releases it.
+Every swap is recorded (load time, swap time, how long / how much memory both
+generations were resident at once) and available from stats().
+
+While publish_staged() runs, <index_dir>/.publishing holds the publisher's host and
+pid, and loads wait for it to go away. A marker left behind by a build that died
+mid-publish (publisher pid gone, or older than PUBLISH_TIMEOUT_S) is reported once
+as an error. The current generation then stays in service until a later publish
+replaces the marker; at start-up, with no generation to keep, it raises instead.
+"""
+import os
+import gc
+import sys
+import time
+import shutil
+import socket
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .query_cache import index_version
+
+PUBLISHING = ".publishing"
+PUBLISH_TIMEOUT_S = 600.0  # a publish is a few renames; an older marker was left by a dead build
+
+# -----------------------------
+# Publishing
+# -----------------------------
+def publish_staged(staging_dir, index_dir, manifest="manifest.json"):
+    """Move a fully built index from staging_dir into index_dir, file by file, manifest last."""
+    staging_dir, index_dir = Path(staging_dir), Path(index_dir)
+    files = sorted(p for p in staging_dir.rglob("*") if p.is_file())
+    files.sort(key=lambda p: p.relative_to(staging_dir).as_posix() == manifest)
+    marker = index_dir / PUBLISHING
+    marker.write_text(f"{socket.gethostname()} {os.getpid()}\n")
+    try:
+        for src in files:
+            dest = index_dir / src.relative_to(staging_dir)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dest)
+    finally:
+        marker.unlink()
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+def publish_state(index_dir, timeout_s=PUBLISH_TIMEOUT_S):
+    """None (no publish), "running", or "stale": the marker is older than timeout_s or its
+    publisher pid no longer exists on this host."""
+    marker = Path(index_dir) / PUBLISHING
+    try:
+        age = time.time() - marker.stat().st_mtime
+        host, _, pid = marker.read_text().strip().partition(" ")
+    except FileNotFoundError:
+        return None
+    if age > timeout_s:
+        return "stale"
+    if host == socket.gethostname() and pid.isdigit() and not _pid_alive(int(pid)):
+        return "stale"
+    return "running"
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux; 0.0 elsewhere)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+# -----------------------------
+# Generations
+# -----------------------------
+class Generation:
+    def __init__(self, resources, version):
+        self.resources = resources
+        self.version = version
+        self.loaded_at = time.time()
+        self.refs = 0
+        self.retired = None  # perf_counter() when swapped out
+
+    def close(self):
+        items = self.resources.values() if isinstance(self.resources, dict) else self.resources
+        for r in items:
+            if hasattr(r, "close"):
+                r.close()
+        self.resources = None
+
+class HotSwapIndex:
+    """
+    loader() returns the resources of one generation (a tuple or dict; members with a
+    close() method are closed on release). The manifest is polled at most every poll_s
+    seconds from acquire(), so no watcher thread has to survive a fork.
+    """
+    def __init__(self, index_dir, loader, poll_s=2.0, manifest="manifest.json", max_history=20,
+                 publish_timeout_s=PUBLISH_TIMEOUT_S):
+        self.index_dir = Path(index_dir)
+        self.manifest = self.index_dir / manifest
+        self.loader = loader
+        self.poll_s = poll_s
+        self.max_history = max_history
+        self.publish_timeout_s = publish_timeout_s
+        self.swaps = []
+        self._stale_reported = None          # mtime of the stale marker already logged
+        self._lock = threading.Lock()       # guards the current pointer and refcounts
+        self._load_lock = threading.Lock()  # one generation load at a time
+        self._checked_at = time.monotonic()
+        self._current = self._load()
+        if self._current is None:
+            raise RuntimeError(f"{self.index_dir / PUBLISHING} was left by a publish that never finished; "
+                               f"the index may be half-replaced. Re-run the build (or remove the marker).")
+
+    def _load(self):
+        # retry while a publish is in progress or the manifest moved underneath the load;
+        # None when the publish marker is stale
+        while True:
+            before = index_version(self.manifest)
+            state = publish_state(self.index_dir, self.publish_timeout_s)
+            if state == "stale":
+                return None
+            if state is None:
+                resources = self.loader()
+                if index_version(self.manifest) == before and publish_state(self.index_dir, self.publish_timeout_s) is None:
+                    return Generation(resources, before)
+                Generation(resources, before).close()
+            time.sleep(0.05)
+
+    def _report_stale(self):
+        marker = self.index_dir / PUBLISHING
+        try:
+            mtime = marker.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._stale_reported:
+            self._stale_reported = mtime
+            print(f"ERROR: stale publish marker {marker} ({marker.read_text().strip() or 'no pid'}); "
+                  f"keeping index version {self._current.version}", file=sys.stderr)
+
+    @property
+    def version(self):
+        return self._current.version
+
+    @contextmanager
+    def acquire(self):
+        """Pin the current generation for the duration of one query."""
+        self._maybe_refresh()
+        with self._lock:
+            gen = self._current
+            gen.refs += 1
+        try:
+            yield gen
+        finally:
+            with self._lock:
+                gen.refs -= 1
+                release = gen.retired is not None and gen.refs == 0
+            if release:
+                self._release(gen)
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.poll_s:
+            return
+        self._checked_at = now
+        if index_version(self.manifest) != self._current.version and self._load_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_background, daemon=True).start()
+
+    def _refresh_background(self):
+        try:
+            self._swap_in()
+        finally:
+            self._load_lock.release()
+
+    def refresh(self):
+        """Load the newest generation in the calling thread; True if one was swapped in."""
+        with self._load_lock:
+            return self._swap_in()
+
+    def _swap_in(self):
+        if index_version(self.manifest) == self._current.version:
+            return False
+        rss_before = rss_mb()
+        t0 = time.perf_counter()
+        new = self._load()
+        if new is None:
+            self._report_stale()
+            return False
+        load_s = time.perf_counter() - t0
+        rss_loaded = rss_mb()
+        t1 = time.perf_counter()
+        with self._lock:
+            old, self._current = self._current, new
+            old.retired = time.perf_counter()
+            in_flight = old.refs
+            old.swap = swap = {"from": old.version, "to": new.version, "at": time.time(), "load_s": load_s,
+                               "swap_ms": (old.retired - t1) * 1000, "in_flight": in_flight,
+                               "rss_before_mb": rss_before, "rss_both_mb": rss_loaded,
+                               "overlap_mb": max(rss_loaded - rss_before, 0.0)}
+        self.swaps = (self.swaps + [swap])[-self.max_history:]
+        if in_flight == 0:
+            self._release(old)
+        return True
+
+    def _release(self, gen):
+        gen.close()
+        gc.collect()
+        swap = getattr(gen, "swap", None)
+        if swap is not None:
+            swap["overlap_s"] = time.perf_counter() - gen.retired
+            swap["rss_after_mb"] = rss_mb()
+            print(f"index swapped in {swap['swap_ms']:.2f} ms (load {swap['load_s']:.2f} s); generations "
+                  f"overlapped {swap['overlap_s'] * 1000:.1f} ms, +{swap['overlap_mb']:.1f} MB RSS")
+
+    def stats(self):
+        return {"version": self._current.version, "loaded_at": self._current.loaded_at,
+                "in_flight": self._current.refs, "swaps": list(self.swaps)}
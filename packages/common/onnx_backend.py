@@ -0,0 +1,238 @@
+"""
+Pluggable inference backend: eager PyTorch (sentence-transformers) or ONNX Runtime (int8).
+
+Selected via environment config:
+  INFERENCE_BACKEND = torch | onnx          (default: torch)
+  ONNX_MODEL_DIR    = models/onnx           (where exported models live)
+  ONNX_THREADS      = 1..N                  (intra-op threads per session)
+
+Export + parity check (from the repo root):
+  PYTHONPATH=packages python -m common.onnx_backend export
+  PYTHONPATH=packages python -m common.onnx_backend parity     # semantic_search corpus + eval set
+  PYTHONPATH=packages python -m common.onnx_backend parity --questions data/mm_rag/gold_eval.jsonl \
+      --passages data/mm_rag/index/text_meta.bin --fields text
+"""
+import os
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CROSS_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = Path(os.environ.get("ONNX_MODEL_DIR", "models/onnx"))
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "1"))
+
+def _hf_id(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+def _model_dir(model_name, root=None):
+    return Path(root or ONNX_MODEL_DIR) / _hf_id(model_name).replace("/", "__")
+
+def _pipeline_modules(model_dir):
+    """Module types of the sentence-transformers pipeline the embedder was exported from."""
+    path = Path(model_dir) / "st_modules.json"
+    if not path.exists():
+        # exported before the pipeline was recorded: both default models end in Normalize
+        return ["Transformer", "Pooling", "Normalize"]
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# -----------------------------
+# Export (fp32 ONNX → dynamic int8)
+# -----------------------------
+def export_onnx(model_name, kind, root=None, quantize=True, opset=17):
+    """kind: "embedder" (last_hidden_state) or "cross_encoder" (logits)."""
+    import torch
+    from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out_dir = _model_dir(model_name, root)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(_hf_id(model_name))
+    model_cls = AutoModel if kind == "embedder" else AutoModelForSequenceClassification
+    model = model_cls.from_pretrained(_hf_id(model_name)).eval()
+    tok.save_pretrained(out_dir)
+    if kind == "embedder":
+        # record the pipeline (Pooling → Normalize, ...) so OnnxEmbedder post-processes the same way
+        from sentence_transformers import SentenceTransformer
+        with open(out_dir / "st_modules.json", "w", encoding="utf-8") as f:
+            json.dump([type(m).__name__ for m in SentenceTransformer(_hf_id(model_name))], f)
+
+    dummy = tok(["query text"], ["passage text"], return_tensors="pt") if kind == "cross_encoder" \
+        else tok(["passage text"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    output_name = "last_hidden_state" if kind == "embedder" else "logits"
+    dynamic = {n: {0: "batch", 1: "seq"} for n in input_names}
+    dynamic[output_name] = {0: "batch", 1: "seq"} if kind == "embedder" else {0: "batch"}
+
+    fp32_path = out_dir / "model_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(dummy[n] for n in input_names), str(fp32_path),
+                          input_names=input_names, output_names=[output_name],
+                          dynamic_axes=dynamic, opset_version=opset)
+    final_path = out_dir / "model.onnx"
+    if quantize:
+        quantize_dynamic(str(fp32_path), str(final_path), weight_type=QuantType.QInt8)
+    else:
+        fp32_path.replace(final_path)
+    print(f"Exported {model_name} ({kind}) → {final_path}")
+    return final_path
+
+# -----------------------------
+# Runtime
+# -----------------------------
+def _session(model_dir, num_threads):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = num_threads
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(Path(model_dir) / "model.onnx"), opts, providers=["CPUExecutionProvider"])
+
+class OnnxEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode: mean pooling, then L2 normalization whenever
+    the exported pipeline ends in a Normalize module (as all-MiniLM-L6-v2 does), so
+    encode() returns the same vectors as the torch model with or without normalize_embeddings.
+    """
+    def __init__(self, model_name=EMBED_MODEL, root=None, num_threads=None, max_length=256):
+        from transformers import AutoTokenizer
+        model_dir = _model_dir(model_name, root)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _session(model_dir, num_threads or ONNX_THREADS)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+        self.normalize = "Normalize" in _pipeline_modules(model_dir)
+
+    def get_sentence_embedding_dimension(self):
+        dim = self.session.get_outputs()[0].shape[-1]
+        return dim if isinstance(dim, int) else None
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        out = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+            feeds = {k: v.astype("int64") for k, v in enc.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype("float32")
+            out.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        vecs = np.vstack(out).astype("float32") if out else \
+            np.zeros((0, self.get_sentence_embedding_dimension() or 384), dtype="float32")
+        if normalize_embeddings or self.normalize:
+            vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs
+
+class OnnxCrossEncoder:
+    """Drop-in for CrossEncoder.predict (returns raw relevance logits)."""
+    def __init__(self, model_name=CROSS_MODEL, root=None, num_threads=None, max_length=512):
+        from transformers import AutoTokenizer
+        model_dir = _model_dir(model_name, root)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _session(model_dir, num_threads or ONNX_THREADS)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        scores = []
+        for i in range(0, len(pairs), batch_size):
+            batch = pairs[i:i + batch_size]
+            enc = self.tokenizer([q for q, _ in batch], [p for _, p in batch], padding=True,
+                                 truncation=True, max_length=self.max_length, return_tensors="np")
+            feeds = {k: v.astype("int64") for k, v in enc.items() if k in self.input_names}
+            scores.append(self.session.run(None, feeds)[0][:, 0])
+        return np.concatenate(scores) if scores else np.zeros(0, dtype="float32")
+
+# -----------------------------
+# Factories (config-selected)
+# -----------------------------
+def load_embedder(model_name=EMBED_MODEL, backend=None):
+    if (backend or BACKEND) == "onnx":
+        return OnnxEmbedder(model_name)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def load_cross_encoder(model_name=CROSS_MODEL, backend=None):
+    if (backend or BACKEND) == "onnx":
+        return OnnxCrossEncoder(model_name)
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name)
+
+# -----------------------------
+# Parity check
+# -----------------------------
+def check_parity(queries, passages, candidates_per_query=20, top_n=5):
+    """
+    Compare torch fp32 vs ONNX int8 on the same inputs:
+    - embedder: norm mismatch and cosine drift of default encode() vectors, top-n overlap of dense rankings
+    - cross-encoder: top-1 agreement and top-n overlap on the torch dense candidates
+    """
+    t_emb, o_emb = load_embedder(backend="torch"), load_embedder(backend="onnx")
+    t_ce, o_ce = load_cross_encoder(backend="torch"), load_cross_encoder(backend="onnx")
+
+    # default encode() output, as build_index.py / ingest_build_index.py store it: a missing (or extra)
+    # pipeline step shows up as a norm mismatch even when the directions agree
+    t_vecs = [np.asarray(t_emb.encode(x), dtype="float32") for x in (passages, queries)]
+    o_vecs = [np.asarray(o_emb.encode(x), dtype="float32") for x in (passages, queries)]
+    norm_diff = np.abs(np.linalg.norm(np.vstack(t_vecs), axis=1) - np.linalg.norm(np.vstack(o_vecs), axis=1))
+    unit = lambda v: v / np.clip(np.linalg.norm(v, axis=1, keepdims=True), 1e-12, None)
+    (tp, tq), (op, oq) = [unit(v) for v in t_vecs], [unit(v) for v in o_vecs]
+    drift = 1.0 - np.concatenate([(tp * op).sum(axis=1), (tq * oq).sum(axis=1)])
+
+    t_rank = np.argsort(-(tq @ tp.T), axis=1)
+    o_rank = np.argsort(-(oq @ op.T), axis=1)
+    dense_overlap = np.mean([len(set(a[:top_n]) & set(b[:top_n])) / top_n for a, b in zip(t_rank, o_rank)])
+
+    ce_top1, ce_overlap = [], []
+    for q, cand in zip(queries, t_rank[:, :candidates_per_query]):
+        pairs = [(q, passages[i]) for i in cand]
+        ts, os_ = np.asarray(t_ce.predict(pairs)), o_ce.predict(pairs)
+        ce_top1.append(int(np.argmax(ts) == np.argmax(os_)))
+        ce_overlap.append(len(set(np.argsort(-ts)[:top_n]) & set(np.argsort(-os_)[:top_n])) / top_n)
+
+    report = {
+        "n_queries": len(queries), "n_passages": len(passages),
+        "embed_cosine_drift_mean": float(drift.mean()), "embed_cosine_drift_max": float(drift.max()),
+        "embed_norm_diff_max": float(norm_diff.max()),
+        f"dense_top{top_n}_overlap": float(dense_overlap),
+        "cross_top1_agreement": float(np.mean(ce_top1)) if ce_top1 else None,
+        f"cross_top{top_n}_overlap": float(np.mean(ce_overlap)) if ce_overlap else None,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+def _load_passages(path, fields):
+    if str(path).endswith(".bin"):
+        from common.doc_store import DocStore
+        records = DocStore(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return [" ".join(str(r.get(field, "")) for field in fields) for r in records]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["export", "parity"])
+    ap.add_argument("--out", type=str, default=str(ONNX_MODEL_DIR))
+    ap.add_argument("--no_quantize", action="store_true")
+    ap.add_argument("--questions", type=str, default="data/semantic_search/rag_eval_dataset.jsonl",
+                    help="JSONL with a \"question\" field")
+    ap.add_argument("--passages", type=str, default="data/semantic_search/corpus.jsonl",
+                    help="JSONL or record store (.bin) of passages")
+    ap.add_argument("--fields", type=str, default="title,abstract", help="passage fields, joined with spaces")
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        export_onnx(EMBED_MODEL, "embedder", args.out, quantize=not args.no_quantize)
+        export_onnx(CROSS_MODEL, "cross_encoder", args.out, quantize=not args.no_quantize)
+    else:
+        ONNX_MODEL_DIR = Path(args.out)
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [json.loads(line)["question"] for line in f if line.strip()]
+        check_parity(questions, _load_passages(args.passages, args.fields.split(",")))
@@ -0,0 +1,130 @@
+"""
+Two-level in-process query cache:
+  - embeddings: (model id, normalized query) → vector; survives index rebuilds
+  - results:    (query, retrieval options, index version) → results;
+                dropped as soon as the index manifest changes
+Both levels are size-bounded LRUs with an optional TTL and hit/miss counters.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_MISSING = object()
+
+# -----------------------------
+# LRU with TTL
+# -----------------------------
+class LRUCache:
+    def __init__(self, max_items=1024, ttl_s=None):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._data = OrderedDict()  # key → (inserted_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and self.ttl_s is not None and time.monotonic() - item[0] > self.ttl_s:
+                del self._data[key]
+                item = _MISSING
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._data), "max_items": self.max_items, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+def index_version(manifest):
+    """Cheap version token for an index: (mtime_ns, size) of its manifest, None if missing."""
+    try:
+        st = os.stat(manifest)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# -----------------------------
+# Query cache
+# -----------------------------
+class QueryCache:
+    def __init__(self, max_embeddings=4096, max_results=1024, embedding_ttl_s=None, result_ttl_s=3600):
+        self.embeddings = LRUCache(max_embeddings, embedding_ttl_s)
+        self.results = LRUCache(max_results, result_ttl_s)
+        self._versions = {}
+        self.invalidations = 0
+
+    def embedding(self, model_id, text, encode):
+        key = (model_id, text)
+        vec = self.embeddings.get(key, _MISSING)
+        if vec is _MISSING:
+            vec = encode()
+            self.embeddings.put(key, vec)
+        return vec
+
+    def sync_version(self, index_key, version):
+        """Drop all cached results once the index behind index_key has a new version."""
+        if index_key in self._versions and self._versions[index_key] != version:
+            self.results.clear()
+            self.invalidations += 1
+        self._versions[index_key] = version
+
+    def result(self, key, compute):
+        # callers get their own copy so mutating a result cannot poison the cache
+        res = self.results.get(key, _MISSING)
+        if res is _MISSING:
+            res = compute()
+            self.results.put(key, copy.deepcopy(res))
+            return res
+        return copy.deepcopy(res)
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats(),
+                "invalidations": self.invalidations}
+
+QUERY_CACHE = QueryCache()
+
+class CachedEmbedder:
+    """
+    Drop-in wrapper for an embedding model: single-query encode() calls (what the
+    retrievers issue) go through the embedding cache; batch calls pass straight through.
+    """
+    def __init__(self, model, model_id, cache=QUERY_CACHE):
+        self.model = model
+        self.model_id = model_id
+        self.cache = cache
+
+    @staticmethod
+    def key_id(model_id, **kwargs):
+        """Embedding-cache model key for encode(..., **kwargs) calls (also used to preload vectors)."""
+        return f"{model_id}:{sorted(kwargs.items())}"
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str) or len(texts) != 1:
+            return self.model.encode(texts, **kwargs)
+        key_id = self.key_id(self.model_id, **kwargs)
+        vec = self.cache.embedding(key_id, texts[0], lambda: np.asarray(self.model.encode(texts, **kwargs)))
+        return vec.copy()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
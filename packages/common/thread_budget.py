@@ -0,0 +1,91 @@
+"""
+One CPU budget for every thread pool in the process: torch intra-op threads,
+FAISS OpenMP, ONNX Runtime sessions, OpenBLAS / MKL and the app's own worker
+pools. Each library defaults to "all cores", so running several of them at once
+(pre-forked serve workers, threaded eval) oversubscribes the CPU; configure()
+splits the cores by role instead.
+
+Roles:
+  build   one stage at a time (build_index.py)          → all cores per library
+  ingest  mm_rag ingest stages run one after another; the OCR process pool gets
+          one process per core with single-threaded children (limit_child_threads)
+  query   one query at a time (search.py, query.py, eval.py) → all cores per library
+  serve   N processes on this host (serve.py, shards)   → cores // N per process
+  eval    N questions in flight (mm_rag evals.py --workers) → cores // N per question
+
+    budget = configure("serve", workers=4)   # {"intra_op": 2, "pool": 4, ...}
+
+Libraries that are already loaded are reconfigured in place; the rest pick the
+budget up from OMP_NUM_THREADS & co. when they are first imported, so call
+configure() before loading models. THREAD_BUDGET_CORES overrides the detected
+core count (e.g. for a container CPU quota).
+"""
+import os
+import sys
+
+ROLES = ("build", "ingest", "query", "serve", "eval")
+BUDGET = {}
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "ONNX_THREADS")
+
+def available_cores():
+    if os.environ.get("THREAD_BUDGET_CORES"):
+        return max(1, int(os.environ["THREAD_BUDGET_CORES"]))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def plan(role, workers=1, cores=None):
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role} (use one of {', '.join(ROLES)})")
+    cores = cores or available_cores()
+    workers = max(1, workers)
+    if role in ("build", "ingest", "query"):
+        return {"role": role, "cores": cores, "workers": 1, "intra_op": cores, "pool": cores, "child_threads": 1}
+    return {"role": role, "cores": cores, "workers": workers, "intra_op": max(1, cores // workers),
+            "pool": workers, "child_threads": 1}
+
+def _set_threads(n):
+    for var in _THREAD_ENV:
+        os.environ[var] = str(n)
+    applied = ["env"]
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        torch.set_num_threads(n)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # only settable before torch runs its first parallel op
+        applied.append("torch")
+    if "faiss" in sys.modules and hasattr(sys.modules["faiss"], "omp_set_num_threads"):
+        sys.modules["faiss"].omp_set_num_threads(n)
+        applied.append("faiss")
+    if "common.onnx_backend" in sys.modules:
+        sys.modules["common.onnx_backend"].ONNX_THREADS = n  # default for sessions created from now on
+        applied.append("onnx")
+    try:
+        from threadpoolctl import threadpool_limits  # optional: resize BLAS pools already loaded by numpy
+        threadpool_limits(n)
+        applied.append("blas")
+    except ImportError:
+        pass
+    return applied
+
+def configure(role, workers=1, cores=None):
+    """Apply the budget for role to this process (and, through the environment, its children)."""
+    budget = plan(role, workers, cores)
+    if budget["workers"] > 1:
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"  # HF tokenizers would spawn their own pool per worker
+    budget["applied"] = _set_threads(budget["intra_op"])
+    BUDGET.clear()
+    BUDGET.update(budget)
+    return budget
+
+def pool_size(default=None):
+    """Worker-pool size from the active budget (default when configure() was never called)."""
+    return BUDGET.get("pool", default)
+
+def limit_child_threads(n=1):
+    """ProcessPoolExecutor initializer: pool children run single-threaded (incl. Tesseract's OpenMP)."""
+    os.environ["OMP_THREAD_LIMIT"] = str(n)
+    _set_threads(n)
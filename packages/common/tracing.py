@@ -0,0 +1,84 @@
+"""
+Lightweight per-query tracing.
+
+    with start_trace("query") as trace:
+        with span("embed"):
+            ...
+    trace.timings()            # {"embed": 12.3, ...} in ms
+    write_chrome_trace([trace], "trace.json")   # open in chrome://tracing or Perfetto
+
+span() finds the active trace through a context variable, so library code
+(normalize, retriever, reranker) can be instrumented without passing a trace
+around; with no active trace it is a no-op.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_current = contextvars.ContextVar("trace", default=None)
+
+class Trace:
+    def __init__(self, name="query"):
+        self.name = name
+        self.spans = []  # (name, start_ns, duration_ns, depth, attrs) in completion order
+        self.start_ns = time.perf_counter_ns()
+        self.duration_ns = None
+        self._depth = 0
+
+    def timings(self):
+        """Total milliseconds per span name (repeated spans are summed), plus "total"."""
+        out = {}
+        for name, _, dur, _, _ in self.spans:
+            out[name] = out.get(name, 0.0) + dur / 1e6
+        out = {k: round(v, 3) for k, v in out.items()}
+        if self.duration_ns is not None:
+            out["total"] = round(self.duration_ns / 1e6, 3)
+        return out
+
+    def chrome_events(self, pid=None, tid=None):
+        pid = os.getpid() if pid is None else pid
+        tid = threading.get_ident() if tid is None else tid
+        events = [{"name": self.name, "ph": "X", "pid": pid, "tid": tid, "ts": self.start_ns / 1e3,
+                   "dur": (self.duration_ns or 0) / 1e3}]
+        for name, start, dur, depth, attrs in self.spans:
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": start / 1e3,
+                           "dur": dur / 1e3, "args": attrs})
+        return events
+
+@contextmanager
+def start_trace(name="query"):
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration_ns = time.perf_counter_ns() - trace.start_ns
+        _current.reset(token)
+
+@contextmanager
+def span(name, **attrs):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    trace._depth += 1
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace._depth -= 1
+        trace.spans.append((name, start, time.perf_counter_ns() - start, trace._depth, attrs))
+
+def current_trace():
+    return _current.get()
+
+def write_chrome_trace(traces, path):
+    """Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev) for one or more traces."""
+    events = [e for t in traces for e in t.chrome_events()]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
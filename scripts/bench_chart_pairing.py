@@ -0,0 +1,180 @@
+"""
+Micro-benchmark for chart OCR post-processing in apps/mm_rag/image_info.py.
+
+Generates synthetic OCR token layouts (legend-style rows and scattered pie/bar
+labels), checks that the vectorized pairing over a TokenTable matches the
+original per-Token double-loop implementation, and reports timings for both,
+plus the cost of building tokens from a Tesseract dict (objects vs. columns).
+
+Usage:
+    python scripts/bench_chart_pairing.py --sizes 100 500 2000 --repeat 5
+    python scripts/bench_chart_pairing.py --repeat 20 --out benchmarks/results/chart_pairing.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "apps" / "mm_rag"))
+from image_info import TokenTable, PERCENT_RE, LABEL_RE, _linewise_pairs, _spatial_pairs  # noqa: E402
+
+@dataclass
+class Token:
+    """Original one-object-per-word representation (reference only)."""
+    text: str
+    x: int; y: int; w: int; h: int
+    conf: float
+    line_id: Tuple[int, int]
+
+WORDS = ["Technology", "Health Care", "Financials", "Energy", "Utilities", "Materials",
+         "Industrials", "Real Estate", "Bonds", "Cash", "Equity", "Other"]
+
+# -----------------------------
+# Synthetic layouts
+# -----------------------------
+def legend_layout(n_tokens, seed=0):
+    """Rows of 'Label  12.3%' pairs, several pairs per OCR line."""
+    rnd = random.Random(seed)
+    toks, line, x = [], 0, 0
+    for i in range(n_tokens // 2):
+        if x > 1200:
+            line, x = line + 1, 0
+        y = line * 22
+        toks.append(Token(rnd.choice(WORDS), x, y, 80, 14, 90.0, (1, line)))
+        toks.append(Token(f"{rnd.uniform(0, 99):.1f}%", x + 90, y, 40, 14, 90.0, (1, line)))
+        x += 150
+    return toks
+
+def scatter_layout(n_tokens, seed=0, size=3000):
+    """Labels and values scattered across a page, each token on its own OCR line."""
+    rnd = random.Random(seed)
+    toks = []
+    for i in range(n_tokens):
+        x, y = rnd.randrange(size), rnd.randrange(size)
+        text = rnd.choice(WORDS) if i % 2 else f"{rnd.uniform(0, 99):.1f}%"
+        toks.append(Token(text, x, y, rnd.randrange(30, 90), 14, 90.0, (i, 0)))
+    return toks
+
+# -----------------------------
+# Reference (original) implementations
+# -----------------------------
+def ref_linewise(tokens):
+    by_line = {}
+    for t in tokens:
+        by_line.setdefault(t.line_id, []).append(t)
+    pairs = []
+    for toks in by_line.values():
+        labels = [t for t in toks if LABEL_RE.match(t.text) and not PERCENT_RE.match(t.text)]
+        percents = [t for t in toks if PERCENT_RE.match(t.text)]
+        if not labels or not percents:
+            continue
+        for p in percents:
+            cand = min(labels, key=lambda L: abs((L.x + L.w) - p.x))
+            pairs.append((cand.text.strip(), p.text.strip()))
+    return pairs
+
+def ref_spatial(tokens, max_dist=120):
+    labels = [t for t in tokens if LABEL_RE.match(t.text) and not PERCENT_RE.match(t.text)]
+    percents = [t for t in tokens if PERCENT_RE.match(t.text)]
+    pairs = []
+    for p in percents:
+        pcx, pcy = p.x + p.w/2, p.y + p.h/2
+        best = None; best_d = 1e9
+        for L in labels:
+            Lcx, Lcy = L.x + L.w/2, L.y + L.h/2
+            d = np.hypot(Lcx - pcx, Lcy - pcy)
+            if d < best_d:
+                best_d, best = d, L
+        if best is not None and best_d <= max_dist:
+            pairs.append((best.text.strip(), p.text.strip()))
+    return pairs
+
+def to_table(tokens):
+    return TokenTable.from_rows([(t.text, t.x, t.y, t.w, t.h, t.conf, t.line_id[0], t.line_id[1]) for t in tokens])
+
+def to_tesseract_dict(tokens):
+    return {"text": [t.text for t in tokens], "conf": [str(t.conf) for t in tokens],
+            "left": [t.x for t in tokens], "top": [t.y for t in tokens],
+            "width": [t.w for t in tokens], "height": [t.h for t in tokens],
+            "block_num": [t.line_id[0] for t in tokens], "line_num": [t.line_id[1] for t in tokens]}
+
+def ref_build(data, min_conf=60):
+    tokens = []
+    n = len(data["text"])
+    for i in range(n):
+        txt = (data["text"][i] or "").strip()
+        if not txt:
+            continue
+        conf = float(data.get("conf", ["0"]*n)[i])
+        if conf < min_conf:
+            continue
+        x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+        blk, ln = data.get("block_num", [0]*n)[i], data.get("line_num", [0]*n)[i]
+        tokens.append(Token(text=txt, x=x, y=y, w=w, h=h, conf=conf, line_id=(blk, ln)))
+    return tokens
+
+def _time(fn, tokens, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(tokens)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", type=str, default=None, help="also write the rows as JSON (e.g. under benchmarks/results/)")
+    args = ap.parse_args()
+
+    cases = [
+        ("linewise/legend", legend_layout, ref_linewise, lambda t: _linewise_pairs(t, value_kinds=("percent",))),
+        ("linewise/scatter", scatter_layout, ref_linewise, lambda t: _linewise_pairs(t, value_kinds=("percent",))),
+        ("spatial/scatter", scatter_layout, ref_spatial, lambda t: _spatial_pairs(t, value_kinds=("percent",))),
+    ]
+    rows = []
+
+    def report(name, n, ref_ms, new_ms, match):
+        speedup = ref_ms / max(new_ms, 1e-9)
+        rows.append({"case": name, "tokens": n, "reference_ms": ref_ms, "vectorized_ms": new_ms,
+                     "speedup": speedup, "match": match})
+        print(f"{name:18s} {n:7d} {ref_ms:13.2f} {new_ms:14.2f} {speedup:7.1f}x  {match}")
+
+    print(f"{'case':18s} {'tokens':>7s} {'reference ms':>13s} {'vectorized ms':>14s} {'speedup':>8s}  match")
+    for name, layout, ref_fn, new_fn in cases:
+        for n in args.sizes:
+            toks = layout(n)
+            ref_ms, ref_out = _time(ref_fn, toks, args.repeat)
+            new_ms, new_out = _time(new_fn, to_table(toks), args.repeat)
+            report(name, n, ref_ms, new_ms, sorted(ref_out) == sorted(new_out))
+    for n in args.sizes:
+        data = to_tesseract_dict(scatter_layout(n))
+        ref_ms, ref_out = _time(ref_build, data, args.repeat)
+        new_ms, new_out = _time(TokenTable.from_tesseract, data, args.repeat)
+        report("build tokens", n, ref_ms, new_ms, len(ref_out) == len(new_out))
+
+    if args.out:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or "unknown"
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "numpy": np.__version__,
+                       "params": {"sizes": args.sizes, "repeat": args.repeat}, "results": rows}, f, indent=2)
+        print(f"\nResults written to {out}")
+
+if __name__ == "__main__":
+    main()
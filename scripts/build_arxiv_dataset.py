@@ -2,6 +2,8 @@
 Build a dataset of academic papers from arXiv.
 Takes most recent n papers from specified categories, downloads their PDFs,
 extracts text, and saves metadata and content in JSONL format in semantic_search/corpus.jsonl.
+Downloads run concurrently, text extraction in a process pool, and every paper is
+streamed to the JSONL with a checkpoint so interrupted runs resume.
 
 Fields:
 - paper_id
@@ -12,14 +14,11 @@ Fields:
 - full_text (from PDF)
 """
 
-import arxiv
 import json
-import fitz  # PyMuPDF
+from functools import lru_cache
 from pathlib import Path
 from tqdm import tqdm
 import argparse
-from keybert import KeyBERT
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
 
 # Categories to pull papers from
@@ -27,13 +26,18 @@ CATEGORIES = [
     "econ.EM"
 ]
 
-kw_model = KeyBERT(model="all-MiniLM-L6-v2")  # lightweight keyword model
+@lru_cache(maxsize=1)
+def get_kw_model():
+    """Build the KeyBERT model once, on first use (not at import)."""
+    from keybert import KeyBERT
+    return KeyBERT(model="all-MiniLM-L6-v2")  # lightweight keyword model
 
 def pdf_to_text(pdf_path: Path, max_pages: int = 40) -> str:
     """Extract text from the first N pages of a PDF."""
     try:
         if not pdf_path.exists() or pdf_path.stat().st_size == 0:
             return ""
+        import fitz  # PyMuPDF
         doc = fitz.open(pdf_path)
         pages_to_read = min(max_pages, len(doc))
         texts = [doc[i].get_text("text") for i in range(pages_to_read)]
@@ -42,86 +46,189 @@ def pdf_to_text(pdf_path: Path, max_pages: int = 40) -> str:
         print(f"Failed to extract {pdf_path}: {e}")
         return ""
 
-kw_model = KeyBERT(model="all-MiniLM-L6-v2")
-
-def extract_keywords(text: str, top_n: int = 5):
-    try:
-        keywords = kw_model.extract_keywords(
-            text,
-            keyphrase_ngram_range=(1, 2),   # allow unigrams & bigrams
-            stop_words="english",           # filter common words
-            use_mmr=True,                   # diversify keywords
-            diversity=0.7,                  # reduce repetition
-            top_n=top_n * 2                 # get more, we'll filter
-        )
-        # Deduplicate & clean
-        seen = set()
-        clean_keywords = []
-        for kw, _ in keywords:
-            kw = kw.lower().strip()
-            if kw not in seen and kw not in ENGLISH_STOP_WORDS:
-                seen.add(kw)
-                clean_keywords.append(kw)
-            if len(clean_keywords) >= top_n:
-                break
-        return clean_keywords
-    except Exception:
+def _clean_keywords(keywords, top_n, stop_words):
+    # Deduplicate & clean
+    seen = set()
+    clean_keywords = []
+    for kw, _ in keywords:
+        kw = kw.lower().strip()
+        if kw not in seen and kw not in stop_words:
+            seen.add(kw)
+            clean_keywords.append(kw)
+        if len(clean_keywords) >= top_n:
+            break
+    return clean_keywords
+
+KEYWORD_ARGS = dict(
+    keyphrase_ngram_range=(1, 2),   # allow unigrams & bigrams
+    stop_words="english",           # filter common words
+    use_mmr=True,                   # diversify keywords
+    diversity=0.7,                  # reduce repetition
+)
+
+def extract_keywords_batch(texts, top_n: int = 5):
+    """
+    Keywords for many abstracts with a single KeyBERT embedding pass. A missing keybert /
+    sklearn install or a model that fails to load raises; only per-document extraction
+    errors (e.g. an abstract of nothing but stop words) leave that paper with no keywords.
+    """
+    if not texts:
         return []
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    model = get_kw_model()
+    try:
+        keywords = model.extract_keywords(texts, top_n=top_n * 2, **KEYWORD_ARGS)  # get more, we'll filter
+        if len(texts) == 1:                 # KeyBERT unwraps single-doc input
+            keywords = [keywords]
+    except ValueError:
+        # the batch vectorizer failed on some document; redo one by one to isolate it
+        keywords = []
+        for i, text in enumerate(texts):
+            try:
+                keywords.append(model.extract_keywords(text, top_n=top_n * 2, **KEYWORD_ARGS))
+            except ValueError as e:
+                print(f"Keyword extraction failed for abstract {i} of batch: {e}")
+                keywords.append([])
+    return [_clean_keywords(kws, top_n, ENGLISH_STOP_WORDS) for kws in keywords]
 
-def fetch_papers(max_total=20, out_file="data/semantic_search/corpus.jsonl"):
-    raw_dir = Path("data/raw_pdfs")
+def extract_keywords(text: str, top_n: int = 5):
+    return extract_keywords_batch([text], top_n)[0]
+
+# -----------------------------
+# Fetching (pluggable so tests can use a local stub)
+# -----------------------------
+def list_arxiv_papers(cat, max_results):
+    """Yield plain metadata dicts for the most recent papers of a category."""
+    import arxiv
+    search = arxiv.Search(
+        query=f"cat:{cat}",
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+    )
+    for result in arxiv.Client().results(search):
+        yield {
+            "paper_id": result.get_short_id(),
+            "title": result.title.strip(),
+            "abstract": result.summary.strip(),
+            "authors": [a.name for a in result.authors],
+            "pdf_url": result.pdf_url,
+        }
+
+def download_pdf(paper, pdf_path: Path):
+    """Default fetcher: download to a temp file, then rename so a crash never leaves a half PDF."""
+    from urllib.request import urlretrieve
+    tmp_path = pdf_path.with_suffix(".part")
+    urlretrieve(paper["pdf_url"], tmp_path)
+    tmp_path.replace(pdf_path)
+    return pdf_path
+
+def _fetch_one(fetcher, paper, raw_dir: Path):
+    pdf_path = raw_dir / f"{paper['paper_id']}.pdf"
+    # Download PDF if not already present
+    if not pdf_path.exists():
+        try:
+            fetcher(paper, pdf_path)
+        except Exception as e:
+            print(f"Could not download {paper['paper_id']}: {e}")
+            return paper, None
+    return paper, pdf_path
+
+# -----------------------------
+# Checkpointing
+# -----------------------------
+def load_checkpoint(out_file: Path, ckpt_file: Path):
+    """
+    Ids already handled by a previous run: every complete line of out_file plus
+    ids recorded in the checkpoint (including papers skipped for missing text).
+    A truncated trailing line from a crash is dropped.
+    """
+    done = set()
+    if out_file.exists():
+        good_lines, dirty = [], False
+        with open(out_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["paper_id"])
+                except (json.JSONDecodeError, KeyError):
+                    dirty = True
+                    continue
+                if not line.endswith("\n"):
+                    line, dirty = line + "\n", True
+                good_lines.append(line)
+        if dirty:
+            with open(out_file, "w", encoding="utf-8") as f:
+                f.writelines(good_lines)
+    if ckpt_file.exists():
+        with open(ckpt_file, "r", encoding="utf-8") as f:
+            done.update(line.strip() for line in f if line.strip())
+    return done
+
+def fetch_papers(max_total=20, out_file="data/semantic_search/corpus.jsonl", raw_dir="data/raw_pdfs",
+                 download_workers=8, pdf_workers=None, batch_size=32, fetcher=download_pdf,
+                 lister=list_arxiv_papers, resume=True):
+    """
+    Concurrent, resumable builder.
+    - PDFs are downloaded by a bounded thread pool (fetcher(paper, pdf_path) is pluggable)
+    - pdf_to_text runs in a process pool
+    - KeyBERT keywords are extracted per batch in one embedding pass
+    - every paper is appended to out_file as soon as its batch is done, and its id to
+      <out_file>.ckpt, so a rerun resumes where the previous one stopped
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    raw_dir = Path(raw_dir)
     raw_dir.mkdir(parents=True, exist_ok=True)
-    Path("data/semantic_search").mkdir(parents=True, exist_ok=True)
+    out_file = Path(out_file)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    ckpt_file = out_file.with_suffix(out_file.suffix + ".ckpt")
+    if not resume:
+        for p in (out_file, ckpt_file):
+            if p.exists():
+                p.unlink()
+    done = load_checkpoint(out_file, ckpt_file)
 
-    all_papers = []
     count_per_cat = max_total // len(CATEGORIES)
-
-    for cat in CATEGORIES:
-        search = arxiv.Search(
-            query=f"cat:{cat}",
-            max_results=count_per_cat,
-            sort_by=arxiv.SortCriterion.SubmittedDate,
-        )
-        for result in tqdm(arxiv.Client().results(search), desc=f"{cat}"):
-            pdf_path = raw_dir / f"{result.get_short_id()}.pdf"
-
-            # Download PDF if not already present
-            if not pdf_path.exists():
-                try:
-                    result.download_pdf(filename=pdf_path)
-                except Exception as e:
-                    print(f"Could not download {result.get_short_id()}: {e}")
-                    continue
+    todo = [p for cat in CATEGORIES for p in lister(cat, count_per_cat) if p["paper_id"] not in done]
+    print(f"{len(done)} papers already done, {len(todo)} to fetch")
+
+    saved = 0
+    with ThreadPoolExecutor(max_workers=download_workers) as dl_pool, \
+         ProcessPoolExecutor(max_workers=pdf_workers) as pdf_pool, \
+         open(out_file, "a", encoding="utf-8") as out, \
+         open(ckpt_file, "a", encoding="utf-8") as ckpt:
+        for b in tqdm(range(0, len(todo), batch_size), desc="Batches"):
+            batch = todo[b:b + batch_size]
+            fetched = list(dl_pool.map(lambda p: _fetch_one(fetcher, p, raw_dir), batch))
+            fetched = [(paper, path) for paper, path in fetched if path is not None]
 
             # Extract text
-            full_text = pdf_to_text(pdf_path)
-            if not full_text:
-                continue
-
-            # Extract keywords from abstract
-            abstract = result.summary.strip()
-            keywords = extract_keywords(abstract)
-
-            paper = {
-                "paper_id": result.get_short_id(),
-                "title": result.title.strip(),
-                "abstract": abstract,
-                "authors": [a.name for a in result.authors],
-                "keywords": keywords,
-                "full_text": full_text,
-            }
-            all_papers.append(paper)
-
-    # Save JSONL
-    with open(out_file, "w", encoding="utf-8") as f:
-        for paper in all_papers:
-            f.write(json.dumps(paper, ensure_ascii=False) + "\n")
-
-    print(f" Saved {len(all_papers)} papers to {out_file}")
+            texts = list(pdf_pool.map(pdf_to_text, [path for _, path in fetched]))
+            ready = [(paper, text) for (paper, _), text in zip(fetched, texts) if text]
+
+            # Extract keywords from abstracts (one embedding pass per batch)
+            keywords = extract_keywords_batch([paper["abstract"] for paper, _ in ready])
+
+            for (paper, full_text), kws in zip(ready, keywords):
+                record = {k: paper[k] for k in ("paper_id", "title", "abstract", "authors")}
+                record.update(keywords=kws, full_text=full_text)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            # downloaded-but-empty PDFs are checkpointed too; failed downloads are retried next run
+            for paper, _ in fetched:
+                ckpt.write(paper["paper_id"] + "\n")
+            ckpt.flush()
+            saved += len(ready)
+
+    print(f" Saved {saved} new papers to {out_file}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max_total", type=int, default=40)
     parser.add_argument("--out", type=str, default="data/semantic_search/corpus.jsonl")
+    parser.add_argument("--download_workers", type=int, default=8)
+    parser.add_argument("--pdf_workers", type=int, default=None)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint and rebuild from scratch")
     args = parser.parse_args()
-    fetch_papers(args.max_total, args.out)
\ No newline at end of file
+    fetch_papers(args.max_total, args.out, download_workers=args.download_workers,
+                 pdf_workers=args.pdf_workers, batch_size=args.batch_size, resume=not args.fresh)
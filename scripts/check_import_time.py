@@ -0,0 +1,69 @@
+"""
+Import-time budget for the CLI entry points.
+
+Runs every entry point with `--help` under `python -X importtime`, sums the
+cumulative time of the top-level imports, and fails if any entry point goes
+over its budget. Heavy deps (torch, open_clip, transformers, faiss, KeyBERT,
+PyMuPDF, OpenCV, ...) must be imported lazily for this to pass.
+
+Usage:
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget_ms 300
+"""
+
+import re
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# entry point → import budget (ms)
+ENTRY_POINTS = {
+    "apps/semantic_search/search.py": 500,
+    "apps/semantic_search/build_index.py": 500,
+    "apps/mm_rag/query.py": 500,
+    "apps/mm_rag/ingest_build_index.py": 500,
+    "apps/mm_rag/evals.py": 500,
+    "scripts/build_arxiv_dataset.py": 500,
+}
+
+IMPORT_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+def measure(script: str):
+    """Returns (top-level cumulative import ms, wall ms, slowest top-level imports)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", script, "--help"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    top = []
+    for line in proc.stderr.splitlines():
+        m = IMPORT_LINE_RE.match(line)
+        if m and len(m.group(3)) == 1:  # depth-0 imports only (one space after the pipe)
+            top.append((int(m.group(2)) / 1000, m.group(4)))
+    if proc.returncode != 0:
+        print("\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:")))
+    return sum(ms for ms, _ in top), wall_ms, sorted(top, reverse=True)[:5], proc.returncode
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget_ms", type=float, default=None, help="override every per-script budget")
+    args = ap.parse_args()
+
+    failed = False
+    for script, budget in ENTRY_POINTS.items():
+        budget = args.budget_ms or budget
+        import_ms, wall_ms, slowest, rc = measure(script)
+        ok = rc == 0 and import_ms <= budget
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {script:40s} imports {import_ms:7.1f} ms "
+              f"(budget {budget:.0f}) | --help wall {wall_ms:7.1f} ms")
+        if not ok:
+            for ms, mod in slowest:
+                print(f"       {ms:7.1f} ms  {mod}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Regression check for the table-page pre-pass in apps/mm_rag/parse_pdf.py.
+
+Runs extract_tables on each PDF with and without the PyMuPDF pre-filter and
+verifies that every table found by the full scan is still found (same page,
+header and rows). Prints pages skipped and time saved; exits 1 on any miss.
+
+Usage:
+    python scripts/check_table_prefilter.py data/mm_rag/*.pdf
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "apps" / "mm_rag"))
+from parse_pdf import extract_tables  # noqa: E402
+
+def _key(t):
+    return json.dumps([t["page"], t["header"], t["rows"]], ensure_ascii=False)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pdfs", nargs="+")
+    args = ap.parse_args()
+
+    missed_any = False
+    for pdf in args.pdfs:
+        full_report, fast_report = {}, {}
+        full = extract_tables(Path(pdf), prefilter=False, report=full_report)
+        fast = extract_tables(Path(pdf), prefilter=True, report=fast_report)
+        fast_keys = {_key(t) for t in fast}
+        missed = [t for t in full if _key(t) not in fast_keys]
+        recall = 1.0 - len(missed) / len(full) if full else 1.0
+        missed_any |= bool(missed)
+        saved = full_report["extract_s"] - (fast_report["prefilter_s"] + fast_report["extract_s"])
+        print(f"{'OK  ' if not missed else 'FAIL'} {pdf}: tables {len(fast)}/{len(full)} (recall {recall:.3f}), "
+              f"pages skipped {fast_report['pages_skipped']}/{fast_report['pages_total']}, "
+              f"time {full_report['extract_s']:.2f}s → {fast_report['prefilter_s'] + fast_report['extract_s']:.2f}s "
+              f"(saved {saved:.2f}s)")
+        for t in missed:
+            print(f"       missed table on page {t['page']}: {t['header'][:4]}")
+    sys.exit(1 if missed_any else 0)
+
+if __name__ == "__main__":
+    main()